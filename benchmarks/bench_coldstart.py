@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Cold start of a scoring process: interpreter start, import, model load and
+first prediction, each run in a fresh interpreter (asv timeraw_*). Run
+``python -m benchmarks.bench_coldstart`` for a breakdown and a check that
+the predictor does not import scikit-learn or SciPy.
+
+@author Miika Ahdesmaki
+"""
+from __future__ import print_function, division
+import os
+import subprocess
+import sys
+import tempfile
+import numpy as np
+from benchmarks.generators import regime_data
+
+PREDICT_CODE = """
+import time
+t0 = time.perf_counter()
+import numpy as np
+t1 = time.perf_counter()
+from shrinkage_da import SdaPredictor
+t2 = time.perf_counter()
+model = SdaPredictor.load({path!r})
+t3 = time.perf_counter()
+model.predict_proba(np.ones((1, model.beta.shape[1])))
+t4 = time.perf_counter()
+import sys
+print(t1-t0, t2-t1, t3-t2, t4-t3, int("sklearn" in sys.modules), int("scipy" in sys.modules))
+"""
+
+ESTIMATOR_CODE = """
+import numpy as np
+from shrinkage_da import ShrinkageDiscriminantAnalysis
+model = ShrinkageDiscriminantAnalysis.load({path!r})
+model.predict_proba(np.ones((1, model.sdamodel_["beta"].shape[1])))
+"""
+
+def pvt_save_model(path, regime = "n<<p"):
+    from shrinkage_da import ShrinkageDiscriminantAnalysis
+    X, y = regime_data(regime)
+    ShrinkageDiscriminantAnalysis().fit(X, y).save(path)
+    return path
+
+class ColdStart(object):
+    timeout = 300
+    repeat = 10
+
+    def setup_cache(self):
+        return pvt_save_model(os.path.abspath("coldstart_model"))
+
+    def timeraw_predictor(self, path):
+        return PREDICT_CODE.format(path = path)
+
+    def timeraw_estimator(self, path):
+        return ESTIMATOR_CODE.format(path = path)
+
+if __name__ == "__main__":
+    path = pvt_save_model(os.path.join(tempfile.mkdtemp(), "model"))
+    runs = []
+    for i in range(10):
+        out = subprocess.check_output([sys.executable, "-c", PREDICT_CODE.format(path = path)])
+        runs.append([float(v) for v in out.split()])
+    runs = np.median(np.array(runs), axis=0)
+    print("median of 10 fresh interpreters (seconds)")
+    print("import numpy        %.4f" % runs[0])
+    print("import SdaPredictor %.4f" % runs[1])
+    print("load model          %.4f" % runs[2])
+    print("first prediction    %.4f" % runs[3])
+    print("sklearn imported: %s, scipy imported: %s" % (bool(runs[4]), bool(runs[5])))
+    if runs[4] or runs[5]:
+        raise SystemExit(1)
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Accuracy of the fit planner (sda_plan): measured over predicted peak
+memory and run time of fitting each route across n/p regimes (track_*).
+Run ``python -m benchmarks.bench_plan`` for a table.
+
+@author Miika Ahdesmaki
+"""
+from __future__ import print_function, division
+import time
+from shrinkage_da import ShrinkageDiscriminantAnalysis
+from shrinkage_da.sda_plan import ROUTES, plan_route
+from benchmarks.generators import REGIMES, regime_data
+
+REGIME_NAMES = sorted(REGIMES)
+
+def measure(regime, route, in_place = False):
+    """Measured and predicted peak memory (bytes) and time (seconds) of
+    fitting one route
+    """
+    n, p, n_classes = REGIMES[regime]
+    predicted = plan_route(n, p, n_classes, route, in_place)
+    X, y = regime_data(regime)
+    model = ShrinkageDiscriminantAnalysis(instrument = True, **predicted["options"]).fit(X, y)
+    peak = [r for r in model.fit_stats_ if r["stage"] == "sda"][0]["peak_bytes"]
+    X, y = regime_data(regime)
+    t0 = time.perf_counter()
+    ShrinkageDiscriminantAnalysis(**predicted["options"]).fit(X, y) # without tracing overhead
+    elapsed = time.perf_counter() - t0
+    return dict(memory = peak, time = elapsed, predicted_memory = predicted["peak_memory"],
+                predicted_time = predicted["time"])
+
+class Plan(object):
+    params = (REGIME_NAMES, list(ROUTES), [False, True])
+    param_names = ["regime", "route", "in_place"]
+    unit = "measured / predicted"
+    timeout = 600
+
+    def setup(self, regime, route, in_place):
+        self.result = measure(regime, route, in_place)
+
+    def track_memory_ratio(self, regime, route, in_place):
+        return self.result["memory"] / self.result["predicted_memory"]
+
+    def track_time_ratio(self, regime, route, in_place):
+        return self.result["time"] / self.result["predicted_time"]
+
+if __name__ == "__main__":
+    print("%-13s %-9s %-8s %11s %11s %9s %9s" % ("regime", "route", "in_place", "peak MB", "predicted",
+                                                 "time s", "predicted"))
+    for regime in REGIME_NAMES:
+        for route in ROUTES:
+            for in_place in (False, True):
+                r = measure(regime, route, in_place)
+                print("%-13s %-9s %-8s %11.1f %11.1f %9.3f %9.3f" % (regime, route, in_place, r["memory"] / 1e6,
+                      r["predicted_memory"] / 1e6, r["time"], r["predicted_time"]))
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+asv benchmarks: timing (time_*) and peak memory (peakmem_*) of the main
+fitting and prediction paths across n/p regimes, plus the error of the fast
+paths against the slow reference implementation (track_*)
+
+@author Miika Ahdesmaki
+"""
+from __future__ import print_function, division
+import numpy as np
+from shrinkage_da import ShrinkageDiscriminantAnalysis
+from shrinkage_da.corpcor.shrink_intensity import estimate_lambda, estimate_lambda_var
+from shrinkage_da.corpcor.pvt_cppowscor import pvt_cppowscor
+from shrinkage_da.corpcor.fast_svd import fast_svd
+from benchmarks.generators import REGIMES, regime_data, correlated_gaussian
+from benchmarks.reference import check_all, ref_class_stats
+
+REGIME_NAMES = sorted(REGIMES)
+
+class Estimator(object):
+    params = (REGIME_NAMES, [False, True])
+    param_names = ["regime", "diagonal"]
+    timeout = 300
+
+    def setup(self, regime, diagonal):
+        self.X, self.y = regime_data(regime)
+        self.model = ShrinkageDiscriminantAnalysis(diagonal=diagonal).fit(self.X, self.y)
+
+    def time_fit(self, regime, diagonal):
+        ShrinkageDiscriminantAnalysis(diagonal=diagonal).fit(self.X, self.y)
+
+    def peakmem_fit(self, regime, diagonal):
+        ShrinkageDiscriminantAnalysis(diagonal=diagonal).fit(self.X, self.y)
+
+    def time_feature_rank(self, regime, diagonal):
+        ShrinkageDiscriminantAnalysis(diagonal=diagonal).feature_rank(self.X, self.y)
+
+    def peakmem_feature_rank(self, regime, diagonal):
+        ShrinkageDiscriminantAnalysis(diagonal=diagonal).feature_rank(self.X, self.y)
+
+    def time_predict_proba(self, regime, diagonal):
+        self.model.predict_proba(self.X)
+
+    def peakmem_predict_proba(self, regime, diagonal):
+        self.model.predict_proba(self.X)
+
+class Corpcor(object):
+    params = REGIME_NAMES
+    param_names = ["regime"]
+    timeout = 300
+
+    def setup(self, regime):
+        X, y = regime_data(regime)
+        _, _, _, self.xc = ref_class_stats(X, y)
+        self.y = np.random.RandomState(0).standard_normal((X.shape[1], REGIMES[regime][2]))
+        self.lambda_cor = estimate_lambda(self.xc)
+
+    def time_estimate_lambda(self, regime):
+        estimate_lambda(self.xc)
+
+    def peakmem_estimate_lambda(self, regime):
+        estimate_lambda(self.xc)
+
+    def time_estimate_lambda_var(self, regime):
+        estimate_lambda_var(self.xc)
+
+    def time_pvt_cppowscor(self, regime):
+        pvt_cppowscor(self.xc, self.y, -1, self.lambda_cor)
+
+    def peakmem_pvt_cppowscor(self, regime):
+        pvt_cppowscor(self.xc, self.y, -1, self.lambda_cor)
+
+    def time_fast_svd(self, regime):
+        fast_svd(self.xc)
+
+    def peakmem_fast_svd(self, regime):
+        fast_svd(self.xc)
+
+class Accuracy(object):
+    """Largest relative error of any fast path against the explicit
+    correlation matrix oracle (small problems only)
+    """
+    params = ["n<<p", "n~p", "n>>p"]
+    param_names = ["regime"]
+    unit = "relative error"
+    shapes = {"n<<p": (40, 400, 3), "n~p": (300, 300, 4), "n>>p": (3000, 60, 3)}
+
+    def setup(self, regime):
+        n, p, k = self.shapes[regime]
+        self.errors = check_all(*correlated_gaussian(n, p, k))
+
+    def track_max_error(self, regime):
+        return max(self.errors.values())
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput of concurrent prediction: many threads calling predict_proba on
+one shared SdaPredictor with small batches, as in a serving process (asv
+track_*, rows per second). Run ``python -m benchmarks.bench_threads`` for a
+table of throughput against the number of threads, for SdaPredictor and
+for predict_sda() on the same model, and a check that all threads get the
+single-threaded result.
+
+@author Miika Ahdesmaki
+"""
+from __future__ import print_function, division
+import os
+import time
+import threading
+import numpy as np
+from shrinkage_da import SdaPredictor
+from shrinkage_da.predict_sda import predict_sda
+from benchmarks.generators import correlated_gaussian
+
+# (p, n_classes) of the served model and rows per request
+MODEL = (2000, 20)
+BATCH = 64
+
+def pvt_model():
+    from shrinkage_da.sda import sda
+    p, n_classes = MODEL
+    X, y = correlated_gaussian(400, p, n_classes)
+    return sda(X, y, diagonal = True)
+
+def throughput(predict, X, n_threads, duration = 1.0):
+    """Rows per second of n_threads threads calling predict on batches of
+    X for about duration seconds
+    """
+    counts = [0] * n_threads
+    stop = time.perf_counter() + duration
+    def work(t):
+        i = 0
+        while time.perf_counter() < stop:
+            predict(X[i:i + BATCH])
+            counts[t] += BATCH
+            i = (i + BATCH) % (len(X) - BATCH)
+    threads = [threading.Thread(target = work, args = (t,)) for t in range(n_threads)]
+    start = time.perf_counter()
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    return sum(counts) / (time.perf_counter() - start)
+
+def consistent(predictor, X, n_threads = 8):
+    """Whether concurrent calls all return the single-threaded posteriors
+    """
+    expected = [predictor.predict_proba(X[i:i + BATCH]) for i in range(0, len(X) - BATCH, BATCH)]
+    ok = [True] * n_threads
+    def work(t):
+        for r in range(20):
+            for j, i in enumerate(range(0, len(X) - BATCH, BATCH)):
+                ok[t] &= np.array_equal(predictor.predict_proba(X[i:i + BATCH]), expected[j])
+    threads = [threading.Thread(target = work, args = (t,)) for t in range(n_threads)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    return all(ok)
+
+class ConcurrentPredict(object):
+    params = [1, 2, 4, 8]
+    param_names = ["n_threads"]
+    timeout = 120
+
+    def setup(self, n_threads):
+        self.model = pvt_model()
+        self.predictor = SdaPredictor(self.model)
+        self.X = np.random.RandomState(1).standard_normal((4096, MODEL[0]))
+
+    def track_rows_per_second(self, n_threads):
+        return throughput(self.predictor.predict_proba, self.X, n_threads)
+    track_rows_per_second.unit = "rows/s"
+
+    def track_rows_per_second_predict_sda(self, n_threads):
+        return throughput(lambda x: predict_sda(self.model, x), self.X, n_threads)
+    track_rows_per_second_predict_sda.unit = "rows/s"
+
+if __name__ == "__main__":
+    model = pvt_model()
+    predictor = SdaPredictor(model)
+    X = np.random.RandomState(1).standard_normal((4096, MODEL[0]))
+    print("p = %d, %d classes, %d rows per call, %d cores" % (MODEL + (BATCH, os.cpu_count())))
+    print("threads  SdaPredictor rows/s  predict_sda rows/s")
+    for n_threads in (1, 2, 4, 8):
+        print("%7d  %19.0f  %18.0f" % (n_threads, throughput(predictor.predict_proba, X, n_threads),
+                                       throughput(lambda x: predict_sda(model, x), X, n_threads)))
+    print("concurrent results equal single-threaded ones:", consistent(predictor, X))
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Cost of the updates of WindowedShrinkageDiscriminantAnalysis (asv time_*):
+a partial_fit of a batch of rows with and without refitting the model, for
+growing window sizes. Run ``python -m benchmarks.bench_window`` for a table
+of the seconds per update and the fitted growth exponent in the window
+size N. The rank m update of the statistics and a refit on the reference
+scale (rescale_tol=inf) do not grow with N beyond the O(N_c*p) of the row
+norm sums; the exact refit (rescale_tol=0) re-standardises the window at
+every update, O(N*p + r^2*p).
+
+@author Miika Ahdesmaki
+"""
+from __future__ import print_function, division
+import time
+import numpy as np
+from shrinkage_da import WindowedShrinkageDiscriminantAnalysis
+from benchmarks.generators import correlated_gaussian
+
+# number of features, classes and rows per update
+P, N_CLASSES, BATCH = 200, 3, 10
+WINDOWS = (250, 500, 1000, 2000)
+UPDATES = 10
+
+def pvt_window(N, rescale_tol = np.inf):
+    """A full window of size N and the rows of the following updates
+    """
+    X, y = correlated_gaussian(N + BATCH * UPDATES, P, N_CLASSES)
+    # by default no re-standardisation, only the cost of the updates is timed
+    est = WindowedShrinkageDiscriminantAnalysis(window_size = N, rescale_tol = rescale_tol)
+    est.fit(X[:N], y[:N])
+    return est, X[N:], y[N:]
+
+def seconds_per_update(N, refit, rescale_tol = np.inf):
+    """Mean seconds of a partial_fit of BATCH rows on a full window of size N
+    """
+    est, X, y = pvt_window(N, rescale_tol)
+    t0 = time.perf_counter()
+    for i in range(0, UPDATES * BATCH, BATCH):
+        est.partial_fit(X[i:i + BATCH], y[i:i + BATCH], refit = refit)
+    return (time.perf_counter() - t0) / UPDATES
+
+class WindowUpdate(object):
+    params = list(WINDOWS)
+    param_names = ["window_size"]
+    timeout = 300
+
+    def setup(self, N):
+        self.est, self.X, self.y = pvt_window(N)
+
+    def time_update_statistics(self, N):
+        self.est.partial_fit(self.X[:BATCH], self.y[:BATCH], refit = False)
+
+    def time_update_and_refit(self, N):
+        self.est.partial_fit(self.X[:BATCH], self.y[:BATCH])
+
+    def time_update_and_exact_refit(self, N):
+        self.est.rescale_tol = 0
+        self.est.partial_fit(self.X[:BATCH], self.y[:BATCH])
+
+if __name__ == "__main__":
+    print("p = %d, %d classes, %d rows per update" % (P, N_CLASSES, BATCH))
+    print("window  statistics s  refit s  exact refit s")
+    times = []
+    for N in WINDOWS:
+        times.append((seconds_per_update(N, False), seconds_per_update(N, True),
+                      seconds_per_update(N, True, rescale_tol = 0)))
+        print("%6d  %12.5f  %7.4f  %13.4f" % ((N,) + times[-1]))
+    slope = lambda t: np.polyfit(np.log(WINDOWS), np.log(t), 1)[0]
+    print("growth exponent in N: statistics %.2f, refit %.2f, exact refit %.2f" % tuple(
+        slope([t[i] for t in times]) for i in range(3)))
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic correlated Gaussian data for benchmarks
+
+@author Miika Ahdesmaki
+"""
+from __future__ import print_function, division
+import numpy as np
+
+# (n, p, n_classes) for the regimes benchmarked
+REGIMES = {
+    "n<<p": (100, 5000, 3),
+    "n~p": (1000, 1000, 3),
+    "n>>p": (20000, 200, 3),
+    "many_classes": (2000, 500, 50),
+}
+
+def correlated_gaussian(n, p, n_classes = 2, block_size = 20, rho = 0.5, n_informative = None,
+                        effect = 1.0, random_state = 0):
+    """Class-structured Gaussian data with block-wise equicorrelated features
+
+    Features come in blocks of block_size with correlation rho within a block
+    (a one factor model per block) and unequal variances. The class centroids
+    differ on the first n_informative features.
+
+    Parameters
+    ----------
+    n : int
+        Number of samples.
+    p : int
+        Number of features.
+    n_classes : int
+        Number of (equally sized, up to rounding) classes.
+    block_size : int
+        Number of features per correlated block.
+    rho : float
+        Within-block correlation.
+    n_informative : int
+        Number of features with class-dependent means (p/10 by default).
+    effect : float
+        Scale of the centroid differences in units of standard deviations.
+    random_state : int
+        Seed.
+
+    Returns
+    -------
+    tuple
+        X (n x p array) and class labels y (array of strings)
+    """
+    rng = np.random.RandomState(random_state)
+    if n_informative is None:
+        n_informative = max(1, p // 10)
+    n_blocks = int(np.ceil(p / block_size))
+    block = np.repeat(np.arange(n_blocks), block_size)[:p]
+    shared = rng.standard_normal((n, n_blocks))[:, block]
+    X = np.sqrt(rho) * shared + np.sqrt(1 - rho) * rng.standard_normal((n, p))
+    codes = np.arange(n) % n_classes
+    rng.shuffle(codes)
+    means = np.zeros((n_classes, p))
+    means[:, :n_informative] = effect * rng.standard_normal((n_classes, n_informative))
+    X += means[codes, :]
+    X *= rng.uniform(0.5, 2.0, size=p) # unequal variances
+    y = np.array(["class" + str(k) for k in codes])
+    return X, y
+
+def regime_data(regime, random_state = 0):
+    """Data for one of the named REGIMES
+    """
+    n, p, n_classes = REGIMES[regime]
+    return correlated_gaussian(n, p, n_classes, random_state = random_state)
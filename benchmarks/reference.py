@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Slow reference implementations forming the explicit (shrunken) correlation
+matrix. Used as a correctness oracle for the fast code paths; only feasible
+for moderate p. Run ``python -m benchmarks.reference`` to check all fast
+paths against the oracle.
+
+@author Miika Ahdesmaki
+"""
+from __future__ import print_function, division
+import numpy as np
+
+def ref_standardise(x):
+    """Centre and scale columns with the unbiased standard deviation
+    """
+    n = x.shape[0]
+    xc = x - np.mean(x, axis=0)
+    sd = np.sqrt(np.sum(xc*xc, axis=0) / (n-1))
+    return xc / sd
+
+def ref_estimate_lambda_var(x):
+    """Variance shrinkage intensity by its definition (equal weights)
+    """
+    n = x.shape[0]
+    xc = x - np.mean(x, axis=0)
+    h1 = n/(n-1)
+    v = h1 * np.mean(xc**2, axis=0)
+    target = np.median(v)
+    q1 = np.mean(xc**2, axis=0)
+    q2 = np.mean(xc**4, axis=0) - q1**2
+    return min(max(np.sum(q2) / np.sum((q1 - target/h1)**2) / (n-1), 0), 1)
+
+def ref_estimate_lambda(x):
+    """Correlation shrinkage intensity from the explicit p x p matrices of
+    E[r]^2 and E[r^2] (equal weights)
+    """
+    n = x.shape[0]
+    xs = ref_standardise(x)
+    sw = np.sqrt(1/n)
+    E2R = np.matmul((xs*sw).T, xs*sw)**2
+    ER2 = np.matmul((xs**2*sw).T, xs**2*sw)
+    sE2R = np.sum(E2R) - np.sum(np.diag(E2R))
+    sER2 = np.sum(ER2) - np.sum(np.diag(ER2))
+    return min(max((sER2 - sE2R)/sE2R / (n-1), 0), 1)
+
+def ref_shrunken_correlation(x, lambda_cor):
+    """The explicit p x p shrunken correlation matrix
+    """
+    xs = ref_standardise(x)
+    R = np.matmul(xs.T, xs) / (x.shape[0]-1)
+    return lambda_cor * np.eye(R.shape[0]) + (1-lambda_cor) * R
+
+def ref_cppowscor(x, y, alpha, lambda_cor):
+    """crossprod(R_shrink^alpha, y) with R_shrink formed explicitly
+    """
+    e, V = np.linalg.eigh(ref_shrunken_correlation(x, lambda_cor))
+    e = np.maximum(e, 0)
+    with np.errstate(divide="ignore"):
+        ea = np.where(e > 0, np.power(e, alpha), 0)
+    return np.matmul(V * ea, np.matmul(V.T, y))
+
+def ref_class_stats(X, y):
+    """Class labels (sorted), counts, centroids (p x K) and centred data
+    """
+    y = np.asarray(y)
+    groups = sorted(set(y))
+    samples = np.array([np.sum(y == g) for g in groups], dtype=float)
+    mu = np.column_stack([np.mean(X[y == g], axis=0) for g in groups])
+    xc = X - mu.T[np.searchsorted(groups, y)]
+    return groups, samples, mu, xc
+
+def ref_freqs(samples):
+    """James-Stein shrinkage of the class frequencies towards uniform
+    """
+    n = np.sum(samples)
+    u = samples / n
+    t = 1/len(samples)
+    msp = np.sum((u - t)**2)
+    lam = 1 if msp == 0 else min(max(np.sum(u*(1-u)/(n-1)) / msp, 0), 1)
+    return lam * t + (1-lam) * u, lam
+
+def ref_pooled_sd(xc, cl_count):
+    """Shrunken pooled standard deviations (as centroids())
+    """
+    n = xc.shape[0]
+    v = np.sum(xc**2, axis=0) / (n-1)
+    lam = ref_estimate_lambda_var(xc)
+    return np.sqrt((lam * np.median(v) + (1-lam) * v) * (n-1)/(n-cl_count))
+
+def ref_sda(X, y, diagonal = False):
+    """SDA coefficients with the explicit inverse shrunken correlation matrix
+
+    Returns
+    -------
+    dict
+        groups (sorted), alpha (K x 1), beta (K x p), lambda_cor
+    """
+    groups, samples, mu, xc = ref_class_stats(X, y)
+    cl_count = len(groups)
+    freqs, _ = ref_freqs(samples)
+    mup = np.matmul(mu, freqs)
+    sc = ref_pooled_sd(xc, cl_count)
+    pw = (mu - mup[:, None]) / sc[:, None]
+    lambda_cor = 1
+    if not diagonal:
+        lambda_cor = ref_estimate_lambda(xc)
+        pw = np.linalg.solve(ref_shrunken_correlation(xc, lambda_cor), pw)
+    pw = pw / sc[:, None]
+    alpha = (np.log(freqs) - np.sum(pw * (mu + mup[:, None])/2, axis=0))[:, None]
+    return dict(groups=groups, alpha=alpha, beta=pw.T, lambda_cor=lambda_cor)
+
+def ref_catscore(X, y, diagonal = False):
+    """CAT scores (p x K, classes sorted) with the explicit R_shrink^-1/2
+    """
+    groups, samples, mu, xc = ref_class_stats(X, y)
+    n = np.sum(samples)
+    freqs, _ = ref_freqs(samples)
+    mup = np.matmul(mu, freqs)
+    sc = ref_pooled_sd(xc, len(groups))
+    m = np.sqrt((1-freqs)/freqs/n)
+    cat = (mu - mup[:, None]) / sc[:, None] / m
+    if not diagonal:
+        cat = ref_cppowscor(xc, cat, -0.5, ref_estimate_lambda(xc))
+    return cat
+
+def ref_posterior(model, X):
+    """Posterior probabilities via a log-sum-exp of the discriminant scores
+    """
+    scores = np.matmul(X, model["beta"].T) + model["alpha"].T
+    scores -= np.max(scores, axis=1, keepdims=True)
+    probs = np.exp(scores)
+    return probs / np.sum(probs, axis=1, keepdims=True)
+
+def pvt_reorder(groups, fast_groups):
+    return [list(fast_groups).index(g) for g in groups]
+
+def check_all(X, y):
+    """Maximum relative errors of the fast paths against the oracle
+    """
+    from shrinkage_da.sda import sda
+    from shrinkage_da.catscore import catscore
+    from shrinkage_da.predict_sda import predict_sda
+    from shrinkage_da.corpcor.shrink_intensity import estimate_lambda, estimate_lambda_var
+    from shrinkage_da.corpcor.pvt_cppowscor import pvt_cppowscor
+    from shrinkage_da.corpcor.fast_svd import fast_svd
+    rel = lambda a, b: np.max(np.abs(a - b)) / max(np.max(np.abs(b)), np.finfo(float).tiny)
+    groups, _, _, xc = ref_class_stats(X, y)
+    errors = dict()
+    errors["estimate_lambda_var"] = abs(estimate_lambda_var(xc) - ref_estimate_lambda_var(xc))
+    lam = ref_estimate_lambda(xc)
+    errors["estimate_lambda"] = abs(estimate_lambda(xc) - lam)
+    yy = np.random.RandomState(0).standard_normal((X.shape[1], 3))
+    for alpha in (-1, -0.5, 0.5):
+        errors["pvt_cppowscor alpha=" + str(alpha)] = rel(pvt_cppowscor(xc, yy, alpha, lam)["cp_powr"],
+                                                          ref_cppowscor(xc, yy, alpha, lam))
+    d, u, v = fast_svd(xc)
+    errors["fast_svd"] = rel(np.matmul(u * d, v.T), xc)
+    for diagonal in (False, True):
+        ref = ref_sda(X, y, diagonal = diagonal)
+        fast = sda(X, list(y), diagonal = diagonal)
+        order = pvt_reorder(ref["groups"], fast["groups"])
+        errors["sda beta diagonal=" + str(diagonal)] = rel(fast["beta"][order], ref["beta"])
+        errors["predict_sda diagonal=" + str(diagonal)] = rel(predict_sda(fast, X)["posterior"][:, order],
+                                                              ref_posterior(ref, X))
+        cat = catscore(X, list(y), diagonal = diagonal)["cat"]
+        errors["catscore diagonal=" + str(diagonal)] = rel(cat[:, pvt_reorder(groups, fast["groups"][:-1])],
+                                                           ref_catscore(X, y, diagonal = diagonal))
+    return errors
+
+if __name__ == "__main__":
+    from benchmarks.generators import correlated_gaussian
+    failed = False
+    for n, p, k in [(40, 300, 3), (300, 300, 4), (2000, 60, 3)]:
+        X, y = correlated_gaussian(n, p, k)
+        for name, err in sorted(check_all(X, y).items()):
+            ok = err < 1e-6
+            failed = failed or not ok
+            print("n=%d p=%d K=%d %-36s %.2e %s" % (n, p, k, name, err, "ok" if ok else "FAILED"))
+    if failed:
+        raise SystemExit(1)
@@ -62,4 +62,5 @@ setup(name=DISTNAME,
       classifiers=CLASSIFIERS,
       packages=find_packages(),
       install_requires=INSTALL_REQUIRES,
-      extras_require=EXTRAS_REQUIRE)
+      extras_require=EXTRAS_REQUIRE,
+      entry_points={'console_scripts': ['shrinkage-da = shrinkage_da.sda_cli:main']})
@@ -1,6 +1,25 @@
-from ._sdaclass import ShrinkageDiscriminantAnalysis
-
 from ._version import __version__
 
 __all__ = ['ShrinkageDiscriminantAnalysis',
+           'WindowedShrinkageDiscriminantAnalysis',
+           'BaggedShrinkageDiscriminantAnalysis',
+           'SdaPredictor',
            '__version__']
+
+# Public classes are imported on first access, so that importing the package
+# (e.g. for SdaPredictor) does not load scikit-learn or SciPy
+_lazy_modules = dict(ShrinkageDiscriminantAnalysis = '._sdaclass',
+                     WindowedShrinkageDiscriminantAnalysis = '._windowclass',
+                     BaggedShrinkageDiscriminantAnalysis = '._baggingclass',
+                     SdaPredictor = '.sda_predictor')
+
+def __getattr__(name):
+    if name in _lazy_modules:
+        import importlib
+        value = getattr(importlib.import_module(_lazy_modules[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError("module " + repr(__name__) + " has no attribute " + repr(name))
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_modules))
@@ -0,0 +1,210 @@
+"""
+Bagged Shrinkage Discriminant Analysis with members fitted in parallel on shared data
+"""
+from __future__ import print_function, division
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.utils.validation import check_X_y, check_array, check_is_fitted, _check_sample_weight
+from sklearn.utils.multiclass import unique_labels
+
+from .predict_sda import predict_sda, predict_topk_sda
+from .sda_bagging import sda_bagging
+from .sda_io import save_sda, load_sda
+from .frame_input import feature_names, model_feature_names, select_columns
+
+class BaggedShrinkageDiscriminantAnalysis(BaseEstimator, ClassifierMixin):
+    """ Ensemble of Shrinkage Discriminant Analysis models fitted on
+    stratified bootstrap samples, with averaged posterior probabilities
+
+    The bags are drawn as frequency weights of the training samples rather
+    than copies of the drawn rows, and the members are fitted by a pool of
+    worker processes sharing one copy of X (see sda_bagging). The members'
+    coefficients are stacked into one matrix, so predicting with the
+    ensemble costs one matrix product instead of one per member.
+
+    Parameters
+    ----------
+    n_estimators : int, default=10
+        Number of members of the ensemble.
+    sample_fraction : float, default=1.0
+        Size of each bag as a fraction of the size of each class.
+    replace : bool, default=True
+        Draw the bags with replacement (bootstrap).
+    lambda_cor : float, default=None
+        Shrinkage parameter for correlations. Estimated per bag if None.
+    lambda_var : float, default=None
+        Shrinkage parameter for variances. Estimated per bag if None.
+    lambda_freqs : float, default=None
+        Shrinkage parameter for class prevalences. Estimated per bag if None.
+    diagonal : bool, default=False
+        If True, skip correlation adjustment and assume diagonal models
+    n_jobs : int, default=None
+        Number of worker processes, None for all cores, 1 for in-process.
+    random_state : int, default=None
+        Seed for drawing the bags.
+    verbose : bool, default=False
+        Verbose mode.
+
+    Attributes
+    ----------
+    classes_ : ndarray, shape (n_classes,)
+        The classes seen at :meth:`fit`.
+    sdamodel_ : dict
+        Model parameters in the format returned by sda_bagging().
+    feature_names_in_ : ndarray, shape (n_features,)
+        Column names of X at :meth:`fit` if X was a data frame (see 
+        ShrinkageDiscriminantAnalysis).
+    """
+    def __init__(self, n_estimators = 10, sample_fraction = 1.0, replace = True, lambda_cor = None,
+                 lambda_var = None, lambda_freqs = None, diagonal = False, n_jobs = None,
+                 random_state = None, verbose = False):
+        self.n_estimators = n_estimators
+        self.sample_fraction = sample_fraction
+        self.replace = replace
+        self.lambda_cor = lambda_cor
+        self.lambda_var = lambda_var
+        self.lambda_freqs = lambda_freqs
+        self.diagonal = diagonal
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.verbose = verbose
+
+    def fit(self, X, y, sample_weight = None):
+        """Fit the members of the ensemble.
+
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features)
+            The training input samples.
+        y : array-like, shape (n_samples,)
+            The target values. An array of int or list of class labels.
+        sample_weight : array-like, shape (n_samples,), default=None
+            Frequency weights of the samples, multiplied by the bag weights.
+
+        Returns
+        -------
+        self : object
+            Returns self.
+        """
+        names = feature_names(X)
+        if names is not None:
+            X = select_columns(X, names)
+        X, y = check_X_y(X, y)
+        self.classes_ = unique_labels(y)
+        if sample_weight is not None:
+            sample_weight = _check_sample_weight(sample_weight, X, ensure_non_negative=True)
+        self.sdamodel_ = sda_bagging(X, y, n_estimators = self.n_estimators, sample_fraction = self.sample_fraction,
+                                     replace = self.replace, lambda_cor = self.lambda_cor,
+                                     lambda_var = self.lambda_var, lambda_freqs = self.lambda_freqs,
+                                     diagonal = self.diagonal, w = sample_weight, n_jobs = self.n_jobs,
+                                     random_state = self.random_state, verbose = self.verbose)
+        if names is not None:
+            self.feature_names_in_ = self.sdamodel_["feature_names"] = names
+        elif hasattr(self, "feature_names_in_"):
+            del self.feature_names_in_
+        return self
+
+    def predict(self, X):
+        """Predict class labels for samples in X.
+
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features)
+            The input samples.
+
+        Returns
+        -------
+        y : ndarray, shape (n_samples,)
+            The label of the class with highest averaged posterior probability.
+        """
+        check_is_fitted(self, ['sdamodel_'])
+        X = self.pvt_check_X(X)
+        return predict_sda(sda_object = self.sdamodel_, Xtest = X, verbose = self.verbose)["predicted_class"]
+
+    def predict_proba(self, X):
+        """Return posterior probabilities of classification, averaged over
+        the members.
+
+        Parameters
+        ----------
+        X : array-like, shape = [n_samples, n_features]
+            Array of samples/test vectors.
+
+        Returns
+        -------
+        C : array, shape = [n_samples, n_classes]
+            Posterior probabilities of classification per class.
+        """
+        check_is_fitted(self, ['sdamodel_'])
+        X = self.pvt_check_X(X)
+        return predict_sda(sda_object = self.sdamodel_, Xtest = X, verbose = self.verbose)["posterior"]
+
+    def predict_topk(self, X, k):
+        """The k most probable classes of each sample and their averaged
+        posterior probabilities (see predict_sda.predict_topk_sda).
+
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features)
+            The input samples.
+        k : int
+            Number of classes per sample, capped at the number of classes:
+            a larger k returns all n_classes columns.
+
+        Returns
+        -------
+        classes : ndarray, shape (n_samples, min(k, n_classes))
+            Class labels, most probable first.
+        posterior : ndarray, shape (n_samples, min(k, n_classes))
+            Their posterior probabilities.
+        """
+        check_is_fitted(self, ['sdamodel_'])
+        X = self.pvt_check_X(X)
+        top = predict_topk_sda(sda_object = self.sdamodel_, Xtest = X, k = k, verbose = self.verbose)
+        return top["classes"], top["posterior"]
+
+    def pvt_check_X(self, X):
+        """Validate the input of prediction, taking the model's columns 
+        from a data frame by name
+        """
+        names = model_feature_names(self.sdamodel_)
+        if names is not None and feature_names(X) is not None:
+            X = select_columns(X, names)
+        return check_array(X)
+
+    def save(self, path, beta_dtype = None):
+        """Save the ensemble (see sda_io.save_sda); it can be loaded with
+           :meth:`load` or SdaPredictor.load.
+
+        Parameters
+        ----------
+        path : string
+            Directory to write the model to.
+        beta_dtype : string, default=None
+            Store the stacked beta as 'float16' or 'int8'.
+        """
+        check_is_fitted(self, ['sdamodel_'])
+        save_sda(self.sdamodel_, path, beta_dtype = beta_dtype)
+
+    @classmethod
+    def load(cls, path, mmap_mode = 'r'):
+        """Load an ensemble saved with :meth:`save` for prediction.
+
+        Parameters
+        ----------
+        path : string
+            Directory the model was saved to.
+        mmap_mode : string, default='r'
+            Memory map the stacked beta read-only; None reads it into memory.
+
+        Returns
+        -------
+        model : BaggedShrinkageDiscriminantAnalysis
+        """
+        model = cls()
+        model.sdamodel_ = load_sda(path, mmap_mode = mmap_mode)
+        model.n_estimators = model.sdamodel_.get("n_estimators", 1)
+        model.classes_ = unique_labels(model.sdamodel_["groups"][:-1])
+        if "feature_names" in model.sdamodel_:
+            model.feature_names_in_ = model.sdamodel_["feature_names"]
+        return model
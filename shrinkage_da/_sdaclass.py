@@ -1,16 +1,28 @@
 """
 Class for Shrinkage Discriminant Analysis using James-Stein shrinkage
 """
-#import numpy as np
-from sklearn.base import BaseEstimator, ClassifierMixin
-from sklearn.utils.validation import check_X_y, check_array, check_is_fitted
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin, TransformerMixin
+from sklearn.utils.validation import check_X_y, check_array, check_is_fitted, column_or_1d, check_consistent_length, _check_sample_weight
 from sklearn.utils.multiclass import unique_labels
 
-from predict_sda import predict_sda
-from sda import sda
-from sda_ranking import sda_ranking
+from .predict_sda import predict_sda, predict_topk_sda, pvt_labels
+from .transform_sda import transform_sda
+from .sda import sda
+from .sda_qda import sda_qda
+from .sda_path import sda_path
+from .sda_add_class import sda_add_class
+from .sda_ranking import sda_ranking
+from .sda_io import save_sda, load_sda
+from .stability_rank import stability_rank
+from .fit_cache import FitCache
+from .duplicates import compress_duplicates
+from .sda_plan import plan_fit, ROUTES
+from .corpcor.pvt_instrument import FitRecorder, recording
+from .corpcor.shrink_misc import pvt_row_blocks
+from .frame_input import feature_names, model_feature_names, select_columns
 
-class ShrinkageDiscriminantAnalysis(BaseEstimator, ClassifierMixin):
+class ShrinkageDiscriminantAnalysis(BaseEstimator, ClassifierMixin, TransformerMixin):
     """ Shrinkage Discriminant Analysis using James-Stein shrinkage
     
     A classifier with a linear decision boundary, generated by fitting class
@@ -38,27 +50,141 @@ class ShrinkageDiscriminantAnalysis(BaseEstimator, ClassifierMixin):
         feature ranking scores
     verbose : bool, default=False
         Verbose mode.
+    n_components : int, default=None
+        Number of discriminant directions (at most n_classes - 1) returned
+        by :meth:`transform`. All if None.
+    instrument : bool or 'time', default=False
+        Record wall time, CPU time, peak allocated bytes (tracemalloc) and 
+        matrix shapes of each stage of :meth:`fit` and :meth:`feature_rank`
+        (centroids, estimate_lambda_var, estimate_lambda, fast_svd with the 
+        branch taken and rank retained, fractional_matrix_power, ...) in 
+        fit_stats_. 'time' skips the comparatively slow memory tracing.
+    instrument_callback : callable, default=None
+        Called with each stage record as soon as the stage finishes, e.g. to
+        forward it to a metrics pipeline. Enables instrumentation.
+    lambda_approx : bool or dict, default=False
+        Estimate the correlation and variance shrinkage intensities (unless 
+        given) from random row and column subsamples of the centred data, 
+        falling back to the exact estimate when the standard error over the
+        subsamples is larger than tol times the estimate. True uses the 
+        default options, a dict is passed to estimate_lambda_subsample() and
+        estimate_lambda_var_subsample() (e.g. n_rows, n_cols, n_subsamples,
+        tol, random_state). The correlation adjustment itself always uses 
+        all data. Standard errors are reported in sdamodel_["lambda_approx"].
+    cache_dir : string or FitCache, default=None
+        Directory of a persistent cache of the correlation factor of X,
+        keyed by a content hash of X and sample_weight and shared between
+        processes (see fit_cache.FitCache). Fits on the same data with any
+        labels or shrinkage intensities (or :meth:`fit` after 
+        :meth:`feature_rank`) then skip the SVD; fits with other weights 
+        miss. A FitCache sets the size limit (1 GiB).
+    compress_duplicates : bool, default=False
+        Collapse identical (sample, label) pairs into one sample weighted by
+        its count before fitting (see duplicates.compress_duplicates). The 
+        model is the same, but the SVD only sees the unique samples.
+    store_training_data : bool, default=True
+        Keep references to the training data in X_ and y_. If False, the 
+        input is validated without copying (float32/float64 arrays are used 
+        as they are and checked for non-finite values in row blocks) and 
+        neither X_ nor y_ is set, nor any other array of n_samples rows or
+        of the size of X: the fitted estimator holds only the prediction 
+        parameters.
+    copy_X : bool, default=True
+        If False and store_training_data is False, a float array X passed to
+        :meth:`fit` is used as scratch space for the centred data and is 
+        overwritten, so that the fit needs no copy of the data.
+    memory_budget : int, default=None
+        Bytes :meth:`fit` may allocate on top of the training data. With a
+        memory_budget or time_budget, :meth:`plan` predicts the peak memory
+        and run time of fitting the full model, the model with subsampled
+        shrinkage intensities (lambda_approx) and the diagonal model, and 
+        :meth:`fit` uses the first of these within both budgets (raising a
+        ValueError if none is). With copy_X=False X is then overwritten 
+        (store_training_data=False) rather than copied.
+    time_budget : float, default=None
+        Seconds :meth:`fit` may take (see memory_budget).
+    feature_groups : array-like, shape (n_features,), default=None
+        Group label of each feature (e.g. pathway or chromosome). Features
+        are then only correlated within their group: the shrunken 
+        correlation matrix is block diagonal with the shrinkage intensity
+        estimated per group (in sdamodel_["feature_groups"]), computed from
+        one small SVD per group instead of one of all features.
+    n_jobs : int, default=None
+        Number of threads processing the feature groups. None uses all cores.
+    prefilter : bool or dict, default=False
+        Drop constant features and duplicates of other features before the
+        fit and map the model, CAT scores and rankings back to all features
+        (constant features get zero coefficients and scores, duplicates 
+        share the coefficient of the kept copy). A dict passes options to
+        prefilter.find_redundant_features, e.g. var_tol to also drop 
+        near-constant features. :meth:`add_class` is not supported then.
+    class_covariance : bool, default=False
+        Estimate a shrunken covariance matrix per class (shrinkage QDA) 
+        instead of one pooled across classes: per class variances, and per
+        class correlations from each class's own low rank SVD (unless
+        diagonal). lambda_cor and lambda_var may then give one value per 
+        class. The decision boundaries are quadratic, so :meth:`transform`,
+        :meth:`add_class` and :meth:`save` are not supported, nor are
+        feature_groups and prefilter. See sda_qda.sda_qda.
+    incremental : bool, default=False
+        Keep the sufficient statistics of the fit (class sizes, centroids,
+        moments and the eigendecomposition of the scatter matrix of the 
+        centred data) in sdamodel_["stats"] so that :meth:`add_class` can
+        extend the model. Its eigenvectors are a p x r array with r up to
+        min(n_samples, n_features), so the model holds about as many floats
+        as X when n_samples <= n_features (and a p x p array otherwise). Without it the fitted model holds only the 
+        prediction parameters. Not possible with store_training_data=False
+        (nor with a budget that chooses an in-place fit).
     
 
     Attributes
     ----------
     X_ : ndarray, shape (n_samples, n_features)
-        The input passed during :meth:`fit`.
+        The input passed during :meth:`fit` (only with store_training_data).
     y_ : ndarray, shape (n_samples,)
-        The labels passed during :meth:`fit`.
+        The labels passed during :meth:`fit` (only with store_training_data).
     classes_ : ndarray, shape (n_classes,)
         The classes seen at :meth:`fit`.
+    fit_stats_ : list of dict
+        Per-stage records of the last :meth:`fit` or :meth:`feature_rank`
+        (only with instrument or instrument_callback).
+    fit_plan_ : dict
+        The :meth:`plan` used by the last :meth:`fit` (only with 
+        memory_budget or time_budget).
+    feature_names_in_ : ndarray, shape (n_features,)
+        Column names of X at :meth:`fit` (only if X was a pandas DataFrame 
+        or Arrow table with string column names). Prediction then takes 
+        only the columns the model uses from a data frame, by name (see 
+        frame_input).
     """
-    def __init__(self, lambda_cor = None, lambda_var = None, lambda_freqs = None, diagonal=False, ranking_score = 'entropy', verbose=False):
+    def __init__(self, lambda_cor = None, lambda_var = None, lambda_freqs = None, diagonal=False, ranking_score = 'entropy', verbose=False, 
+                 n_components=None, instrument=False, instrument_callback=None, lambda_approx=False, cache_dir=None, compress_duplicates=False, store_training_data=True, copy_X=True, 
+                 memory_budget=None, time_budget=None, feature_groups=None, n_jobs=None, 
+                 prefilter=False, class_covariance=False, incremental=False):
         self.lambda_cor = lambda_cor
         self.lambda_var = lambda_var
         self.lambda_freqs = lambda_freqs
         self.diagonal = diagonal
         self.ranking_score = ranking_score
         self.verbose = verbose
+        self.n_components = n_components
+        self.instrument = instrument
+        self.instrument_callback = instrument_callback
+        self.lambda_approx = lambda_approx
+        self.cache_dir = cache_dir
+        self.compress_duplicates = compress_duplicates
+        self.store_training_data = store_training_data
+        self.copy_X = copy_X
+        self.memory_budget = memory_budget
+        self.time_budget = time_budget
+        self.feature_groups = feature_groups
+        self.n_jobs = n_jobs
+        self.prefilter = prefilter
+        self.class_covariance = class_covariance
+        self.incremental = incremental
         
 
-    def fit(self, X, y):
+    def fit(self, X, y, sample_weight=None):
         """Fit ShrinkageDiscriminantAnalysis model according to the given
            training data and parameters.
 
@@ -68,23 +194,80 @@ class ShrinkageDiscriminantAnalysis(BaseEstimator, ClassifierMixin):
             The training input samples.
         y : array-like, shape (n_samples,)
             The target values. An array of int or list of class labels.
+        sample_weight : array-like, shape (n_samples,), default=None
+            Frequency weights of the samples: an integer weight gives the 
+            same model as repeating the sample.
 
         Returns
         -------
         self : object
             Returns self.
         """
+        options = self.pvt_fit_options(X, y)
+        if self.incremental and not options["store_training_data"]:
+            raise ValueError("incremental=True keeps statistics about as large as X, which "
+                             "store_training_data=False does not keep")
+        names = feature_names(X)
         # Check that X and y have correct shape
-        X, y = check_X_y(X, y)
+        X, y = self.pvt_check_X_y(X, y, options["store_training_data"])
         # Store the classes seen during fit
         self.classes_ = unique_labels(y)
+        X_fit, y, sample_weight = self.pvt_weights(X, y, sample_weight)
 
-        self.X_ = X
-        self.y_ = y
+        overwrite_x = (not options["store_training_data"] and not options["copy_X"] 
+                       and X_fit is X and X.flags.writeable)
+        if self.class_covariance:
+            if self.feature_groups is not None or self.prefilter:
+                raise ValueError("feature_groups and prefilter are not supported with class_covariance")
+            with self.pvt_recording():
+                self.sdamodel_ = sda_qda(Xtrain=X_fit, L=y, lambda_cor = self.lambda_cor,
+                                         lambda_var = self.lambda_var, lambda_freqs = self.lambda_freqs,
+                                         diagonal = options["diagonal"], verbose = self.verbose, 
+                                         overwrite_x = overwrite_x, w = sample_weight)
+        else:
+            with self.pvt_recording():
+                self.sdamodel_ = sda(Xtrain=X_fit, L=y, lambda_cor = self.lambda_cor, 
+                                    lambda_var = self.lambda_var, lambda_freqs = self.lambda_freqs, 
+                                    diagonal = options["diagonal"], verbose = self.verbose, keep_stats = self.incremental,
+                                    overwrite_x = overwrite_x, lambda_approx = options["lambda_approx"],
+                                    cache = self.pvt_cache(), w = sample_weight, 
+                                    feature_groups = self.feature_groups, n_jobs = self.n_jobs,
+                                    prefilter = self.prefilter)
+        self.pvt_set_feature_names(names)
         # Return the classifier
-        self.sdamodel_ = sda(Xtrain=X, L=y, lambda_cor = self.lambda_cor, 
-                            lambda_var = self.lambda_var, lambda_freqs = self.lambda_freqs, 
-                            diagonal = self.diagonal, verbose = self.verbose)
+        return self
+
+    def add_class(self, X_new, label):
+        """Extend the fitted model with a new class without refitting on the
+           original training data (needs incremental=True). The cost is 
+           O(m*r*p + m^2*p + (r+m)^3) for m new samples and the stored 
+           factor of rank r (see sda_add_class.sda_add_class), plus O(r^2*p)
+           for re-standardising it to the new pooled variances; the 
+           correlation shrinkage intensity of the original fit is kept.
+
+        Parameters
+        ----------
+        X_new : array-like, shape (n_new_samples, n_features)
+            Training samples of the new class.
+        label : object
+            Label of the new class.
+
+        Returns
+        -------
+        self : object
+            Returns self.
+        """
+        check_is_fitted(self, ['sdamodel_'])
+        if "stats" not in self.sdamodel_:
+            raise ValueError("add_class needs a model fitted with incremental=True")
+        X_new = self.pvt_check_X(X_new)
+        self.sdamodel_ = sda_add_class(self.sdamodel_, X_new, label, verbose = self.verbose)
+        self.pvt_set_feature_names(getattr(self, "feature_names_in_", None))
+        # in the order of the model's classes (the new one last), as predict_proba
+        self.classes_ = pvt_labels(self.sdamodel_["groups"][:-1])
+        if hasattr(self, "X_"):
+            self.X_ = np.vstack((self.X_, X_new))
+            self.y_ = pvt_labels(list(self.y_) + [label] * X_new.shape[0])
         return self
 
     def predict(self, X):
@@ -102,10 +285,10 @@ class ShrinkageDiscriminantAnalysis(BaseEstimator, ClassifierMixin):
             seen udring fit.
         """
         # Check is fit had been called
-        check_is_fitted(self, ['X_', 'y_', 'sdamodel_'])
+        check_is_fitted(self, ['sdamodel_'])
 
         # Input validation
-        X = check_array(X)
+        X = self.pvt_check_X(X)
         my_preds = predict_sda(sda_object = self.sdamodel_, Xtest = X, verbose = self.verbose)
         return my_preds["predicted_class"]
     
@@ -122,15 +305,85 @@ class ShrinkageDiscriminantAnalysis(BaseEstimator, ClassifierMixin):
         """
 
         # Check is fit had been called
-        check_is_fitted(self, ['X_', 'y_'])
+        check_is_fitted(self, ['sdamodel_'])
 
         # Input validation
-        X = check_array(X)
+        X = self.pvt_check_X(X)
         
         my_preds = predict_sda(sda_object = self.sdamodel_, Xtest = X, verbose = self.verbose)
         return my_preds["posterior"]
 
-    def feature_rank(self, X, y):
+    def predict_topk(self, X, k):
+        """The k most probable classes of each sample and their posterior
+        probabilities. Scores are computed in blocks of rows and only the 
+        top k classes are kept per row, so memory is O(n_samples * k) 
+        rather than O(n_samples * n_classes).
+
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features)
+            The input samples.
+        k : int
+            Number of classes per sample, capped at the number of classes:
+            a larger k returns all n_classes columns.
+
+        Returns
+        -------
+        classes : ndarray, shape (n_samples, min(k, n_classes))
+            Class labels, most probable first.
+        posterior : ndarray, shape (n_samples, min(k, n_classes))
+            Their posterior probabilities.
+        """
+        check_is_fitted(self, ['sdamodel_'])
+        X = self.pvt_check_X(X)
+        top = predict_topk_sda(sda_object = self.sdamodel_, Xtest = X, k = k, verbose = self.verbose)
+        return top["classes"], top["posterior"]
+
+    def transform(self, X):
+        """Project samples onto the discriminant directions.
+
+        The directions span the (at most n_classes - 1 dimensional) space of
+        the centroids after whitening with the shrunken covariance matrix,
+        ordered by between-class variance. Euclidean distances between the
+        projected samples are Mahalanobis distances within this space.
+
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features)
+            The input samples.
+
+        Returns
+        -------
+        X_new : ndarray, shape (n_samples, n_components)
+            Coordinates in the discriminant space.
+        """
+        check_is_fitted(self, ['sdamodel_'])
+        X = self.pvt_check_X(X)
+        return transform_sda(sda_object = self.sdamodel_, Xtest = X, n_components = self.n_components, 
+                             verbose = self.verbose)
+
+    def fit_transform(self, X, y, sample_weight=None):
+        """Fit the model and project X onto the discriminant directions.
+
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features)
+            The training input samples.
+        y : array-like, shape (n_samples,)
+            The target values.
+        sample_weight : array-like, shape (n_samples,), default=None
+            Frequency weights of the samples (see :meth:`fit`). All samples
+            are projected, also those with weight zero.
+
+        Returns
+        -------
+        X_new : ndarray, shape (n_samples, n_components)
+        """
+        if not self.store_training_data and not self.copy_X:
+            raise ValueError("fit_transform needs X after fitting, which copy_X=False overwrites")
+        return self.fit(X, y, sample_weight=sample_weight).transform(X)
+
+    def feature_rank(self, X, y, sample_weight=None):
         """Rank features utilising correlation adjusted t-scores using the given
            training data and parameters.
            
@@ -142,6 +395,8 @@ class ShrinkageDiscriminantAnalysis(BaseEstimator, ClassifierMixin):
             The training input samples.
         y : array-like, shape (n_samples,)
             The target values. An array of int or list of class labels.
+        sample_weight : array-like, shape (n_samples,), default=None
+            Frequency weights of the samples (see :meth:`fit`).
 
         Returns
         -------
@@ -149,14 +404,283 @@ class ShrinkageDiscriminantAnalysis(BaseEstimator, ClassifierMixin):
             Returns self.
         """
         # Check that X and y have correct shape
-        X, y = check_X_y(X, y)
+        X, y = self.pvt_check_X_y(X, y)
         # Store the classes seen during fit
         self.classes_ = unique_labels(y)
+        X, y, sample_weight = self.pvt_weights(X, y, sample_weight)
 
-        self.X_ = X
-        self.y_ = y
-        self.rankings_ = sda_ranking(Xtrain=X, L=y, lambda_cor = self.lambda_cor, 
-                                   lambda_var = self.lambda_var, lambda_freqs = self.lambda_freqs, 
-                                   ranking_score = self.ranking_score, diagonal = self.diagonal, verbose = self.verbose)
+        with self.pvt_recording():
+            self.rankings_ = sda_ranking(Xtrain=X, L=y, lambda_cor = self.lambda_cor, 
+                                       lambda_var = self.lambda_var, lambda_freqs = self.lambda_freqs, 
+                                       ranking_score = self.ranking_score, diagonal = self.diagonal, verbose = self.verbose,
+                                       lambda_approx = self.lambda_approx, cache = self.pvt_cache(),
+                                       w = sample_weight, feature_groups = self.feature_groups, 
+                                       n_jobs = self.n_jobs, prefilter = self.prefilter)
         # Return the classifier
-        return self
\ No newline at end of file
+        return self
+
+    def fit_path(self, X, y, ks, X_test=None, y_test=None, sample_weight=None):
+        """Fit models on the top k CAT score ranked features for each k in
+           ks in one pass, growing the correlation factor by the added
+           features instead of refitting per k (see sda_path.sda_path).
+
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features)
+            The training input samples.
+        y : array-like, shape (n_samples,)
+            The target values. An array of int or list of class labels.
+        ks : list of int
+            Numbers of top ranked features.
+        X_test, y_test : array-like, default=None
+            Validation samples and labels; the misclassification rate of
+            each model on them is stored in path_["error"].
+        sample_weight : array-like, shape (n_samples,), default=None
+            Frequency weights of the samples (see :meth:`fit`).
+
+        Returns
+        -------
+        self : object
+            Returns self, with path_ holding ks, the ranking (idx), the
+            models (usable as sdamodel_) and the validation error.
+        """
+        names = feature_names(X)
+        X, y = self.pvt_check_X_y(X, y)
+        self.classes_ = unique_labels(y)
+        if X_test is not None:
+            if names is not None and feature_names(X_test) is not None:
+                X_test = select_columns(X_test, names)
+            X_test = check_array(X_test)
+        X, y, sample_weight = self.pvt_weights(X, y, sample_weight)
+        with self.pvt_recording():
+            self.path_ = sda_path(Xtrain=X, L=y, ks=ks, lambda_cor = self.lambda_cor, 
+                                  lambda_var = self.lambda_var, lambda_freqs = self.lambda_freqs, 
+                                  ranking_score = self.ranking_score, diagonal = self.diagonal, 
+                                  verbose = self.verbose, w = sample_weight, Xtest = X_test, Ltest = y_test)
+        if names is not None: # the models take data frames by column name
+            for model in self.path_["models"]:
+                model["feature_names"] = names
+        return self
+
+    def stability_rank(self, X, y, top_k, n_draws=100, sample_fraction=0.5, replace=False, 
+                       n_jobs=None, random_state=None):
+        """Stability selection of features: count how often each feature is
+           among the top_k CAT score ranked features over stratified
+           subsamples of the given training data. The draws run in parallel
+           worker processes sharing one copy of X.
+
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features)
+            The training input samples.
+        y : array-like, shape (n_samples,)
+            The target values. An array of int or list of class labels.
+        top_k : int
+            Number of top ranking features counted as selected per draw.
+        n_draws : int, default=100
+            Number of subsamples.
+        sample_fraction : float, default=0.5
+            Fraction of each class drawn per subsample.
+        replace : bool, default=False
+            Bootstrap (draw with replacement) instead of subsampling.
+        n_jobs : int, default=None
+            Number of worker processes, None for all cores.
+        random_state : int, default=None
+            Seed for drawing the subsamples.
+
+        Returns
+        -------
+        self : object
+            Returns self.
+        """
+        X, y = self.pvt_check_X_y(X, y)
+        self.classes_ = unique_labels(y)
+        self.stability_ = stability_rank(Xtrain=X, L=y, top_k=top_k, n_draws=n_draws, 
+                                         sample_fraction=sample_fraction, replace=replace, 
+                                         lambda_cor = self.lambda_cor, lambda_var = self.lambda_var, 
+                                         lambda_freqs = self.lambda_freqs, ranking_score = self.ranking_score, 
+                                         diagonal = self.diagonal, n_jobs=n_jobs, 
+                                         random_state=random_state, verbose = self.verbose)
+        return self
+
+    def save(self, path, beta_dtype=None):
+        """Save the fitted model in a compact, memory-mappable format (see
+           sda_io.save_sda). Training data is not stored.
+
+        Parameters
+        ----------
+        path : string
+            Directory to write the model to.
+        beta_dtype : string, default=None
+            Store beta as 'float16' or as 'int8' with per-class scales, 4x or
+            8x smaller than float64 (see sda_quantize.quantization_report()
+            for the effect on the posteriors). This saves memory only,
+            prediction is not faster.
+        """
+        check_is_fitted(self, ['sdamodel_'])
+        save_sda(self.sdamodel_, path, beta_dtype = beta_dtype)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Load a model saved with :meth:`save` for prediction.
+
+        Parameters
+        ----------
+        path : string
+            Directory the model was saved to.
+        mmap_mode : string, default='r'
+            Memory map beta read-only so that processes share one copy; None
+            reads it into memory.
+
+        Returns
+        -------
+        model : ShrinkageDiscriminantAnalysis
+            Fitted estimator (without training data).
+        """
+        model = cls()
+        model.sdamodel_ = load_sda(path, mmap_mode = mmap_mode)
+        model.classes_ = unique_labels(model.sdamodel_["groups"][:-1])
+        if "feature_names" in model.sdamodel_:
+            model.feature_names_in_ = model.sdamodel_["feature_names"]
+        return model
+
+    def plan(self, n_samples, n_features, n_classes):
+        """Predict the peak memory and run time of :meth:`fit` per stage
+           for each way of fitting, and choose one within memory_budget and
+           time_budget.
+
+        Parameters
+        ----------
+        n_samples, n_features : int
+            Shape of the training data.
+        n_classes : int
+            Number of classes.
+
+        Returns
+        -------
+        plan : dict
+            routes (for 'full', 'approx' and 'diagonal': the estimator
+            options, predicted peak_memory in bytes on top of the training 
+            data, time in seconds and per stage records) and chosen (the 
+            route :meth:`fit` would use, None if none is within the budgets).
+            See sda_plan.plan_fit.
+        """
+        routes = ("diagonal",) if self.diagonal else ROUTES
+        budget = self.memory_budget is not None or self.time_budget is not None
+        in_place = not self.copy_X and (budget or not self.store_training_data)
+        return plan_fit(n_samples, n_features, n_classes, self.memory_budget, self.time_budget,
+                        routes = routes, in_place = in_place, keep_stats = self.incremental)
+
+    def pvt_fit_options(self, X, y):
+        """Options of the fit: the parameters, or the route chosen by 
+        :meth:`plan` if a budget is given
+        """
+        options = dict(store_training_data = self.store_training_data, copy_X = self.copy_X,
+                       diagonal = self.diagonal, lambda_approx = self.lambda_approx)
+        if self.memory_budget is None and self.time_budget is None:
+            return options
+        n, p = np.shape(X)
+        plan = self.plan(n, p, len(unique_labels(y)))
+        if plan["chosen"] is None:
+            cheapest = min(plan["routes"], key = lambda r: r["peak_memory"])
+            raise ValueError("No way of fitting within memory_budget and time_budget, the cheapest "
+                             "(%s) is predicted to need %d bytes and %.3g seconds" 
+                             % (cheapest["route"], cheapest["peak_memory"], cheapest["time"]))
+        self.fit_plan_ = plan
+        options.update(next(r["options"] for r in plan["routes"] if r["route"] == plan["chosen"]))
+        if self.lambda_approx: # keep the given subsampling options
+            options["lambda_approx"] = self.lambda_approx
+        return options
+
+    def pvt_check_X_y(self, X, y, store_training_data = None):
+        """Validate the training data, storing it in X_ and y_ if requested
+        """
+        names = feature_names(X)
+        if names is not None: # data frame: convert its columns rather than the frame
+            X = select_columns(X, names)
+        if store_training_data is None:
+            store_training_data = self.store_training_data
+        if store_training_data:
+            X, y = check_X_y(X, y)
+            self.X_ = X
+            self.y_ = y
+            return X, y
+        return pvt_check_X_y_lean(X, y)
+
+    def pvt_check_X(self, X):
+        """Validate the input of prediction. Of a data frame only the
+        columns the model uses are taken, by name, if the model was fitted
+        on a data frame
+        """
+        names = model_feature_names(self.sdamodel_)
+        if names is not None and feature_names(X) is not None:
+            X = select_columns(X, names)
+        return check_array(X)
+
+    def pvt_set_feature_names(self, names):
+        """Record the column names of the training data frame in 
+        feature_names_in_ and in the model (so that they are saved with it)
+        """
+        if names is None:
+            if hasattr(self, "feature_names_in_"):
+                del self.feature_names_in_
+            return
+        self.feature_names_in_ = names
+        self.sdamodel_["feature_names"] = names
+
+    def pvt_weights(self, X, y, sample_weight):
+        """Validate the sample weights and collapse duplicate samples if 
+        requested
+        """
+        if sample_weight is not None:
+            sample_weight = _check_sample_weight(sample_weight, X, ensure_non_negative=True)
+        if self.compress_duplicates:
+            X, y, sample_weight = compress_duplicates(X, y, sample_weight)
+        return X, y, sample_weight
+
+    def pvt_cache(self):
+        if self.cache_dir is None or isinstance(self.cache_dir, FitCache):
+            return self.cache_dir
+        return FitCache(self.cache_dir)
+
+    def pvt_recording(self):
+        """Context manager recording the stages of a fit into fit_stats_ if
+        instrumentation is enabled
+        """
+        if not self.instrument and self.instrument_callback is None:
+            return pvt_no_recording
+        recorder = FitRecorder(callback = self.instrument_callback, 
+                               trace_memory = self.instrument != 'time')
+        self.fit_stats_ = recorder.stages
+        return recording(recorder)
+
+class pvt_NoRecording(object):
+    def __enter__(self):
+        return None
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+pvt_no_recording = pvt_NoRecording()
+
+def pvt_check_X_y_lean(X, y):
+    """Copy-free counterpart of check_X_y for 2D numeric arrays
+    
+    Float arrays are returned as they are (keeping dtype and memory order), 
+    other numeric input is converted to float64. Non-finite values are 
+    searched for in row blocks so that no n x p temporary is created.
+    """
+    X = np.asarray(X)
+    if X.dtype.kind not in "f":
+        if X.dtype.kind not in "biu":
+            raise ValueError("X must be a numeric array, got dtype " + str(X.dtype))
+        X = X.astype(np.float64)
+    if X.ndim != 2:
+        raise ValueError("Expected 2D array, got array with shape " + str(X.shape))
+    if X.shape[0] < 1 or X.shape[1] < 1:
+        raise ValueError("Found array with shape " + str(X.shape) + " while a minimum of 1 sample and 1 feature is required.")
+    y = column_or_1d(y)
+    check_consistent_length(X, y)
+    for b in pvt_row_blocks(*X.shape):
+        if not np.isfinite(X[b,:]).all():
+            raise ValueError("Input contains NaN or infinity.")
+    return X, y
@@ -0,0 +1,458 @@
+"""
+Sliding window Shrinkage Discriminant Analysis with sample add/remove updates
+"""
+from __future__ import print_function, division
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.utils.validation import check_X_y, check_array, check_is_fitted
+
+from .predict_sda import predict_sda
+from .centroids import pvt_freqs_shrink
+from .corpcor.fast_svd import fast_svd
+from .corpcor.shrink_misc import minmax
+from .corpcor.shrink_intensity import pvt_lambda_var_moments
+from .corpcor.pvt_cppowscor import pvt_cppowscor_apply, pvt_eigen_update, pvt_rescale_factor
+
+class WindowedShrinkageDiscriminantAnalysis(BaseEstimator, ClassifierMixin):
+    """ Shrinkage Discriminant Analysis over a sliding window of the most
+    recent samples
+
+    Samples are added with :meth:`partial_fit`; once more than window_size
+    samples have been seen the oldest ones leave the window. Instead of
+    refitting the whole window, the statistics of the window are up- and
+    downdated for the m samples entering or leaving it:
+
+    - class counts and power sums up to fourth order (centroids, pooled
+      variances, the variance shrinkage intensity and the fourth moments
+      of lambda_cor) in O(m*p);
+    - the eigendecomposition V diag(e) V' of the pooled scatter matrix of
+      the standardised class-centred window, r = rank <= min(N, p) for a
+      window of N samples, by a rank m update: the m deviations are
+      projected onto the stored basis (O(m*r*p)), only their residual is
+      orthogonalised (O(m^2*p)) and a small (r+m) x (r+m) eigenproblem is
+      solved (O((r+m)^3)). V is kept as an orthonormal basis times a small
+      rotation, so the p x r vectors are not rotated at every update;
+    - with lambda_cor estimated, running sums of the squared row norms of
+      the class-centred data (for the sum of squared correlation
+      variances) in O((m + N_c)*p), N_c the size of the classes changed
+      (a matrix-vector product with their rows).
+
+    A refit then costs O(r*p*K) for K classes, plus the small eigenproblem
+    of the update, instead of the O(N*p*min(N, p)) of a batch fit.
+
+    The standardisation of the scatter matrix changes with every update.
+    It is kept on a reference scale, which is moved to the current pooled
+    standard deviations when any of them has drifted by more than
+    rescale_tol relative to the reference. This re-standardises the stored
+    factor (O(r^2*p)) and recomputes the row norm sums and power sums from
+    the window (O(N*p)). Between such rescalings the correlation matrix
+    used is E R E, R the exact correlation matrix of the window and E a
+    diagonal matrix with entries within [1 - rescale_tol, 1 + rescale_tol],
+    so each correlation is off by a relative (1 + rescale_tol)^2 - 1 at
+    most (10.25% for 0.05), and lambda_cor is estimated on the same scale.
+    The default rescale_tol=0 rescales at every refit and gives the batch
+    model of the window (as ShrinkageDiscriminantAnalysis fitted on the
+    window, up to rounding).
+
+    Parameters
+    ----------
+    window_size : int, default=1000
+        Number of most recent samples the model is fitted on.
+    lambda_cor : float, default=None
+        Shrinkage parameter for correlations. Estimated from data if None.
+    lambda_var : float, default=None
+        Shrinkage parameter for variances. Estimated from data if None.
+    lambda_freqs : float, default=None
+        Shrinkage parameter for class prevalences. Estimated from data if None.
+    diagonal : bool, default=False
+        If True, skip correlation adjustment and assume diagonal model
+    rescale_tol : float, default=0
+        Relative drift in feature standard deviations tolerated before the
+        factor is re-standardised (see above; 0 for the exact model).
+    verbose : bool, default=False
+        Verbose mode.
+
+    Attributes
+    ----------
+    classes_ : ndarray, shape (n_classes,)
+        The classes currently present in the window, sorted (the columns of
+        predict_proba, as for ShrinkageDiscriminantAnalysis).
+    n_window_ : int
+        Number of samples currently in the window.
+    sdamodel_ : dict
+        Model parameters in the format returned by sda().
+    """
+    def __init__(self, window_size = 1000, lambda_cor = None, lambda_var = None, lambda_freqs = None,
+                 diagonal = False, rescale_tol = 0, verbose = False):
+        self.window_size = window_size
+        self.lambda_cor = lambda_cor
+        self.lambda_var = lambda_var
+        self.lambda_freqs = lambda_freqs
+        self.diagonal = diagonal
+        self.rescale_tol = rescale_tol
+        self.verbose = verbose
+
+    def fit(self, X, y):
+        """Start a new window from the given training data (only the last
+           window_size samples are kept).
+
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features)
+            The training input samples.
+        y : array-like, shape (n_samples,)
+            The target values. An array of int or list of class labels.
+
+        Returns
+        -------
+        self : object
+            Returns self.
+        """
+        X, y = check_X_y(X, y)
+        N, p = self.window_size, X.shape[1]
+        self.shift_ = np.mean(X, axis=0) # power sums are taken about this shift for accuracy
+        self.labels_ = []
+        self.buffer_ = np.zeros((N, p))   # shifted samples in the window (ring buffer)
+        self.codes_ = np.full(N, -1)      # class of each buffer slot, -1 if empty
+        self.start_ = 0                   # slot of the oldest sample
+        self.n_window_ = 0
+        self.sums_ = np.zeros((0, 5, p))  # per class: count, sum of x, x^2, x^3, x^4
+        self.ref_scale_ = None            # reference standardisation D0
+        self.factor_ = None               # basis, rotation and eigenvalues of the scaled scatter matrix
+        self.norm_sums_ = None            # per class: sums of a, a^2 and s'Ms (see pvt_norm_sums())
+        self.norm_vectors_ = None         # per class: sums of a*y and Ms
+        return self.partial_fit(X, y)
+
+    def partial_fit(self, X, y, refit = True):
+        """Add samples to the window, removing the oldest samples beyond
+           window_size.
+
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features)
+            The new samples, oldest first.
+        y : array-like, shape (n_samples,)
+            The target values. An array of int or list of class labels.
+        refit : bool, default=True
+            Update the model parameters sdamodel_ (otherwise only the window
+            statistics are updated).
+
+        Returns
+        -------
+        self : object
+            Returns self.
+        """
+        if not hasattr(self, "buffer_"):
+            return self.fit(X, y)
+        X, y = check_X_y(X, y)
+        N = self.window_size
+        if X.shape[1] != self.buffer_.shape[1]:
+            raise ValueError("Number of features in X does not match the window (" + str(self.buffer_.shape[1]) + ")")
+        if X.shape[0] > N:
+            X, y = X[-N:, :], y[-N:]
+        m = X.shape[0]
+        overflow = self.n_window_ + m - N
+        if overflow > 0:
+            self.remove(overflow, refit = False)
+        codes = np.zeros(m, dtype=int)
+        for i, label in enumerate(y):
+            if label not in self.labels_:
+                self.labels_.append(label)
+                self.sums_ = np.concatenate((self.sums_, np.zeros((1,) + self.sums_.shape[1:])))
+                if self.norm_sums_ is not None:
+                    self.norm_sums_ = np.concatenate((self.norm_sums_, np.zeros((1, 3))))
+                    self.norm_vectors_ = np.concatenate((self.norm_vectors_, np.zeros((1,) + self.norm_vectors_.shape[1:])))
+            codes[i] = self.labels_.index(label)
+        z = X - self.shift_
+        self.pvt_update(z, codes, sign = 1) # before the rows are in the window
+        slots = (self.start_ + self.n_window_ + np.arange(m)) % N
+        self.buffer_[slots, :] = z
+        self.codes_[slots] = codes
+        self.n_window_ += m
+        if refit:
+            self.sdamodel_ = self.pvt_model()
+        return self
+
+    def remove(self, n_samples, refit = True):
+        """Remove the n_samples oldest samples from the window.
+
+        Parameters
+        ----------
+        n_samples : int
+            Number of samples to remove.
+        refit : bool, default=True
+            Update the model parameters sdamodel_.
+
+        Returns
+        -------
+        self : object
+            Returns self.
+        """
+        check_is_fitted(self, ["buffer_"])
+        N = self.window_size
+        n_samples = min(n_samples, self.n_window_)
+        slots = (self.start_ + np.arange(n_samples)) % N
+        self.pvt_update(self.buffer_[slots, :], self.codes_[slots], sign = -1) # while the rows are in the window
+        self.codes_[slots] = -1
+        self.start_ = (self.start_ + n_samples) % N
+        self.n_window_ -= n_samples
+        if refit:
+            self.sdamodel_ = self.pvt_model()
+        return self
+
+    def predict(self, X):
+        """Predict class labels for samples in X.
+
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features)
+            The input samples.
+
+        Returns
+        -------
+        y : ndarray, shape (n_samples,)
+            The label of the class with highest posterior probability.
+        """
+        check_is_fitted(self, ['sdamodel_'])
+        X = check_array(X)
+        return predict_sda(sda_object = self.sdamodel_, Xtest = X, verbose = self.verbose)["predicted_class"]
+
+    def predict_proba(self, X):
+        """Return posterior probabilities of classification.
+
+        Parameters
+        ----------
+        X : array-like, shape = [n_samples, n_features]
+            Array of samples/test vectors.
+
+        Returns
+        -------
+        C : array, shape = [n_samples, n_classes]
+            Posterior probabilities of classification per class (columns in
+            the order of classes_).
+        """
+        check_is_fitted(self, ['sdamodel_'])
+        X = check_array(X)
+        return predict_sda(sda_object = self.sdamodel_, Xtest = X, verbose = self.verbose)["posterior"]
+
+    def pvt_model(self):
+        """Compute the sda() model parameters of the current window from the
+        window statistics.
+        """
+        present = np.flatnonzero(self.sums_[:, 0, 0] > 0)
+        if len(present) < 2:
+            raise ValueError("The window must contain samples from at least two classes")
+        if self.n_window_ < 3:
+            raise ValueError("Sample size too small. n_samples = " + str(self.n_window_))
+        # classes in sorted order, as unique_labels() of the batch estimator
+        present = present[np.argsort(np.asarray([self.labels_[k] for k in present]), kind = "stable")]
+        samples, mu, m2, m4 = pvt_pooled_moments(self.sums_[present])
+        n = self.n_window_
+        h1 = n/(n-1)
+        v = h1 * m2 / n # empirical variances of the centred data
+        v[v < np.finfo(float).eps] = 0
+        if not self.diagonal and self.lambda_cor != 1 and (
+                self.factor_ is None or (self.lambda_cor is None and self.norm_sums_ is None)
+                or pvt_scale_drift(np.sqrt(v), self.ref_scale_) > self.rescale_tol):
+            if self.verbose:
+                print("Re-standardising the window statistics on the current scale")
+            self.pvt_rebuild(np.sqrt(v))
+            samples, mu, m2, m4 = pvt_pooled_moments(self.sums_[present])
+        cl_count = len(present)
+        self.classes_ = np.array([self.labels_[k] for k in present])
+        regularisation = dict(lambda_cor = 1, lambda_var = np.nan, lambda_freqs = np.nan)
+        freqs, regularisation["lambda_freqs"] = pvt_freqs_shrink(samples, lambda_freqs = self.lambda_freqs, verbose = self.verbose)
+        mup = np.matmul(mu, freqs)
+        target = np.median(v)
+        if self.lambda_var is None:
+            lambda_var, _ = pvt_lambda_var_moments(m2, m4, n)
+        else:
+            lambda_var = minmax(self.lambda_var)
+        regularisation["lambda_var"] = lambda_var
+        vs = lambda_var * target + (1 - lambda_var) * v
+        sc = np.sqrt(vs * (n-1)/(n-cl_count))
+        pw = (mu - mup[:, None]) / sc[:, None]
+        was_diagonal = self.diagonal
+        if not self.diagonal:
+            try:
+                pw, regularisation["lambda_cor"] = self.pvt_correlation_adjust(pw, present, m2, m4)
+            except np.linalg.LinAlgError:
+                was_diagonal = True
+        pw = pw / sc[:, None]
+        # the window statistics are about shift_, the model is for unshifted data
+        alpha = np.zeros((cl_count, 1))
+        alpha[:, 0] = np.log(freqs) - np.sum(pw * ((mu + mup[:, None])/2 + self.shift_[:, None]), axis=0)
+        groups = list(self.classes_)
+        groups.append("(pooled)")
+        return dict(regularisation=regularisation, freqs=freqs, alpha=alpha,
+                    beta=pw.T, groups=groups, was_diagonal=was_diagonal)
+
+    def pvt_correlation_adjust(self, pw, present, m2, m4):
+        """Multiply pw by the inverse of the shrunken correlation matrix of the
+        class-centred window, using the up/downdated eigendecomposition of its
+        scatter matrix (O(r*p*K)).
+        """
+        n, p = self.n_window_, pw.shape[0]
+        d0 = self.ref_scale_
+        basis, rotation, e = self.factor_
+        if self.lambda_cor is not None:
+            lambda_cor = minmax(self.lambda_cor)
+        elif p == 1:
+            lambda_cor = 1
+        else:
+            # same estimator as estimate_lambda(): the squared correlations
+            # from the eigenvalues, the variances of the correlations from
+            # the row norm sums and the fourth power sums
+            colsq = m2 / n / d0**2
+            sE2R = np.sum(e**2) / n**2 - np.sum(colsq**2)
+            row4 = sum(pvt_row_norms4(self.norm_sums_[k], self.norm_vectors_[k], self.sums_[k, 0, 0],
+                                      self.sums_[k, 1, :] / d0) for k in present)
+            sER2 = (row4 - np.sum(m4 / d0**4)) / n
+            lambda_cor = 1 if sE2R <= 0 else minmax((sER2 - sE2R)/sE2R / (n-1))
+        if lambda_cor == 1 or len(e) == 0:
+            return pw, lambda_cor
+        factor = dict(d = np.sqrt(e), basis = basis, rotation = rotation, utwu = np.eye(len(e))/n,
+                      w2 = 1/n, zeros = np.isinf(d0))
+        return pvt_cppowscor_apply(factor, pw, -1, lambda_cor), lambda_cor
+
+    def pvt_update(self, z, codes, sign):
+        """Up- (sign=1, rows not yet in the window) or downdate (sign=-1, rows
+        still in the window) the power sums, the scatter factor and the row
+        norm sums for the shifted rows z of the classes codes
+        """
+        if self.factor_ is not None or self.norm_sums_ is not None:
+            d0 = self.ref_scale_
+            columns, signs = [], []
+            for k in np.unique(codes):
+                zk = z[codes == k, :]
+                mk, nk = zk.shape[0], self.sums_[k, 0, 0]
+                if self.factor_ is not None:
+                    dev = pvt_scatter_change(zk, nk, self.sums_[k, 1, :], sign)
+                    columns.append(dev / d0)
+                    signs.append(np.full(dev.shape[0], float(sign)))
+                if self.norm_sums_ is not None:
+                    members = self.buffer_[self.codes_ == k, :] / d0 # the class before the update
+                    pvt_update_norm_sums(self.norm_sums_[k], self.norm_vectors_[k], members, zk / d0,
+                                         self.sums_[k, 1, :] / d0, sign)
+            if self.factor_ is not None and len(columns) > 0:
+                tol = max(self.n_window_ + len(z), len(d0)) * np.finfo(float).eps
+                self.factor_ = pvt_eigen_update(self.factor_, np.concatenate(columns).T,
+                                                np.concatenate(signs), tol)
+        pvt_add_power_sums(self.sums_, z, codes, sign)
+
+    def pvt_rebuild(self, sd):
+        """Re-centre the window, recompute the power sums and the row norm sums
+        exactly and re-standardise the scatter factor on the scale sd (computed
+        from the window if there is none on the same zero-variance features).
+        """
+        slots = (self.start_ + np.arange(self.n_window_)) % self.window_size
+        new_shift = self.shift_ + np.mean(self.buffer_[slots, :], axis=0)
+        self.buffer_ += self.shift_ - new_shift
+        self.shift_ = new_shift
+        self.sums_[:] = 0
+        pvt_add_power_sums(self.sums_, self.buffer_[slots, :], self.codes_[slots], sign = 1)
+        d0 = sd.copy()
+        d0[d0 == 0] = np.inf
+        old = self.ref_scale_
+        if self.factor_ is not None and np.array_equal(np.isinf(old), np.isinf(d0)):
+            ratio = np.zeros(len(d0))
+            ratio[np.isfinite(d0)] = old[np.isfinite(d0)] / d0[np.isfinite(d0)]
+            self.factor_ = pvt_rescale_factor(self.factor_, ratio)
+        else:
+            # class-centred window, standardised
+            codes = self.codes_[slots]
+            xs = self.buffer_[slots, :] - (self.sums_[codes, 1, :] / self.sums_[codes, 0, :1])
+            xs /= d0
+            d, _, v = fast_svd(xs, compute_u = False)
+            self.factor_ = (v, np.eye(len(d)), d**2)
+        self.ref_scale_ = d0
+        self.norm_sums_ = self.norm_vectors_ = None
+        if self.lambda_cor is None:
+            K, p = self.sums_.shape[0], self.sums_.shape[2]
+            self.norm_sums_ = np.zeros((K, 3))
+            self.norm_vectors_ = np.zeros((K, 2, p))
+            for k in range(K):
+                yk = self.buffer_[self.codes_ == k, :] / d0
+                pvt_update_norm_sums(self.norm_sums_[k], self.norm_vectors_[k], yk[:0], yk, np.zeros(p), 1)
+
+def pvt_pooled_moments(sums):
+    """Class sizes, class means and the pooled central second and fourth
+    moment sums of the class-centred data from per-class power sums
+    """
+    samples = sums[:, 0, 0]
+    mu = (sums[:, 1, :] / samples[:, None]).T # p x cl_count
+    m2 = np.zeros(sums.shape[2])
+    m4 = np.zeros(sums.shape[2])
+    for k in range(0, sums.shape[0]):
+        nk, s1, s2, s3, s4 = sums[k, 0, :], sums[k, 1, :], sums[k, 2, :], sums[k, 3, :], sums[k, 4, :]
+        mk = mu[:, k]
+        m2 += s2 - nk * mk**2
+        m4 += s4 - 4 * mk * s3 + 6 * mk**2 * s2 - 3 * nk * mk**4
+    return samples, mu, np.maximum(m2, 0), np.maximum(m4, 0)
+
+def pvt_add_power_sums(sums, z, codes, sign):
+    """Add (sign=1) or subtract (sign=-1) the power sums of the rows z to the
+    per-class sums
+    """
+    for k in np.unique(codes):
+        zk = z[codes == k, :]
+        zk2 = zk * zk
+        sums[k, 0, :] += sign * zk.shape[0]
+        sums[k, 1, :] += sign * np.sum(zk, axis=0)
+        sums[k, 2, :] += sign * np.sum(zk2, axis=0)
+        sums[k, 3, :] += sign * np.sum(zk2 * zk, axis=0)
+        sums[k, 4, :] += sign * np.sum(zk2 * zk2, axis=0)
+
+def pvt_scatter_change(zk, nk, sk, sign):
+    """Rows whose outer products add up to the change of the class-centred
+    scatter matrix when the rows zk join (sign=1) or leave (sign=-1) a class
+    of nk rows with sum sk: the rows about their mean and their mean about
+    the class mean (of the class without them), weighted
+    """
+    mk = zk.shape[0]
+    zbar = np.mean(zk, axis=0)
+    rows = [zk - zbar] if mk > 1 else []
+    rest = nk if sign > 0 else nk - mk # size of the class without the rows
+    if rest > 0:
+        mean = sk / nk if sign > 0 else (sk - mk * zbar) / rest
+        rows.append(np.sqrt(rest * mk / (rest + mk)) * (zbar - mean)[None, :])
+    return np.concatenate(rows) if rows else zk[:0]
+
+def pvt_update_norm_sums(sums, vectors, members, y, s, sign):
+    """Up- or downdate the row norm sums of a class by the (standardised)
+    rows y; members are the rows of the class before the update and s their
+    sum. sums holds A1 = sum(a), A2 = sum(a^2) and Q = s'Ms, vectors holds
+    t = sum(a*y) and g = Ms, where a are the squared row norms and M the
+    sum of the outer products of the rows of the class.
+    """
+    a = np.sum(y * y, axis = 1)
+    sigma = np.sum(y, axis = 0)
+    g = vectors[1]
+    Msigma = np.matmul(members.T, np.matmul(members, sigma))
+    s_new = s + sign * sigma
+    ys = np.matmul(y, s_new)
+    sums[2] += sign * 2 * np.dot(sigma, g) + np.dot(sigma, Msigma) + sign * np.dot(ys, ys)
+    vectors[1] += sign * (Msigma + np.matmul(y.T, ys))
+    sums[0] += sign * np.sum(a)
+    sums[1] += sign * np.sum(a * a)
+    vectors[0] += sign * np.matmul(a, y)
+
+def pvt_row_norms4(sums, vectors, nk, s):
+    """Sum of the fourth powers of the row norms of the class-centred rows of
+    a class from its row norm sums (see pvt_update_norm_sums()) and the sum
+    s of its rows
+    """
+    if nk == 0:
+        return 0
+    A1, A2, Q = sums
+    w = s / nk
+    omega = np.dot(w, w)
+    return A2 + 4 * Q / nk**2 - 3 * nk * omega**2 - 4 * np.dot(vectors[0], w) + 2 * omega * A1
+
+def pvt_scale_drift(sd, ref):
+    """Largest relative change of the standard deviations against the reference
+    """
+    ok = np.isfinite(ref) & (ref > 0)
+    if np.any((sd > 0) != ok):
+        return np.inf
+    return np.max(np.abs(sd[ok]/ref[ok] - 1)) if np.any(ok) else 0
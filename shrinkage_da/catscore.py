@@ -7,11 +7,17 @@ Estimate CAT scores and t-scores
 from __future__ import print_function, division
 import numpy as np
 from sys import exit
-from centroids import centroids
-from corpcor.shrink_estimates import crossprod_powcor_shrink
+from .centroids import centroids
+from .corpcor.shrink_estimates import crossprod_powcor_shrink, crossprod_powcor_shrink_groups
+from .corpcor.shrink_intensity import estimate_lambda_subsample
+from .corpcor.shrink_misc import FrequencyWeights
+from .corpcor.pvt_instrument import staged
+from .fit_cache import cached_cppowscor
+from .prefilter import find_redundant_features, expand_features, pvt_prefilter_options
 
 
-def catscore(Xtrain, L, lambda_cor = None, lambda_var = None, lambda_freqs = None, diagonal=False, verbose=False):
+@staged("catscore")
+def catscore(Xtrain, L, lambda_cor = None, lambda_var = None, lambda_freqs = None, diagonal=False, verbose=False, lambda_approx=False, cache=None, w=None, feature_groups=None, n_jobs=None, prefilter=False):
     """Estimate CAT scores and t-scores
     
     Parameters
@@ -30,17 +36,54 @@ def catscore(Xtrain, L, lambda_cor = None, lambda_var = None, lambda_freqs = Non
         If True, skip correlation adjustment and assume diagonal model (False)
     verbose : bool
         Verbose mode (False).
+    lambda_approx : bool or dict
+        Estimate lambda_cor and lambda_var (unless given) from random 
+        subsamples of the centred data (see estimate_lambda_subsample()).
+        True uses the default options, a dict passes options (False).
+    cache : FitCache
+        Take the correlation factor of the data (corrected for the class 
+        centroids) and the estimated lambda_cor from this cache, or store 
+        them there (None).
+    w : vector array
+        Sample weights counting how often each row occurs (see centroids()).
+    feature_groups : vector array
+        Group label of each feature, for a block diagonal correlation matrix
+        with one shrinkage intensity per group (see sda()).
+    n_jobs : int
+        Number of threads processing the feature groups (None: all cores).
+    prefilter : bool or dict
+        Compute the scores on the features that are neither constant nor 
+        duplicates and map them back to all features; constant features 
+        score 0 (see sda()).
     
     Returns
     -------
     dictionary
-        Dictionary containing (ca)t-scores, shrinkage parameters
+        Dictionary containing (ca)t-scores, shrinkage parameters (and with
+        feature_groups the intensity of each group)
     """
     nX, pX = Xtrain.shape
     if len(L) != nX:
         raise ValueError("Number of rows in input matrix Xtrain must match the number of class labels")
+    if prefilter:
+        redundant = find_redundant_features(Xtrain, **pvt_prefilter_options(prefilter))
+        keep = redundant["keep"]
+        if len(keep) == 0:
+            raise ValueError("All features are constant")
+        if len(keep) < pX:
+            groups_kept = None if feature_groups is None else np.asarray(feature_groups)[keep]
+            result = catscore(Xtrain[:, keep], L, lambda_cor, lambda_var, lambda_freqs, diagonal, verbose,
+                              lambda_approx, cache, w, groups_kept, n_jobs)
+            result["cat"] = expand_features(result["cat"], redundant)
+            result["prefilter"] = dict(keep = keep, n_constant = redundant["n_constant"],
+                                       n_duplicate = redundant["n_duplicate"])
+            return result
     regularisation = dict(lambda_cor = 1, lambda_var = np.nan, lambda_freqs = np.nan) # regularisation parameters for correlation, variance and priors
-    my_cent = centroids(Xtrain, L, lambda_var, lambda_freqs, var_groups = False, centered_data = True, verbose = verbose)
+    approx_options = dict() if lambda_approx is True else (lambda_approx or None)
+    w = None if w is None else FrequencyWeights(w)
+    cache_key = None if cache is None else cache.key(Xtrain, w)
+    my_cent = centroids(Xtrain, L, lambda_var, lambda_freqs, var_groups = False, centered_data = True, verbose = verbose,
+                        lambda_approx = approx_options, w = w)
     cl_count = len(my_cent["groups"]) - 1 # number of classes 
     n = np.sum(my_cent["samples"]) # number of samples
     p = my_cent["means"].shape[0] # number of features
@@ -68,23 +111,39 @@ def catscore(Xtrain, L, lambda_cor = None, lambda_var = None, lambda_freqs = Non
         diff = mu[:,k]-mup  
         cat[:,k] = diff/(m[k] * sc) # t-scores
     was_diagonal = diagonal # was diagonal used or not
+    grouped = None
     if not diagonal:
         if verbose:
             print("Computing inverse correlation matrix (pooled across classes) product")
         try:
-            catdict = crossprod_powcor_shrink(xc, cat, alpha=-0.5, lambda_cor=lambda_cor, 
-                                         verbose=False)
+            my_lambda_cor = lambda_cor
+            if lambda_cor is None and approx_options is not None and feature_groups is None:
+                my_lambda_cor = estimate_lambda_subsample(xc, w=w, verbose=verbose, overwrite_x=True, **approx_options)["lambda_cor"]
+            if feature_groups is not None:
+                catdict = crossprod_powcor_shrink_groups(xc, cat, alpha=-0.5, groups=feature_groups, lambda_cor=lambda_cor,
+                                                         w=w, verbose=False, n_jobs=n_jobs)
+                grouped = dict(groups=catdict["groups"], lambda_cor=catdict["lambda_cor"])
+                catdict["lambda_cor"] = np.nan # one intensity per group, in grouped
+            elif cache is None:
+                catdict = crossprod_powcor_shrink(xc, cat, alpha=-0.5, lambda_cor=my_lambda_cor, w=w,
+                                                  verbose=False, overwrite_x=True)
+            else:
+                catdict = cached_cppowscor(cache, cache_key, xc, cat, -0.5, L, mu, my_cent["groups"][:cl_count],
+                                           lambda_cor=my_lambda_cor, w=w)
             cat = catdict["cp_powr"]
-            regularisation["lambda_cor"] = catdict["lambda_cor"] if lambda_cor is None else lambda_cor
+            regularisation["lambda_cor"] = catdict["lambda_cor"] if np.ndim(lambda_cor) > 0 or lambda_cor is None else lambda_cor
             lambda_estimated = True if lambda_cor is None else False
             if verbose:
                 if lambda_estimated:  
                     print("Estimating optimal shrinkage intensity lambda (correlation matrix):", 
-                          regularisation["lambda_cor"])
+                          regularisation["lambda_cor"] if grouped is None else grouped["lambda_cor"])
                 else:
                     print("Specified shrinkage intensity lambda (correlation matrix):", 
-                          regularisation["lambda_cor"])
+                          lambda_cor)
         except np.linalg.LinAlgError:
             was_diagonal = True # this can happen if SVD doesn't converge
     ###
-    return dict(regularisation=regularisation, freqs=freqs, cat=cat, was_diagonal=was_diagonal)
+    result = dict(regularisation=regularisation, freqs=freqs, cat=cat, was_diagonal=was_diagonal)
+    if grouped is not None:
+        result["feature_groups"] = grouped
+    return result
@@ -7,10 +7,13 @@ Group centroids and (pooled) variances
 from __future__ import print_function, division
 import numpy as np
 from sys import exit
-from corpcor.shrink_misc import minmax
-from corpcor.shrink_estimates import var_shrink
+from .corpcor.shrink_misc import minmax, pvt_row_blocks, FrequencyWeights
+from .corpcor.shrink_estimates import var_shrink
+from .corpcor.shrink_intensity import estimate_lambda_var_subsample
+from .corpcor.pvt_instrument import staged
 
-def centroids(x, L, lambda_var = None, lambda_freqs = None, var_groups=False, centered_data=False, verbose=False):
+@staged("centroids")
+def centroids(x, L, lambda_var = None, lambda_freqs = None, var_groups=False, centered_data=False, verbose=False, out=None, lambda_approx=None, w=None):
     """Estimate centroids for the Bayes classifier (SDA)
     
     Parameters
@@ -29,6 +32,17 @@ def centroids(x, L, lambda_var = None, lambda_freqs = None, var_groups=False, ce
         Data pre-centred (False)
     verbose : bool
         Verbose mode (False)
+    out : array
+        Array of the shape of x to write the centred data to. May be x itself
+        (a float array) to centre the data in place. A new array of the
+        floating point type of x is allocated if None.
+    lambda_approx : dict
+        Options for estimate_lambda_var_subsample(), used to estimate the
+        pooled variance shrinkage intensity from subsamples (None: exact).
+    w : vector array
+        Sample weights counting how often each row occurs (frequency 
+        weights): integer weights give the same estimates as repeating the
+        rows. Class sizes ("samples") are then the summed weights (None).
     
     Returns
     -------
@@ -40,6 +54,14 @@ def centroids(x, L, lambda_var = None, lambda_freqs = None, var_groups=False, ce
     if len(L) != n:
         exit("Number of rows in input matrix x must match the number of class labels")
     samples, cl_count, cl_names, idx = pvt_groups(L)
+    if w is not None:
+        w = FrequencyWeights(w)
+        if w.shape[0] != n or np.any(w < 0):
+            raise ValueError("Sample weights must be non-negative, one per row of x")
+        wv = np.ravel(w).view(np.ndarray)
+        samples = np.matmul(wv, idx)
+        if np.any(samples == 0):
+            raise ValueError("Sample weights of each class must not sum to zero")
     # do some checking for lambda_var
     if lambda_var is None:
         auto_shrink = True
@@ -67,48 +89,57 @@ def centroids(x, L, lambda_var = None, lambda_freqs = None, var_groups=False, ce
     freqs, lambda_freqs_est = pvt_freqs_shrink(samples, lambda_freqs=lambda_freqs, verbose=verbose)
     # setup array
     mu = np.zeros((p, cl_count+1)) # means
-    xc = np.zeros((n,p))  # storage for centered data
+    if out is None:
+        out = np.empty((n,p), dtype = np.result_type(x.dtype, np.float32)) # storage for centered data
     my_group_lambdas = np.zeros(1)
     if var_groups:
         v = np.zeros((p, cl_count+1)) # storage for variances
         my_group_lambdas = np.zeros((cl_count+1))
     else:
         v = np.zeros((p, 1)) # store only pooled variances
-    # compute means and variance in each group
-    mu_pooled = np.zeros(p)
-    for k in range(0,cl_count):
-        my_idx = idx[:, k]
-        Xk = x[my_idx, :]
-        mu[:, k] = np.average(Xk, axis=0)
-        mu_pooled = mu_pooled + freqs[k] * mu[:, k]
-        
-        xc[my_idx, :] = Xk - mu[:, k] # sweep means
-        if var_groups:
+    # compute means in each group as class indicator times x, in row blocks
+    code = np.argmax(idx, axis=1) # class of each sample
+    for b in pvt_row_blocks(n, p):
+        ib = idx[b,:] if w is None else idx[b,:] * wv[b, None]
+        mu[:, :cl_count] += np.matmul(x[b,:].T.astype(np.float64, copy=False), ib)
+    mu[:, :cl_count] /= samples
+    mu_pooled = np.matmul(mu[:, :cl_count], freqs)
+    # variances in each group (before any in place centring)
+    if var_groups:
+        for k in range(0,cl_count):
+            Xk = x[idx[:, k], :]
+            wk = None if w is None else w[idx[:, k]]
             if verbose:
                 print("Estimating variances (class #", k, ")")
             if auto_shrink:
-                vs, lambda_var_temp, _ = var_shrink(Xk, verbose = verbose)
+                vs, lambda_var_temp, _ = var_shrink(Xk, w = wk, verbose = verbose)
             else:
-                vs,_,_ = var_shrink(Xk, lambda_var = specified_lambda_var[k], verbose=verbose)
+                vs, lambda_var_temp, _ = var_shrink(Xk, lambda_var = specified_lambda_var[k], w = wk, verbose=verbose)
             v[:,k] = vs
             my_group_lambdas[k] = lambda_var_temp
     mu[:, cl_count] = mu_pooled
+    # sweep means
+    xc = out
+    for b in pvt_row_blocks(n, p):
+        np.subtract(x[b,:], mu[:, code[b]].T, out = xc[b,:])
     
     # compute variance
     if verbose:
         print("Estimating variances (pooled across classes")
+    approx = None
+    n = np.sum(samples) # with weights the total count
     if var_groups:
         if auto_shrink:
-            v_pool,my_lambda_var,_ = var_shrink(xc, verbose=verbose)
+            v_pool,my_lambda_var,approx = pvt_var_shrink_pooled(xc, lambda_approx, verbose, w)
         else:
-            v_pool,my_lambda_var,_ = var_shrink(xc, lambda_var = specified_lambda_var[cl_count], verbose=verbose)
+            v_pool,my_lambda_var,_ = var_shrink(xc, lambda_var = specified_lambda_var[cl_count], w = w, verbose=verbose)
         v[:,cl_count] = v_pool*(n-1)/(n-cl_count) # correction factor
         my_group_lambdas[cl_count] = my_lambda_var
     else:
         if auto_shrink:
-            v_pool, my_lambda_var,_ = var_shrink(xc, verbose=verbose)
+            v_pool, my_lambda_var,approx = pvt_var_shrink_pooled(xc, lambda_approx, verbose, w)
         else:
-            v_pool, my_lambda_var,_ = var_shrink(xc, lambda_var = specified_lambda_var[0])
+            v_pool, my_lambda_var,_ = var_shrink(xc, lambda_var = specified_lambda_var[0], w = w)
         v[:,0] = v_pool*(n-1)/(n-cl_count) # correction factor
         my_group_lambdas[0] = my_lambda_var
     
@@ -121,12 +152,23 @@ def centroids(x, L, lambda_var = None, lambda_freqs = None, var_groups=False, ce
         
     cl_names.append("(pooled)")
     return dict(samples=samples, freqs=freqs, means=mu, variances=v, 
-                centered_data=xc, lambda_var_estimated=lambda_var_estimated, 
+                centered_data=xc, lambda_var_estimated=lambda_var_estimated, lambda_var_approx=approx, 
                 var_lambdas=my_group_lambdas,
                 freqs_lambda=lambda_freqs_est, freqs_lambda_estimated=lambda_freqs_estimated,
                 groups = cl_names)
                 
     
+def pvt_var_shrink_pooled(xc, lambda_approx, verbose, w = None):
+    """var_shrink() of the centred data with the shrinkage intensity estimated
+    from subsamples if lambda_approx is given
+    """
+    if lambda_approx is None:
+        v_pool, my_lambda_var, _ = var_shrink(xc, w = w, verbose=verbose)
+        return v_pool, my_lambda_var, None
+    approx = estimate_lambda_var_subsample(xc, w = w, verbose=verbose, **lambda_approx)
+    v_pool, my_lambda_var, _ = var_shrink(xc, lambda_var = approx["lambda_var"], w = w, verbose=verbose)
+    return v_pool, my_lambda_var, approx
+
 def pvt_groups(L):
     L = np.array(L) # make sure it's a numpy array that can be compared
     cl_names = list(set(L)) # unique class labels
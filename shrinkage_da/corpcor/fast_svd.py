@@ -6,52 +6,141 @@ Efficient Computation of the Singular Value Decomposition
 """
 from __future__ import print_function, division
 import numpy as np
+from .pvt_instrument import stage, note
 
-def positive_svd(m, tol):
+def pvt_eps(m):
+    """Machine epsilon of the precision m is computed in (float32 data is
+    kept in float32, so its rounding floor is float32 eps)
+    """
+    return np.finfo(np.result_type(m.dtype, np.float32)).eps
+
+def pvt_positive(d, shape, tol, eps):
+    """Boolean index of the singular values d of an n x p matrix (shape) that
+    are above the rank tolerance tol. The default tolerance,
+    sqrt(min(n, p) * eps) * max(d), is the resolution of the routes via the
+    Gram matrix, whose eigenvalues d^2 carry a rounding error of about
+    min(n, p) * eps * max(d)^2; every route uses it, so that they all return
+    the same rank.
+    """
+    if tol is None:
+        tol = np.sqrt(min(shape) * eps) * (np.max(d) if len(d) else 0)
+    return d > tol
+
+def positive_svd(m, tol, compute_u = True, compute_v = True):
     """svd that retains only positive singular values 
     """
-    u, d, v = np.linalg.svd(m)
-    # determine rank of B  (= rank of m)
-    if tol is None: 
-      tol = max(m.shape) * max(d) * np.finfo(float).eps 
-    Positive = d > tol
-    sub_range = np.array(range(0,len(Positive)))[Positive] # subset of indices
-    return (d[Positive], u[:, sub_range], v.T[:, sub_range])
-
-def nsmall_svd(m, tol):
+    if compute_u or compute_v:
+        u, d, v = np.linalg.svd(m, full_matrices=False)
+    else:
+        d = np.linalg.svd(m, compute_uv=False)
+    Positive = pvt_positive(d, m.shape, tol, pvt_eps(m))
+    u = u[:, Positive] if compute_u else None
+    v = v.T[:, Positive] if compute_v else None
+    return (d[Positive], u, v)
+
+def nsmall_svd(m, tol, compute_u = True, compute_v = True):
     B = np.matmul(m, m.T) # n by n matrix
-    u, d, _ = np.linalg.svd(B) # ...whose svd is easy   
-    # determine rank of B  (= rank of m)
-    if tol is None: 
-      tol = B.shape[0] * max(d) * np.finfo(float).eps 
-    Positive = d > tol                            
-           
-    # positive singular values of m  
-    d = np.sqrt(d[Positive])
+    if compute_u or compute_v:
+        u, d, _ = np.linalg.svd(B) # ...whose svd is easy   
+    else:
+        d = np.linalg.svd(B, compute_uv=False)
+    # singular values of m and its rank
+    d = np.sqrt(d)
+    Positive = pvt_positive(d, m.shape, tol, pvt_eps(B))
+    d = d[Positive]
+    if not (compute_u or compute_v):
+        return (d, None, None)
       
     # corresponding orthogonal basis vectors
     u = u[:, Positive]
-    v = np.matmul(np.matmul(m.T, u), np.diag(1/d) )   
+    v = None
+    if compute_v:
+        v = np.matmul(m.T, u)
+        v /= d
   
-    return (d, u, v)
+    return (d, u if compute_u else None, v)
 
 
-def psmall_svd(m, tol):
+def psmall_svd(m, tol, compute_u = True, compute_v = True):
     B = np.matmul(m.T, m) # p by p matrix
-    _, d, v = np.linalg.svd(B) # ...whose svd is easy   
-    # determine rank of B  (= rank of m)
-    if tol is None: 
-      tol = B.shape[0] * max(d) * np.finfo(float).eps 
-    Positive = d > tol             
-           
-    # positive singular values of m  
-    d = np.sqrt(d[Positive])
+    if compute_u or compute_v:
+        _, d, v = np.linalg.svd(B) # ...whose svd is easy   
+    else:
+        d = np.linalg.svd(B, compute_uv=False)
+    # singular values of m and its rank
+    d = np.sqrt(d)
+    Positive = pvt_positive(d, m.shape, tol, pvt_eps(B))
+    d = d[Positive]
+    if not (compute_u or compute_v):
+        return (d, None, None)
       
     # corresponding orthogonal basis vectors (v is different from the v returned by R by a transpose)
     v = v.T[:, Positive]
-    u = np.matmul(np.matmul(m, v), np.diag(1/d) )   
-    return (d, u, v)
+    u = None
+    if compute_u:
+        u = np.matmul(m, v)
+        u /= d
+    return (d, u, v if compute_v else None)
+
 
+def gram_eigh_svd(m, tol, compute_u = True, compute_v = True):
+    """svd from the symmetric eigendecomposition of the Gram matrix of the
+    smaller side of m (as nsmall_svd/psmall_svd, but with eigh)
+    """
+    n, p = m.shape
+    B = np.matmul(m, m.T) if n <= p else np.matmul(m.T, m)
+    if compute_u or compute_v:
+        e, w = np.linalg.eigh(B)
+        w = w[:, ::-1]
+    else:
+        e = np.linalg.eigvalsh(B)
+    d = np.sqrt(np.maximum(e[::-1], 0)) # decreasing order as from svd
+    Positive = pvt_positive(d, m.shape, tol, pvt_eps(B))
+    d = d[Positive]
+    if not (compute_u or compute_v):
+        return (d, None, None)
+    w = w[:, Positive]
+    if n <= p:
+        u, v = w, None
+        if compute_v:
+            v = np.matmul(m.T, u)
+            v /= d
+    else:
+        u, v = None, w
+        if compute_u:
+            u = np.matmul(m, v)
+            u /= d
+    return (d, u if compute_u else None, v if compute_v else None)
+
+def qr_svd(m, tol, compute_u = True, compute_v = True):
+    """svd from a QR decomposition of m (or m') followed by the svd of the
+    small triangular factor
+    """
+    n, p = m.shape
+    transposed = n < p
+    q, r = np.linalg.qr(m.T if transposed else m) # r is min(n,p) square
+    if not (compute_u or compute_v):
+        d = np.linalg.svd(r, compute_uv=False)
+        return (d[pvt_positive(d, m.shape, tol, pvt_eps(m))], None, None)
+    a, d, b = np.linalg.svd(r)
+    Positive = pvt_positive(d, m.shape, tol, pvt_eps(m))
+    d, a, b = d[Positive], a[:, Positive], b.T[:, Positive]
+    if transposed: # m' = q r = q a d b', so m = b d (q a)'
+        u, v = b, np.matmul(q, a)
+    else: # m = q a d b'
+        u, v = np.matmul(q, a), b
+    return (d, u if compute_u else None, v if compute_v else None)
+
+SVD_ROUTES = dict(gram_svd = None, gram_eigh = gram_eigh_svd, qr = qr_svd, direct = positive_svd)
+
+_cost_model = None
+
+def set_cost_model(model):
+    """Choose the fast_svd() route with model.choose(n, p, compute_u, compute_v) (see
+    svd_autotune), or with the fixed shape rule if model is None
+    """
+    global _cost_model
+    _cost_model = model
 
 # public functions
 
@@ -62,7 +151,7 @@ def psmall_svd(m, tol):
 
 # note that also only positive singular values are returned
 
-def fast_svd(m, tol = None):
+def fast_svd(m, tol = None, compute_u = True, compute_v = True, route = None):
     """Fast computation of svd(m)
 Note that the signs of the columns vectors in u and v
 may be different from that given by svd()
@@ -74,7 +163,19 @@ Note that also only positive singular values are returned
     m : array
         Matrix whose svd is sought.
     tol : float
-        Singularity tolerance.
+        Singularity tolerance: singular values of m not above tol are
+        dropped. By default sqrt(min(n, p) * eps) times the largest singular
+        value, the same for every route (see pvt_positive()).
+    compute_u, compute_v : bool
+        Compute the left/right singular vectors (True). Vectors that are not
+        computed are returned as None, which avoids forming n by r or p by r
+        arrays that are not needed.
+    route : string
+        'gram_svd' (svd of the Gram matrix of the smaller side), 'gram_eigh'
+        (its symmetric eigendecomposition), 'qr' (QR and svd of the 
+        triangular factor) or 'direct' (svd of m). By default the route is
+        chosen by the cost model set with svd_autotune.enable_autotune(), or
+        if there is none, gram_svd unless m is almost square.
     
     Returns
     -------
@@ -84,9 +185,22 @@ Note that also only positive singular values are returned
     """
     n, p = m.shape
     EDGE_RATIO = 2 # use standard SVD if matrix almost square
-    if n > EDGE_RATIO*p:
-        return psmall_svd(m, tol)
-    elif EDGE_RATIO*n < p:
-        return nsmall_svd(m, tol)
-    else: # if p and n are approximately the same
-        return positive_svd(m, tol)
+    if route is None and _cost_model is not None:
+        route = _cost_model.choose(n, p, compute_u, compute_v)
+    with stage("fast_svd", shape = (n, p)):
+        if route is not None and route != "gram_svd":
+            if route not in SVD_ROUTES:
+                raise ValueError("route must be one of " + ", ".join(sorted(SVD_ROUTES)))
+            branch, result = route, SVD_ROUTES[route](m, tol, compute_u, compute_v)
+        elif route == "gram_svd" and n > p:
+            branch, result = "psmall_svd", psmall_svd(m, tol, compute_u, compute_v)
+        elif route == "gram_svd":
+            branch, result = "nsmall_svd", nsmall_svd(m, tol, compute_u, compute_v)
+        elif n > EDGE_RATIO*p:
+            branch, result = "psmall_svd", psmall_svd(m, tol, compute_u, compute_v)
+        elif EDGE_RATIO*n < p:
+            branch, result = "nsmall_svd", nsmall_svd(m, tol, compute_u, compute_v)
+        else: # if p and n are approximately the same
+            branch, result = "positive_svd", positive_svd(m, tol, compute_u, compute_v)
+        note(branch = branch, rank = result[0].shape[0])
+    return result
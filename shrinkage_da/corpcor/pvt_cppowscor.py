@@ -5,16 +5,19 @@ Efficient computation of crossprod(R^alpha, y)
 @author Miika Ahdesmaki, Korbinian Strimmer
 """
 from __future__ import print_function, division
+import os
 import numpy as np
-from scipy.linalg import fractional_matrix_power
-from fast_svd import fast_svd
-from wt_scale import wt_scale
-from shrink_intensity import estimate_lambda
-from shrink_misc import pvt_check_w, minmax
+from concurrent.futures import ThreadPoolExecutor
+from .fast_svd import fast_svd
+from .wt_scale import wt_scale
+from .shrink_intensity import estimate_lambda
+from .shrink_misc import pvt_check_w, pvt_w2, minmax
+from .pvt_instrument import stage, staged
 from sys import exit
 
 
-def pvt_cppowscor(x, y, alpha, lambda_cor = None, w = None, verbose=False):
+@staged("pvt_cppowscor")
+def pvt_cppowscor(x, y, alpha, lambda_cor = None, w = None, verbose=False, return_factor=False, overwrite_x=False):
     """Private function estimating a correlation matrix product without explicitly
     evaluating the correlation matrix
     
@@ -33,6 +36,11 @@ def pvt_cppowscor(x, y, alpha, lambda_cor = None, w = None, verbose=False):
         Correlation shrinkage parameter.
     verbose : bool
         Print out messages.
+    return_factor : bool
+        Also return the low rank factor from pvt_cppowscor_factor() (None if
+        R is the identity matrix).
+    overwrite_x : bool
+        Allow x to be standardised in place, avoiding a copy of the data (False).
     
     Returns
     -------Class
@@ -40,7 +48,7 @@ def pvt_cppowscor(x, y, alpha, lambda_cor = None, w = None, verbose=False):
         The result of the multiplication(s) and correlation shrinkage parameter
     """
     if lambda_cor is None:
-        lambda_cor = estimate_lambda(x = x, w = w, verbose = verbose)
+        lambda_cor = estimate_lambda(x = x, w = w, verbose = verbose, overwrite_x = overwrite_x)
     lambda_cor = minmax(lambda_cor) # make sure lambda isn't improper
     n, p = x.shape
     try:
@@ -49,26 +57,207 @@ def pvt_cppowscor(x, y, alpha, lambda_cor = None, w = None, verbose=False):
         exit("Input y to pvt_cppowscor() must be a matrix of column vectors. Dimensionality may have dropped along the way when slicing.")
     if yn != p:
         exit("There is something wrong with the dimensionalities of y and x")
-    w = pvt_check_w(w, n)
-    xs, sc = wt_scale(x, w, center=True, scale=True) # standardise data matrix
-    zeros = sc == 0
-    w2 = np.sum(w*w)       # for w=1/n this equals 1/n   where n=dim(xs)[1]
-    h1 = 1/(1-w2)       # for w=1/n this equals the usual h1=n/(n-1)
+    factor = None
     if lambda_cor == 1 or alpha == 0: # in both cases R is the identity matrix
-        return dict(cp_powr = y, lambda_cor = lambda_cor)
+        cp_powr = y
+    else:
+        factor = pvt_cppowscor_factor(x, w, overwrite_x = overwrite_x)
+        cp_powr = pvt_cppowscor_apply(factor, y, alpha, lambda_cor)
+    if return_factor:
+        return dict(cp_powr = cp_powr, lambda_cor = lambda_cor, factor = factor)
+    return dict(cp_powr = cp_powr, lambda_cor = lambda_cor)
+
+@staged("pvt_cppowscor_groups")
+def pvt_cppowscor_groups(x, y, alpha, groups, lambda_cor = None, w = None, verbose=False, n_jobs=None):
+    """Private function computing crossprod(R^alpha, y) for a block diagonal
+    correlation matrix R, with one block (and shrinkage intensity) per group
+    of variables
+    
+    Each block is the shrunken correlation matrix of its own group, so 
+    R^alpha y is computed group by group from the SVD of the group's 
+    columns only: many small SVDs instead of one of all p variables. The 
+    groups are processed by a pool of threads (LAPACK and BLAS release the
+    GIL), each working on a copy of its group's columns of x.
+    
+    Parameters
+    ----------
+    x : matrix array
+        Data matrix with samples in rows, variables in columns. Not modified.
+    y : vector array
+        Vector(s) that are to be correlation adjusted.
+    alpha : float
+        Matrix power.
+    groups : vector array
+        Group label of each variable (column of x).
+    lambda_cor : float or vector array
+        Correlation shrinkage parameter, one for all groups or one per group
+        (in the order of the sorted group labels). Estimated per group if 
+        None.
+    n_jobs : int
+        Number of threads. None uses all cores, 1 runs in the calling thread.
+    
+    Returns
+    -------
+    dict
+        The result of the multiplication(s) (cp_powr), the sorted group 
+        labels (groups) and the shrinkage intensity of each group 
+        (lambda_cor)
+    """
+    n, p = x.shape
+    groups = np.ravel(np.asarray(groups))
+    if len(groups) != p:
+        raise ValueError("feature groups must have one label per column of x")
+    labels, codes = np.unique(groups, return_inverse = True)
+    if lambda_cor is None or np.ndim(lambda_cor) == 0:
+        lambdas = [lambda_cor] * len(labels)
+    else:
+        lambdas = list(np.ravel(lambda_cor))
+        if len(lambdas) != len(labels):
+            raise ValueError("lambda_cor must be a scalar or have one value per feature group")
+    # largest groups first, so that the pool is not left waiting for one big group
+    members = [np.flatnonzero(codes == g) for g in range(len(labels))]
+    order = sorted(range(len(labels)), key = lambda g: -len(members[g]))
+    def block(g):
+        idx = members[g]
+        # x[:, idx] is a copy, which may be standardised in place
+        return pvt_cppowscor(x[:, idx], y[idx, :], alpha, lambdas[g], w, verbose, overwrite_x = True)
+    if n_jobs == 1 or len(labels) == 1:
+        results = dict((g, block(g)) for g in order)
+    else:
+        n_workers = os.cpu_count() if n_jobs is None else n_jobs
+        with ThreadPoolExecutor(max_workers = min(n_workers, len(labels))) as pool:
+            results = dict(zip(order, pool.map(block, order)))
+    cp_powr = np.empty(y.shape, dtype = np.result_type(y, np.float64))
+    for g in range(len(labels)):
+        cp_powr[members[g], :] = results[g]["cp_powr"]
+    lambda_cor = np.array([results[g]["lambda_cor"] for g in range(len(labels))])
+    return dict(cp_powr = cp_powr, groups = labels, lambda_cor = lambda_cor)
+
+@staged("pvt_cppowscor_factor")
+def pvt_cppowscor_factor(x, w = None, overwrite_x = False):
+    """Private function computing the low rank factor (SVD of the standardised
+    data) that pvt_cppowscor_apply() needs. The factor does not depend on
+    lambda_cor or alpha, so it can be reused across products.
+    
+    Returns
+    -------
+    dict
+        Singular values d, left and right singular vectors u and v, the 
+        weights w and a boolean index of zero-variance variables. For equal
+        weights u is not formed and U'diag(w)U = I/n is stored as "utwu" 
+        instead. "w2" is sum(w^2) (see shrink_misc.pvt_w2()).
+    """
+    n, p = x.shape
+    w2 = pvt_w2(w, n)
+    with stage("wt_scale", shape = x.shape):
+        xs, sc = wt_scale(x, w, center=True, scale=True, copy=not overwrite_x) # standardise data matrix
+    w = pvt_check_w(w, n)
+    zeros = ~np.isfinite(sc) # wt_scale gives zero-variance variables an infinite scale
+    wv = np.ravel(w)
+    if np.all(wv == wv[0]):
+        (d, _, v) = fast_svd(xs, compute_u = False)
+        return dict(d = d, v = v, utwu = np.eye(len(d)) * wv[0], w2 = w2, zeros = zeros)
     (d, u, v) = fast_svd(xs)
+    return dict(d = d, u = u, v = v, w = w, w2 = w2, zeros = zeros)
+
+def pvt_cppowscor_apply(factor, y, alpha, lambda_cor):
+    """Private function computing crossprod(R_shrink^alpha, y) from a low rank
+    factor of the standardised data.
+    
+    The factor normally holds the right singular vectors v. Instead of v it may
+    hold the standardised data matrix xs, in which case v = xs' u D^-1 is
+    applied implicitly and never formed (useful when u and d come from an
+    eigendecomposition of the n by n Gram matrix). If u is not available
+    the factor holds U'diag(w)U as "utwu" and sum(w^2) as "w2" instead. The
+    right singular vectors may also be held as an orthonormal "basis" times a
+    small "rotation", v = basis rotation, which is not formed either.
+    """
+    d = factor["d"]
+    if "utwu" in factor:
+        UTWU = factor["utwu"]
+    else:
+        u, w = factor["u"], factor["w"]
+        UTWU = np.matmul(u.T, u * w) # U' matmul diag(w) matmul U
+    w2 = factor["w2"] if "w2" in factor else np.sum(w*w) # for w=1/n this equals 1/n   where n=dim(xs)[1]
+    h1 = 1/(1-w2)       # for w=1/n this equals the usual h1=n/(n-1)
     m = d.shape[0] # rank of xs
     d = np.column_stack(d).T # make d into a column vector
-    UTWU = np.matmul(u.T, u * w) # U' matmul diag(w) matmul U
+    if "v" in factor:
+        v = factor["v"]
+        vty = np.matmul(v.T, y)
+    elif "basis" in factor:
+        basis, rotation = factor["basis"], factor["rotation"]
+        vty = np.matmul(rotation.T, np.matmul(basis.T, y))
+    else:
+        xs = factor["xs"]
+        vty = np.matmul(u.T, np.matmul(xs, y)) / d
     C = UTWU * d * d.T # D matmul UTWU matmul D
     C = (1-lambda_cor) * h1 * C
     C = (C + C.T)/2  # symmetrise for numerical reasons
+    from scipy.linalg import fractional_matrix_power # imported here to keep module import light
     # note: C is of size m x m, and diagonal if w=1/n
-    if lambda_cor == 0: # use eigenvalue decomposition computing the matrix power
-        cp_powr = np.matmul(v, np.matmul(fractional_matrix_power(C, alpha), np.matmul(v.T, y) ) )
+    with stage("fractional_matrix_power", shape = C.shape):
+        if lambda_cor == 0: # use eigenvalue decomposition computing the matrix power
+            z = np.matmul(fractional_matrix_power(C, alpha), vty)
+        else:
+            F = np.eye(m) - fractional_matrix_power(C/lambda_cor + np.eye(m), alpha)
+            z = np.matmul(F, vty)
+    if "v" in factor:
+        vz = np.matmul(v, z)
+    elif "basis" in factor:
+        vz = np.matmul(basis, np.matmul(rotation, z))
     else:
-        F = np.eye(m) - fractional_matrix_power(C/lambda_cor + np.eye(m), alpha)
-        cp_powr = (y - np.matmul(v, np.matmul(F, np.matmul(v.T, y) ) )) * np.power(lambda_cor,alpha)
+        vz = np.matmul(xs.T, np.matmul(u, z / d))
+    if lambda_cor == 0:
+        cp_powr = vz
+    else:
+        cp_powr = (y - vz) * np.power(lambda_cor,alpha)
     # set all diagonal entries in R_shrink corresponding to zero-variance variables to 1
+    zeros = factor["zeros"]
     cp_powr[zeros,:] = y[zeros,:]
-    return dict(cp_powr = cp_powr, lambda_cor = lambda_cor)
\ No newline at end of file
+    return cp_powr
+
+def pvt_eigen_update(factor, a, signs, tol):
+    """Private function computing the eigendecomposition of 
+    V diag(e) V' + a diag(signs) a' from that of V diag(e) V', with the
+    factor (basis, rotation, e) holding V = basis rotation and e
+
+    The columns of a are projected onto the basis and only their residual
+    is orthogonalised and appended to the basis; the small eigenproblem in
+    the extended basis gives the new rotation and eigenvalues. Eigenvalues
+    not above tol times the largest are dropped (downdated directions). The
+    basis is compacted to basis rotation once it has grown to more than
+    twice the rank.
+    """
+    from scipy.linalg import qr # imported here to keep module import light
+    basis, rotation, e = factor
+    proj = np.matmul(basis.T, a)
+    resid = a - np.matmul(basis, proj)
+    again = np.matmul(basis.T, resid) # second projection for orthogonality to the basis
+    resid -= np.matmul(basis, again)
+    proj += again
+    q, t, _ = qr(resid, mode = "economic", pivoting = True)
+    scale = np.max(np.linalg.norm(a, axis = 0)) if a.shape[1] else 0
+    k = np.count_nonzero(np.abs(np.diag(t)) > max(a.shape) * np.finfo(float).eps * scale)
+    k = min(k, a.shape[0] - basis.shape[1])
+    q = q[:, :k]
+    coords = np.concatenate((proj, np.matmul(q.T, resid)))
+    rot = np.concatenate((rotation, np.zeros((k, rotation.shape[1]))))
+    small = np.matmul(rot * e, rot.T) + np.matmul(coords * signs, coords.T)
+    e, E = np.linalg.eigh((small + small.T)/2)
+    keep = e > tol * max(np.max(e), 0) if len(e) else e > 0
+    basis, rotation, e = np.concatenate((basis, q), axis = 1), E[:, keep], e[keep]
+    if basis.shape[1] > 2 * len(e) + 8:
+        basis, rotation = np.matmul(basis, rotation), np.eye(len(e))
+    return basis, rotation, e
+
+def pvt_rescale_factor(factor, ratio):
+    """Private function computing the eigendecomposition of R V diag(e) V' R
+    for the diagonal R = diag(ratio), in O(r^2*p)
+    """
+    basis, rotation, e = factor
+    f = np.matmul(basis, rotation) * np.sqrt(e) * ratio[:, None]
+    q, t = np.linalg.qr(f)
+    u, d, _ = np.linalg.svd(t)
+    keep = d > max(f.shape) * np.finfo(float).eps * (d[0] if len(d) else 0)
+    return np.matmul(q, u[:, keep]), np.eye(np.count_nonzero(keep)), d[keep]**2
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Optional per-stage instrumentation (wall time, CPU time, peak memory, shapes)
+
+Stages are marked in the code with ``with stage("name", shape=...):`` or by
+decorating a function with ``@staged("name")``, and extra information is
+attached with ``note(key=value)``. These do nothing unless a FitRecorder is
+active in the current thread (see recording()), so the overhead when
+disabled is one thread-local lookup per stage.
+
+@author Miika Ahdesmaki
+"""
+from __future__ import print_function, division
+import threading
+import time
+import tracemalloc
+
+_state = threading.local()
+
+class FitRecorder(object):
+    """Collects one record per stage
+
+    Parameters
+    ----------
+    callback : callable
+        Called with each stage record (a dict) as soon as the stage finishes.
+    trace_memory : bool
+        Measure peak allocated bytes per stage with tracemalloc (True). This
+        slows down the instrumented run noticeably.
+
+    Attributes
+    ----------
+    stages : list
+        Stage records in the order the stages were entered. Each record holds
+        stage, depth, wall_time, cpu_time, peak_bytes (None if not traced) and
+        any information given to stage() and note().
+    """
+    def __init__(self, callback = None, trace_memory = True):
+        self.callback = callback
+        self.trace_memory = trace_memory
+        self.stages = []
+        self._stack = []
+
+class _Stage(object):
+    def __init__(self, recorder, name, info):
+        self.recorder = recorder
+        self.record = dict(stage = name, depth = len(recorder._stack))
+        self.record.update(info)
+
+    def __enter__(self):
+        rec = self.recorder
+        rec.stages.append(self.record)
+        if rec.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if rec._stack: # remember the enclosing stage's peak before resetting it
+                parent = rec._stack[-1]
+                parent.peak_seen = max(parent.peak_seen, peak)
+            tracemalloc.reset_peak()
+            self.base = current
+            self.peak_seen = current
+        rec._stack.append(self)
+        self.cpu0 = time.process_time()
+        self.wall0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall = time.perf_counter() - self.wall0
+        cpu = time.process_time() - self.cpu0
+        rec = self.recorder
+        rec._stack.pop()
+        self.record["wall_time"] = wall
+        self.record["cpu_time"] = cpu
+        self.record["peak_bytes"] = None
+        if rec.trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            peak = max(self.peak_seen, peak)
+            self.record["peak_bytes"] = peak - self.base
+            if rec._stack:
+                parent = rec._stack[-1]
+                parent.peak_seen = max(parent.peak_seen, peak)
+        if exc_type is not None:
+            self.record["error"] = exc_type.__name__
+        if rec.callback is not None:
+            rec.callback(self.record)
+        return False
+
+class _NullStage(object):
+    def __enter__(self):
+        return self
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_null_stage = _NullStage()
+
+def stage(name, **info):
+    """Context manager timing the enclosed code as a stage of the active
+    recorder (no-op without one)
+    """
+    recorder = getattr(_state, "recorder", None)
+    if recorder is None:
+        return _null_stage
+    return _Stage(recorder, name, info)
+
+def note(**info):
+    """Attach information to the innermost running stage (no-op without an
+    active recorder)
+    """
+    recorder = getattr(_state, "recorder", None)
+    if recorder is not None and recorder._stack:
+        recorder._stack[-1].record.update(info)
+
+def staged(name):
+    """Decorator running the whole function as a stage, recording the shape of
+    its first (positional or keyword) argument
+    """
+    def decorate(func):
+        def wrapper(*args, **kwargs):
+            recorder = getattr(_state, "recorder", None)
+            if recorder is None:
+                return func(*args, **kwargs)
+            first = args[0] if args else next(iter(kwargs.values()), None)
+            shape = getattr(first, "shape", None)
+            with _Stage(recorder, name, dict(shape = shape)):
+                return func(*args, **kwargs)
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        return wrapper
+    return decorate
+
+class recording(object):
+    """Context manager activating a FitRecorder in the current thread
+    """
+    def __init__(self, recorder):
+        self.recorder = recorder
+
+    def __enter__(self):
+        self.previous = getattr(_state, "recorder", None)
+        self.started_tracing = self.recorder.trace_memory and not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start()
+        _state.recorder = self.recorder
+        return self.recorder
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _state.recorder = self.previous
+        if self.started_tracing:
+            tracemalloc.stop()
+        return False
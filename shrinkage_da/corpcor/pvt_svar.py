@@ -6,9 +6,9 @@ Variance Shrinkage
 """
 from __future__ import print_function, division
 import numpy as np
-from wt_scale import wt_moments
-from shrink_misc import minmax
-from shrink_intensity import estimate_lambda_var
+from .wt_scale import wt_moments
+from .shrink_misc import minmax
+from .shrink_intensity import estimate_lambda_var
 
 def pvt_svar(x, lambda_var = None, w = None, verbose = False):
     """Private function estimating variance shrikage 
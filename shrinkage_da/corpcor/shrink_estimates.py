@@ -8,8 +8,8 @@ and Covariance Matrix
 from __future__ import print_function, division
 import numpy as np
 from sys import exit
-from pvt_cppowscor import pvt_cppowscor
-from pvt_svar import pvt_svar
+from .pvt_cppowscor import pvt_cppowscor, pvt_cppowscor_groups
+from .pvt_svar import pvt_svar
 
 def var_shrink(x, lambda_var = None, w = None, verbose = False):
     """Variance shrinkage
@@ -31,7 +31,7 @@ def var_shrink(x, lambda_var = None, w = None, verbose = False):
     """
     return pvt_svar(x, lambda_var, w, verbose)
 
-def crossprod_powcor_shrink(x, y, alpha, lambda_cor = None, w = None, verbose=False):
+def crossprod_powcor_shrink(x, y, alpha, lambda_cor = None, w = None, verbose=False, return_factor=False, overwrite_x=False):
     """computes R_shrink^alpha matrix-times y without expanding the correlation
     matrix (which can be huge)
     
@@ -47,6 +47,10 @@ def crossprod_powcor_shrink(x, y, alpha, lambda_cor = None, w = None, verbose=Fa
         Correlation shrinkage parameter.
     verbose : bool
         Print out messages.
+    return_factor : bool
+        Also return the low rank factor of the standardised data (False).
+    overwrite_x : bool
+        Allow x to be standardised in place (False).
     
     Returns
     -------
@@ -57,4 +61,38 @@ def crossprod_powcor_shrink(x, y, alpha, lambda_cor = None, w = None, verbose=Fa
     n, p = x.shape
     if y.shape[0] != p:
         exit("Input matrix/vector y must have p rows matching the number of columns in matrix x")
-    return pvt_cppowscor(x, y, alpha, lambda_cor, w, verbose)
\ No newline at end of file
+    return pvt_cppowscor(x, y, alpha, lambda_cor, w, verbose, return_factor, overwrite_x)
+
+def crossprod_powcor_shrink_groups(x, y, alpha, groups, lambda_cor = None, w = None, verbose=False, n_jobs=None):
+    """computes R_shrink^alpha matrix-times y for a block diagonal shrunken
+    correlation matrix with one block per group of variables
+    
+    Parameters
+    ----------
+    x : matrix array
+        Data matrix with samples in rows, variables in columns.
+    y : vector array
+        Vector(s), e.g. centroids, that are to be correlation adjusted (Mahalanobis).
+    alpha : float
+        Matrix power.
+    groups : vector array
+        Group label of each variable (column of x).
+    lambda_cor : float or vector array
+        Correlation shrinkage parameter, one for all groups or one per group
+        in the order of the sorted group labels (estimated per group if None).
+    verbose : bool
+        Print out messages.
+    n_jobs : int
+        Number of threads processing the groups (None: all cores).
+    
+    Returns
+    -------
+    dict
+        The result of the multiplication(s) (cp_powr), the sorted group 
+        labels (groups) and the shrinkage intensity of each group (lambda_cor)
+        
+    """
+    n, p = x.shape
+    if y.shape[0] != p:
+        exit("Input matrix/vector y must have p rows matching the number of columns in matrix x")
+    return pvt_cppowscor_groups(x, y, alpha, groups, lambda_cor, w, verbose, n_jobs)
@@ -11,11 +11,13 @@ shrink.intensity.R
 
 from __future__ import print_function, division
 from sys import exit
-from shrink_misc import pvt_check_w, minmax
-from wt_scale import wt_scale
-from fast_svd import fast_svd
+from .shrink_misc import pvt_check_w, pvt_row_blocks, pvt_w2, minmax
+from .wt_scale import wt_scale, wt_moments
+from .fast_svd import fast_svd
+from .pvt_instrument import staged
 import numpy as np
 
+@staged("estimate_lambda_var")
 def estimate_lambda_var(x, w = None, verbose = False):
     """Estimate variance shrinkage intensity
     
@@ -37,36 +39,88 @@ def estimate_lambda_var(x, w = None, verbose = False):
         # Note that scikit-learn check_estimator expects to see a specific message
         # such as n_samples = 1 (verbatim)
         raise ValueError("Sample size too small. n_samples = 1")
-    w = pvt_check_w(w, n)
-    # bias correction factors
-    w2 = np.sum(w*w)       # for w=1/n this equals 1/n   where n=dim(xs)[1]
-    h1 = 1/(1-w2)       # for w=1/n this equals the usual h1=n/(n-1)
-    h1w2 = w2/(1-w2)    # for w=1/n this equals 1/(n-1)
-    xc, _ = wt_scale(x, w, center=True, scale=False) # standardise data matrix
-    # compute empirical variances 
-    v = h1*(np.sum(w*np.power(xc,2), axis=0, keepdims=True))
-    # compute shrinkage target
-    target = np.median(v)
     if verbose:
         print("Estimating optimal shrinkage intensity lambda.var (variance vector): ")
-
-    zz = np.power(xc,2)
-    q1 = np.sum( zz * w, axis=0, keepdims=True )
-    q2 = np.sum( np.power(zz,2) * w, axis=0, keepdims=True ) - np.power(q1,2)   
-    numerator = np.sum( q2 )
-    denominator = np.sum( np.power(q1 - target/h1, 2) )
+    numerator, denominator = pvt_lambda_var_terms(x, w)
     
     if denominator == 0: 
         lambda_var = 1
     else:
-        lambda_var = minmax(numerator/denominator * h1w2)
+        lambda_var = minmax(numerator/denominator)
  
     if verbose: 
         print(lambda_var)   
   
     return float(lambda_var)
+
+def pvt_lambda_var_terms(x, w = None):
+    """Numerator (summed estimated variances of the empirical variances) and
+    denominator (summed squared distances of the empirical variances from 
+    the target) of the variance shrinkage intensity
+    """
+    q1, qq, w2 = pvt_lambda_var_columns(x, w)
+    return pvt_lambda_var_sums(q1, qq, w2)
+
+def pvt_lambda_var_columns(x, w = None):
+    """Per column weighted second (q1) and fourth (qq) central moments of x
+    and the sum of squared weights w2, from which pvt_lambda_var_sums() 
+    gives the variance shrinkage intensity terms of any subset of columns
+    """
+    n, p = x.shape
+    w2 = pvt_w2(w, n)       # for w=1/n this equals 1/n   where n=dim(xs)[1]
+    w = pvt_check_w(w, n)
+    wv = np.ravel(w)
+    mean = wt_moments(x, w)["mean"]
+    # weighted moments of the squared centred data, accumulated in row blocks
+    # so that no centred copy of x is needed
+    q1 = np.zeros(p)
+    qq = np.zeros(p)
+    for b in pvt_row_blocks(n, p):
+        zz = np.power(x[b,:] - mean, 2)
+        q1 += np.matmul(wv[b], zz)
+        qq += np.matmul(wv[b], np.power(zz,2))
+    return q1, qq, w2
+
+def pvt_lambda_var_sums(q1, qq, w2):
+    """Numerator and denominator of the variance shrinkage intensity from
+    the column moments of pvt_lambda_var_columns()
+    """
+    # bias correction factors
+    h1 = 1/(1-w2)       # for w=1/n this equals the usual h1=n/(n-1)
+    h1w2 = w2/(1-w2)    # for w=1/n this equals 1/(n-1)
+    # compute empirical variances 
+    v = h1*q1
+    # compute shrinkage target
+    target = np.median(v)
+    q2 = qq - np.power(q1,2)   
+    numerator = np.sum( q2 ) * h1w2
+    denominator = np.sum( np.power(q1 - target/h1, 2) )
+    return numerator, denominator
     
-def estimate_lambda(x, w = None, verbose = False):
+def pvt_lambda_var_moments(m2, m4, n):
+    """Variance shrinkage intensity (as estimate_lambda_var() with equal weights)
+    from the column sums of squares m2 and fourth powers m4 of centred data
+    with n samples
+    
+    Returns
+    -------
+    tuple
+        Shrinkage intensity and the vector of empirical variances
+    """
+    h1 = n/(n-1)
+    v = h1 * m2 / n
+    target = np.median(v)
+    q1 = m2 / n
+    q2 = m4 / n - np.power(q1, 2)
+    denominator = np.sum( np.power(q1 - target/h1, 2) )
+    if denominator == 0:
+        lambda_var = 1
+    else:
+        lambda_var = minmax(np.sum(q2)/denominator / (n-1))
+    return float(lambda_var), v
+    
+@staged("estimate_lambda")
+def estimate_lambda(x, w = None, verbose = False, overwrite_x = False):
     """Estimate correlation shrinkage intensity
     
     Parameters
@@ -75,6 +129,8 @@ def estimate_lambda(x, w = None, verbose = False):
         Samples by variables array of input data.
     w : numpy vector/array
         Vector of weights for samples.
+    overwrite_x : bool
+        Standardise x in place instead of working on a copy (False).
     
     Returns
     -------
@@ -89,12 +145,29 @@ def estimate_lambda(x, w = None, verbose = False):
         return float(1)
     if n < 3:
         exit("Sample size too small!")
-    w = pvt_check_w(w, n)
-    xs, _ = wt_scale(x, w, center=True, scale=True) # standardise data matrix
     if verbose:
         print("Estimating optimal shrinkage intensity lambda (correlation matrix): ")
+    numerator, denominator = pvt_lambda_cor_terms(x, w, overwrite_x)
+    if denominator == 0:
+        my_lambda = 1
+    else:
+        my_lambda = minmax(numerator/denominator)
+
+    if verbose:
+        print(my_lambda)
+
+    return float(my_lambda)
+
+def pvt_lambda_cor_terms(x, w = None, overwrite_x = False):
+    """Numerator (summed estimated variances of the empirical correlations) 
+    and denominator (summed squared empirical correlations) of the correlation
+    shrinkage intensity, both over the off-diagonal entries
+    """
+    n, p = x.shape
+    xs, _ = wt_scale(x, w, center=True, scale=True, copy=not overwrite_x) # standardise data matrix
     # bias correction factors
-    w2 = np.sum(w*w)           # for w=1/n this equals 1/n   where n=dim(xs)[1]
+    w2 = pvt_w2(w, n)           # for w=1/n this equals 1/n   where n=dim(xs)[1]
+    w = pvt_check_w(w, n)
     h1w2 = w2/(1-w2)        # for w=1/n this equals 1/(n-1)
 
     sw = np.sqrt(w)
@@ -108,21 +181,137 @@ def estimate_lambda(x, w = None, verbose = False):
  
     # Here's how to compute off-diagonal sums much more efficiently for n << p
     # this algorithm is due to Miika Ahdesm\"aki
-    xsw = xs * sw # numpy broadcast
-    
-    svd_d, svd_u, svd_v = fast_svd(xsw)
-    sE2R = np.sum(xsw * np.matmul((svd_u*np.power(svd_d,3)), svd_v.T)) - np.sum(np.power(np.sum(np.power(xsw,2),axis=0, keepdims=True),2)) 
-    xs2w = np.power(xs,2) * sw
-    sER2 = 2*np.sum(xs2w[:,range(p-2,-1,-1)] * np.cumsum(xs2w[:,range(p-1,0,-1)], axis=1))
-    #######
-    denominator = sE2R
-    numerator = sER2 - sE2R
-    if denominator == 0:
-        my_lambda = 1
+    # With xsw = xs * sw = u d v', sum(E2R) = sum(d^4) and the diagonal of 
+    # E2R holds the squared column sums of xsw^2. Only the singular values 
+    # are needed, and for equal weights they are those of xs times sw.
+    wv = np.ravel(w)
+    if np.all(wv == wv[0]):
+        svd_d = fast_svd(xs, compute_u=False, compute_v=False)[0] * np.sqrt(wv[0])
     else:
-        my_lambda = minmax(numerator/denominator * h1w2)
+        svd_d = fast_svd(xs * sw, compute_u=False, compute_v=False)[0]
+    # sum(ER2) - sum(diag(ER2)) = sum_k w_k ((sum_j xs_kj^2)^2 - sum_j xs_kj^4)
+    colsq = np.zeros(p)
+    sER2 = 0
+    for b in pvt_row_blocks(n, p):
+        xs2 = np.power(xs[b,:], 2)
+        colsq += np.matmul(wv[b], xs2)
+        sER2 += np.sum(wv[b] * (np.power(np.sum(xs2, axis=1), 2) - np.sum(np.power(xs2, 2), axis=1)))
+    sE2R = np.sum(np.power(svd_d, 4)) - np.sum(np.power(colsq, 2))
+    #######
+    return (sER2 - sE2R) * h1w2, sE2R
 
+def estimate_lambda_subsample(x, w = None, n_rows = 1000, n_cols = 1000, n_subsamples = 10, 
+                              tol = 0.01, random_state = None, verbose = False, overwrite_x = False):
+    """Approximate correlation shrinkage intensity from random subsamples of
+    rows and columns
+    
+    The intensity is estimated on n_subsamples random n_rows by n_cols 
+    submatrices. Column subsampling gives a ratio estimate of the off-diagonal
+    sums. The sampling variance part of the numerator scales with 
+    w2/(1-w2) (1/(n-1) for equal weights), so the subsample terms are 
+    extrapolated to the full number of rows. The result is the mean of the 
+    estimates, with its standard error se over the subsamples. If se is 
+    larger than tol times the mean, estimate_lambda() is run on the full 
+    data instead.
+    
+    se only measures the subsampling noise: the extrapolation from fewer 
+    rows and the ratio estimate from fewer columns leave a bias that it 
+    does not include (of the order of 1% of the intensity for 1000 x 1000
+    subsamples, more for smaller ones), so mean -/+ 2 se is not a 
+    confidence interval for the exact intensity.
+    
+    Parameters
+    ----------
+    x : numpy array
+        Samples by variables array of input data.
+    w : numpy vector/array
+        Vector of weights for samples.
+    n_rows, n_cols : int
+        Size of each subsample (1000, 1000). The full data is used along an
+        axis that is not larger than this.
+    n_subsamples : int
+        Number of subsamples (10).
+    tol : float
+        Largest accepted standard error relative to the estimate (0.01).
+    random_state : int or numpy RandomState
+        Seed of the subsampling.
+    overwrite_x : bool
+        Allow x to be standardised in place if the exact estimate is 
+        computed (False).
+    
+    Returns
+    -------
+    dict
+        lambda_cor (float), se (standard error of the mean of the 
+        subsample estimates), estimates (array of per-subsample estimates)
+        and exact (True if the exact estimate was computed; se and 
+        estimates are None if no subsampling was done)
+    """
+    result = pvt_lambda_subsample(x, w, pvt_lambda_cor_terms, n_rows, n_cols, n_subsamples, 
+                                  tol, random_state, verbose)
+    result["lambda_cor"] = result.pop("value")
+    if result["exact"]:
+        result["lambda_cor"] = estimate_lambda(x, w, overwrite_x = overwrite_x)
     if verbose:
-        print(my_lambda)
+        print("Estimating shrinkage intensity lambda (correlation matrix) from subsamples:", 
+              result["lambda_cor"], "standard error", result["se"])
+    return result
+
+def estimate_lambda_var_subsample(x, w = None, n_rows = 1000, n_cols = 1000, n_subsamples = 10, 
+                                  tol = 0.01, random_state = None, verbose = False):
+    """Approximate variance shrinkage intensity from random subsamples of rows
+    and columns, with the standard error over the subsamples (see 
+    estimate_lambda_subsample())
+    
+    Returns
+    -------
+    dict
+        lambda_var (float), se (standard error of the mean of the subsample
+        estimates), estimates (array of per-subsample estimates) and exact 
+        (True if the exact estimate was computed; se and estimates are None
+        if no subsampling was done)
+    """
+    result = pvt_lambda_subsample(x, w, pvt_lambda_var_terms, n_rows, n_cols, n_subsamples, 
+                                  tol, random_state, verbose)
+    result["lambda_var"] = result.pop("value")
+    if result["exact"]:
+        result["lambda_var"] = estimate_lambda_var(x, w)
+    if verbose:
+        print("Estimating shrinkage intensity lambda.var (variance vector) from subsamples:", 
+              result["lambda_var"], "standard error", result["se"])
+    return result
 
-    return float(my_lambda)
\ No newline at end of file
+def pvt_lambda_subsample(x, w, terms, n_rows, n_cols, n_subsamples, tol, random_state, verbose):
+    """Mean and standard error of the shrinkage intensities of random 
+    submatrices. value is None and exact True if the exact intensity should 
+    be computed instead.
+    """
+    if n_subsamples < 2:
+        raise ValueError("At least two subsamples are needed for a standard error")
+    n, p = x.shape
+    m = min(n, n_rows)
+    q = min(p, n_cols)
+    if m < 3 or (m == n and q == p): # nothing to gain from subsampling
+        return dict(se = None, estimates = None, exact = True, value = None)
+    rng = random_state if isinstance(random_state, np.random.RandomState) else np.random.RandomState(random_state)
+    w2 = pvt_w2(w, n)
+    h1w2_full = w2/(1-w2)
+    estimates = np.zeros(n_subsamples)
+    for i in range(n_subsamples):
+        rows = np.sort(rng.choice(n, m, replace = False))
+        cols = np.sort(rng.choice(p, q, replace = False))
+        ws = None if w is None else w[rows] # slices keep FrequencyWeights
+        numerator, denominator = terms(x[np.ix_(rows, cols)], ws)
+        # the numerator estimates the summed sampling variance at m rows, 
+        # which is part of the denominator too: rescale both to n rows
+        ws2 = pvt_w2(ws, m)
+        full = numerator * h1w2_full / (ws2/(1-ws2))
+        denominator = denominator - numerator + full
+        estimates[i] = 1 if denominator <= 0 else minmax(full/denominator)
+    my_lambda = float(np.mean(estimates))
+    se = float(np.std(estimates, ddof = 1) / np.sqrt(n_subsamples))
+    if se > tol * my_lambda:
+        if verbose:
+            print("Standard error", se, "of", my_lambda, "too large, computing exact shrinkage intensity")
+        return dict(se = se, estimates = estimates, exact = True, value = None)
+    return dict(se = se, estimates = estimates, exact = False, value = my_lambda)
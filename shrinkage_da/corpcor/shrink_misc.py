@@ -22,17 +22,58 @@ def pvt_check_w(w, n):
     Returns
     -------
     array
-        Scaled weight vector.
+        Scaled weight vector (column).
         
     """
     if w is None: # return equal weights
         w = np.ones((n,1))/n
     else:
+        w = np.asarray(w) # plain array also for FrequencyWeights
         if w.shape[0] != n:
             exit("Weight vector has incompatible length")
+        w = np.reshape(w, (n,1))
         w = w if np.sum(w) == 1 else w / np.sum(w)
     return w
 
+class FrequencyWeights(np.ndarray):
+    """Sample weights counting how often each sample occurs
+    
+    Estimates with frequency weights c equal those on the data with each row
+    repeated c times (for integer c). They only differ from the usual 
+    (normalised) weights w in the bias correction, where sum(w^2) is replaced 
+    by 1/sum(c), see pvt_w2(). Slices of frequency weights are frequency 
+    weights, any other operation gives a plain array. pvt_w2() recognises
+    them by the frequency attribute rather than by class, so that they keep
+    working if this module is loaded more than once.
+    """
+    frequency = True
+
+    def __new__(cls, counts):
+        return np.reshape(np.asarray(counts, dtype = np.float64), (-1, 1)).view(cls)
+    
+    def __array_wrap__(self, obj, context = None, return_scalar = False):
+        obj = obj.view(np.ndarray)
+        return obj[()] if return_scalar else obj
+
+def pvt_w2(w, n):
+    """Sum of the squared normalised weights (1/n for equal weights), or 
+    1/sum(w) for FrequencyWeights, as used in the bias correction factors 
+    h1 = 1/(1-w2) and w2/(1-w2)
+    """
+    if w is None:
+        return 1/n
+    if getattr(w, "frequency", False):
+        return 1/float(np.sum(w.view(np.ndarray)))
+    w = pvt_check_w(w, n)
+    return float(np.sum(w*w))
+
+def pvt_row_blocks(n, p, block_bytes = 2**23):
+    """Slices over the rows of an n by p array in blocks of about block_bytes
+    (of float64), used to keep temporaries small when processing large arrays
+    """
+    step = max(1, block_bytes // (8 * max(p, 1)))
+    return [slice(i, min(i + step, n)) for i in range(0, n, step)]
+
 def minmax(x, my_min=0, my_max=1):
     """Restrict float to between a minimum and maximum value
     Parameters
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Per-machine choice of the fast_svd() route
+
+Which way of computing the SVD is fastest (Gram matrix and svd or eigh, QR,
+or a direct svd) depends on the BLAS/LAPACK build, the number of cores and
+the shape. calibrate() times each route on small random matrices and fits
+a cost model per route, t = c0 + c1 s^2 l + c2 s^3 for a matrix with
+smaller side s and larger side l, separately for each combination of
+singular vectors fast_svd() is asked for (none, u, v or both), which cost
+differently on each route. enable_autotune() loads the model stored for this
+machine (calibrating and storing it first if there is none) and makes
+fast_svd() pick the route with the smallest predicted time.
+
+@author Miika Ahdesmaki
+"""
+from __future__ import print_function, division
+import json
+import os
+import platform
+import time
+import numpy as np
+from . import fast_svd as pvt_fast_svd
+
+CALIBRATION_SHAPES = tuple((s, s * r) for s in (32, 64, 128, 256) for r in (1, 4, 16))
+MODEL_VERSION = 2
+VECTOR_MODES = dict(values = (False, False), u = (True, False), v = (False, True), uv = (True, True))
+
+def machine_info():
+    """Description of the machine and the linear algebra build a cost model
+    is valid for
+    """
+    info = dict(machine = platform.machine(), processor = platform.processor(),
+                cpu_count = os.cpu_count(), numpy = np.__version__, blas = None)
+    try:
+        config = np.show_config(mode = "dicts")
+        info["blas"] = config["Build Dependencies"]["blas"]["name"]
+    except Exception: # older NumPy without mode="dicts"
+        pass
+    return info
+
+def default_path():
+    """Default location of the stored cost model (in the user cache directory)
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "shrinkage_da", "svd_cost_model.json")
+
+class SvdCostModel(object):
+    """Predicted fast_svd() time per route
+
+    Parameters
+    ----------
+    coefs : dict
+        (c0, c1, c2) per "route/mode", where the mode is one of the
+        VECTOR_MODES ("values", "u", "v" or "uv").
+    machine : dict
+        machine_info() of the machine the model was calibrated on.
+    """
+    def __init__(self, coefs, machine = None):
+        self.coefs = coefs
+        self.machine = machine_info() if machine is None else machine
+
+    def predict(self, n, p, compute_u = True, compute_v = True):
+        """Predicted time in seconds of each route for an n by p matrix and
+        the singular vectors asked for
+        """
+        s, l = min(n, p), max(n, p)
+        mode = pvt_mode(compute_u, compute_v)
+        return dict((key.split("/")[0], c[0] + c[1] * s * s * l + c[2] * s ** 3)
+                    for key, c in self.coefs.items() if key.endswith("/" + mode))
+
+    def choose(self, n, p, compute_u = True, compute_v = True):
+        """Route with the smallest predicted time
+        """
+        t = self.predict(n, p, compute_u, compute_v)
+        return min(t, key = t.get)
+
+    def save(self, path = None):
+        path = default_path() if path is None else path
+        if not os.path.isdir(os.path.dirname(path) or "."):
+            os.makedirs(os.path.dirname(path))
+        tmp = path + ".tmp" + str(os.getpid())
+        with open(tmp, "w") as f:
+            json.dump(dict(version = MODEL_VERSION, machine = self.machine, coefs = self.coefs), f, indent = 1)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path = None):
+        """Stored model, or None if there is none for this machine
+        """
+        path = default_path() if path is None else path
+        try:
+            with open(path) as f:
+                stored = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if stored.get("version") != MODEL_VERSION or stored.get("machine") != machine_info():
+            return None
+        return cls(dict((k, tuple(c)) for k, c in stored["coefs"].items()), stored["machine"])
+
+def pvt_mode(compute_u, compute_v):
+    """Key of VECTOR_MODES for the singular vectors asked for
+    """
+    return ("u" if compute_u else "") + ("v" if compute_v else "") or "values"
+
+def calibrate(shapes = CALIBRATION_SHAPES, repeats = 3, random_state = 0, verbose = False):
+    """Time every route on random matrices and fit the cost model
+
+    Parameters
+    ----------
+    shapes : list of tuples
+        Matrix shapes (smaller side, larger side) to time, both orientations
+        are timed.
+    repeats : int
+        Timings per shape, route and VECTOR_MODES entry, the minimum is
+        used (3).
+
+    Returns
+    -------
+    SvdCostModel
+    """
+    from scipy.optimize import nnls # imported here to keep module import light
+    rng = np.random.RandomState(random_state)
+    rows = dict()
+    for s, l in shapes:
+        for shape in ((s, l), (l, s)) if s != l else ((s, l),):
+            m = rng.standard_normal(shape)
+            for route in pvt_fast_svd.SVD_ROUTES:
+                for mode, (compute_u, compute_v) in VECTOR_MODES.items():
+                    t = np.inf
+                    for _ in range(repeats):
+                        t0 = time.perf_counter()
+                        pvt_fast_svd.fast_svd(m, compute_u = compute_u, compute_v = compute_v, route = route)
+                        t = min(t, time.perf_counter() - t0)
+                    key = route + "/" + mode
+                    rows.setdefault(key, []).append((1.0, s * s * l, s ** 3, t))
+                    if verbose:
+                        print(key, shape, t)
+    coefs = dict()
+    for key, r in rows.items():
+        r = np.array(r)
+        # relative least squares: divide each row by its time
+        A = r[:, :3] / r[:, 3:]
+        scale = np.max(A, axis = 0)
+        c, _ = nnls(A / scale, np.ones(len(r)))
+        coefs[key] = tuple(float(v) for v in c / scale)
+    return SvdCostModel(coefs)
+
+def enable_autotune(path = None, recalibrate = False, **kwargs):
+    """Make fast_svd() choose its route with the cost model of this machine
+
+    Parameters
+    ----------
+    path : string
+        JSON file of the cost model (default_path()).
+    recalibrate : bool
+        Calibrate even if a model is stored for this machine (False).
+    **kwargs
+        Passed to calibrate().
+
+    Returns
+    -------
+    SvdCostModel
+        The model in use
+    """
+    model = None if recalibrate else SvdCostModel.load(path)
+    if model is None:
+        model = calibrate(**kwargs)
+        model.save(path)
+    pvt_fast_svd.set_cost_model(model)
+    return model
+
+def disable_autotune():
+    """Go back to the fixed shape rule of fast_svd()
+    """
+    pvt_fast_svd.set_cost_model(None)
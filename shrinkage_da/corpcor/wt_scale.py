@@ -6,7 +6,7 @@ Weighted Expectations and Variances
 """
 from __future__ import print_function, division
 from sys import exit
-from shrink_misc import pvt_check_w
+from .shrink_misc import pvt_check_w, pvt_row_blocks, pvt_w2
 import numpy as np
 
 def wt_var(x, w):
@@ -24,8 +24,8 @@ def wt_var(x, w):
     array
         Vector array of (weighted) variances
     """
+    h1 = 1/(1-pvt_w2(w, x.shape[0]))  # for w=1/n this equals the usual h1=n/(n-1)
     w = pvt_check_w(w, x.shape[0]) # x.shape[0] is number of samples
-    h1 = 1/(1-sum(w*w))  # for w=1/n this equals the usual h1=n/(n-1)
     xc = x - np.average(x, weights = w)
     s2 = h1 * np.average(xc*xc, weights = w)
     return s2
@@ -50,16 +50,23 @@ def wt_moments(x, w):
         Centred and/or scaled matrix/array
         
     """
-    w = pvt_check_w(w, x.shape[0]) # x.shape[0] is number of samples
     if not isinstance(x, np.ndarray):
         exit("Input x to wt_scale() must be numpy array")
     # bias correction factor
-    h1 = 1/(1-sum(w*w))   # for w=1/n this equals the usual h1=n/(n-1)
+    h1 = 1/(1-pvt_w2(w, x.shape[0]))   # for w=1/n this equals the usual h1=n/(n-1)
+    w = pvt_check_w(w, x.shape[0]) # x.shape[0] is number of samples
  
      
-    m = np.sum(w*x, axis = 0) # column sums
-  
-    v = h1*(np.sum(w*np.power(x, 2), axis = 0) - np.power(m,2))
+    wv = np.ravel(w)
+    # weighted column sums and sums of squares in row blocks to avoid n x p 
+    # temporaries (and copies of x if it is not float64)
+    m = np.zeros(x.shape[1])
+    s2 = np.zeros(x.shape[1])
+    for b in pvt_row_blocks(*x.shape):
+        xb = x[b,:].astype(np.float64, copy=False)
+        m += np.matmul(wv[b], xb)
+        s2 += np.matmul(wv[b], np.power(xb, 2))
+    v = h1*(s2 - np.power(m,2))
  
   
     # set small values of variance exactly to zero
@@ -67,7 +74,7 @@ def wt_moments(x, w):
   
     return dict(mean=m, var=v)
 
-def wt_scale(x, w, center=True, scale=True):
+def wt_scale(x, w, center=True, scale=True, copy=True):
     """scale using weights    x : array
         The first parameter.
     w : column vector/array
@@ -84,6 +91,8 @@ apply(a, 2, wt.var, w=w
         Centre data
     scale : bool
         Scale data
+    copy : bool
+        If False, centre and scale x in place (x must be a float array)
     
     Returns
     -------
@@ -93,16 +102,23 @@ apply(a, 2, wt.var, w=w
     """
     if not isinstance(x, np.ndarray):
         exit("Input x to wt_scale() must be numpy array")
-    w = pvt_check_w(w, x.shape[0]) # x.shape[0] is number of samples
-    # compute column means and variances
+    # compute column means and variances (wt_moments() checks the weights)
     wm = wt_moments(x, w)
     sc = None
+    if scale:
+        sc = np.sqrt(wm["var"])
+        sc[sc == 0] = np.inf # this help with division by zero
+    if not copy:
+        for b in pvt_row_blocks(*x.shape):
+            if center:
+                x[b,:] -= wm["mean"]
+            if scale:
+                x[b,:] /= sc
+        return x, sc
     if center:
         # use numpy broadcasting to subtract means in vector from matrix 
         x = x - wm["mean"]
     if scale:
-        sc = np.sqrt(wm["var"])
-        sc[sc == 0] = np.inf # this help with division by zero
         # use numpy broadcasting to scale data
         x = x / sc # if mean is not subtracted, note that the mean will shift due to scaling
 
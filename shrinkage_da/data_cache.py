@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+Fast repeated loading of delimited text matrices
+
+A CSV file is parsed once, in chunks of rows, straight into a .npy file in
+the user cache directory (or in cache_dir); later loads memory map that
+file, which takes milliseconds regardless of its size. The .npy file is
+keyed by the path, size and modification time of the CSV file and the
+parsing options, so it is rebuilt when the CSV file changes. Column and row
+names, if present, are kept in a small JSON file alongside.
+
+Only NumPy and the standard library are imported here.
+
+@author Miika Ahdesmaki
+"""
+from __future__ import print_function, division
+import csv
+import glob
+import hashlib
+import json
+import os
+import numpy as np
+
+CACHE_VERSION = 2
+
+def pvt_is_number(field):
+    try:
+        float(field)
+    except ValueError:
+        return False
+    return True
+
+def pvt_sniff(path, delimiter):
+    """Private function guessing whether the file has a header row (an empty
+    first field or non-numeric fields) and a first column of row names (a
+    quoted or non-numeric first field in the first data row)
+    """
+    with open(path, newline = "") as f:
+        raw = [f.readline(), f.readline()]
+    first, second = (next(csv.reader([line], delimiter = delimiter), [""]) for line in raw)
+    header = first[0] == "" or not all(pvt_is_number(v) for v in first[1:] or first)
+    line, row = (raw[1], second) if header and raw[1].strip() else (raw[0], first)
+    index_col = line.lstrip().startswith('"') or not pvt_is_number(row[0])
+    return header, index_col
+
+def default_cache_dir():
+    """Default directory of the cached .npy files (in the user cache
+    directory)
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "shrinkage_da", "data")
+
+def cache_path(path, cache_dir = None, header = None, index_col = None, delimiter = ",", dtype = "float64"):
+    """Path of the .npy file caching the parsed CSV file path
+
+    The file name is the name of the CSV file, a hash of its absolute path
+    (so that files of the same name in different directories can share
+    cache_dir) and a hash of its size, modification time and the parsing
+    options.
+    """
+    st = os.stat(path)
+    key = json.dumps(dict(size = st.st_size, mtime = st.st_mtime_ns, header = header, index_col = index_col,
+                          delimiter = delimiter, dtype = np.dtype(dtype).str, version = CACHE_VERSION),
+                     sort_keys = True)
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir or default_cache_dir(), pvt_cache_stem(path) + "." + digest + ".npy")
+
+def pvt_cache_stem(path):
+    """Private function naming the cached files of the CSV file path: its
+    name and a hash of its absolute path
+    """
+    location = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:12]
+    return os.path.basename(path) + "." + location
+
+def load_matrix(path, cache_dir = None, header = None, index_col = None, delimiter = ",",
+                dtype = "float64", chunk_bytes = 2**25, mmap_mode = "r"):
+    """Load a numeric matrix from a .npy or delimited text file, caching
+    text files as .npy
+
+    Parameters
+    ----------
+    path : string
+        A .npy file (loaded as it is) or a delimited text file.
+    cache_dir : string
+        Directory of the cached .npy files (None: default_cache_dir(), in
+        the user cache directory).
+    header : bool
+        The first row holds column names (None: guessed).
+    index_col : bool
+        The first column holds row names (None: guessed).
+    delimiter : string
+        Field delimiter (',').
+    dtype : string
+        Data type of the matrix ('float64').
+    chunk_bytes : int
+        Size of the text parsed at a time (32 MiB, at least one row); memory
+        use while parsing is a small multiple of chunk_bytes.
+    mmap_mode : string
+        Memory map mode of the loaded .npy file ('r'; None reads it into
+        memory).
+
+    Returns
+    -------
+    tuple
+        The matrix and a dict with the column and row names (None if
+        absent)
+    """
+    if path.endswith(".npy"):
+        return np.load(path, mmap_mode = mmap_mode), dict(columns = None, rows = None)
+    if header is None or index_col is None:
+        guessed = pvt_sniff(path, delimiter)
+        header = guessed[0] if header is None else header
+        index_col = guessed[1] if index_col is None else index_col
+    target = cache_path(path, cache_dir, header, index_col, delimiter, dtype)
+    if not os.path.exists(target):
+        pvt_convert(path, target, header, index_col, delimiter, np.dtype(dtype), chunk_bytes)
+    with open(target[:-4] + ".json") as f:
+        names = json.load(f)
+    return np.load(target, mmap_mode = mmap_mode), names
+
+def pvt_convert(path, target, header, index_col, delimiter, dtype, chunk_bytes):
+    """Private function parsing the text file path chunk by chunk into the
+    .npy file target, writing the .npy header last once the number of rows
+    is known. The partial file is removed if parsing fails.
+    """
+    directory = os.path.dirname(target)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    tmp = target + ".tmp" + str(os.getpid())
+    try:
+        columns, rows = pvt_write_npy(path, tmp, header, index_col, delimiter, dtype, chunk_bytes)
+        for old in glob.glob(os.path.join(glob.escape(os.path.dirname(target)), glob.escape(pvt_cache_stem(path)) + ".*.npy")):
+            if old != target: # caches of earlier versions of the file
+                os.remove(old)
+                if os.path.exists(old[:-4] + ".json"):
+                    os.remove(old[:-4] + ".json")
+        with open(target[:-4] + ".json", "w") as f:
+            json.dump(dict(columns = columns, rows = rows), f)
+        os.replace(tmp, target)
+    finally:
+        if os.path.exists(tmp): # parsing failed
+            os.remove(tmp)
+
+def pvt_write_npy(path, tmp, header, index_col, delimiter, dtype, chunk_bytes):
+    """Private function writing the .npy file tmp, returning the column and
+    row names (None if absent)
+    """
+    columns = None
+    rows = [] if index_col else None
+    n = 0
+    with open(path, newline = "") as src, open(tmp, "wb") as out:
+        if header:
+            columns = next(csv.reader([src.readline()], delimiter = delimiter))
+            if index_col:
+                columns = columns[1:]
+        p = None
+        d = dict(descr = np.lib.format.dtype_to_descr(dtype), fortran_order = False, shape = (0, 0))
+        while True:
+            lines = pvt_read_lines(src, chunk_bytes)
+            if not lines:
+                break
+            if p is None:
+                p = len(next(csv.reader(lines[:1], delimiter = delimiter))) - (1 if index_col else 0)
+                d["shape"] = (0, p)
+                np.lib.format.write_array_header_1_0(out, d) # rewritten with the row count below
+                start = out.tell()
+            if index_col:
+                rows.extend(next(csv.reader([line], delimiter = delimiter))[0] for line in lines)
+            usecols = range(1, p + 1) if index_col else None
+            block = np.loadtxt(lines, delimiter = delimiter, dtype = dtype, usecols = usecols,
+                               quotechar = '"', ndmin = 2)
+            if block.shape[1] != p:
+                raise ValueError("Rows of " + path + " have different numbers of fields")
+            out.write(np.ascontiguousarray(block).tobytes())
+            n += block.shape[0]
+        if p is None:
+            raise ValueError(path + " contains no data")
+        # the header is padded so that a larger row count fits in the same space
+        out.seek(0)
+        d["shape"] = (n, p)
+        np.lib.format.write_array_header_1_0(out, d)
+        if out.tell() != start:
+            raise RuntimeError("The .npy header changed size while writing " + tmp)
+    return columns, rows
+
+def pvt_read_lines(f, chunk_bytes):
+    """Private function reading non-empty lines of f until they hold at 
+    least chunk_bytes characters (or the file ends)
+    """
+    lines = []
+    size = 0
+    for line in f:
+        if line.strip():
+            lines.append(line)
+            size += len(line)
+            if size >= chunk_bytes:
+                break
+    return lines
+
+def load_labels(path, header = None, delimiter = ","):
+    """Class labels from a text file, one per line, optionally with a
+    header and a first column of row names (as written by R's write.csv);
+    the labels are the last column
+
+    Parameters
+    ----------
+    path : string
+        The text file.
+    header : bool
+        The first row is a header (None: guessed, a header if its first 
+        field is empty, or if it is a string that does not occur again 
+        while the labels are numbers or repeat).
+    
+    Returns
+    -------
+    ndarray
+        The labels (integers or floats if all labels are numbers, otherwise
+        strings)
+    """
+    with open(path, newline = "") as f:
+        rows = [r for r in csv.reader(f, delimiter = delimiter) if r]
+    labels = [r[-1] for r in rows]
+    if header is None:
+        rest = labels[1:]
+        header = len(rows) > 1 and (rows[0][0] == "" or (not pvt_is_number(labels[0]) and labels[0] not in rest
+                                                        and (all(pvt_is_number(v) for v in rest) or len(set(rest)) < len(rest))))
+    if header:
+        labels = labels[1:]
+    if all(pvt_is_number(v) for v in labels):
+        values = np.array([float(v) for v in labels])
+        return values.astype(np.int64) if np.all(values == np.round(values)) else values
+    return np.array(labels)
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Collapse repeated samples into weighted unique samples
+
+With frequency weights (see centroids()) a fit on the unique (row, label)
+pairs weighted by their counts gives the same model as the fit on all rows,
+while the centring, standardisation and SVD only see the unique rows.
+
+@author Miika Ahdesmaki
+"""
+from __future__ import print_function, division
+import numpy as np
+
+def compress_duplicates(X, L, w = None):
+    """Unique (row, label) pairs of X and L with summed weights
+
+    Parameters
+    ----------
+    X : numpy array
+        Samples-in-rows matrix.
+    L : vector array
+        Class labels, one per row of X.
+    w : vector array
+        Sample weights (None: each row counts once).
+
+    Returns
+    -------
+    tuple
+        X_unique (rows of X in order of first occurrence), L_unique and the
+        weights (summed over the repeats of each unique pair). X and L are
+        returned as they are (and w as ones if it was None) if there are no
+        repeated pairs.
+    """
+    n, p = X.shape
+    L = np.asarray(L)
+    if len(L) != n:
+        raise ValueError("Number of rows in X must match the number of class labels")
+    w = np.ones(n) if w is None else np.ravel(np.asarray(w, dtype = np.float64))
+    # each row as one opaque item of row bytes, then unique (row, label) codes
+    Xc = np.ascontiguousarray(X)
+    rows = Xc.view(np.dtype((np.void, Xc.dtype.itemsize * p))).ravel()
+    _, row_code = np.unique(rows, return_inverse = True)
+    _, label_code = np.unique(L, return_inverse = True)
+    pair = np.ravel(row_code) * (np.max(label_code) + 1) + np.ravel(label_code)
+    _, first, inverse = np.unique(pair, return_index = True, return_inverse = True)
+    if len(first) == n:
+        return X, L, w
+    order = np.argsort(first) # keep the order of first occurrence
+    first = first[order]
+    rank = np.empty(len(order), dtype = np.intp)
+    rank[order] = np.arange(len(order))
+    counts = np.bincount(rank[np.ravel(inverse)], weights = w, minlength = len(first))
+    return X[first, :], L[first], counts
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent on-disk cache of the low rank correlation factor
+
+The expensive part of a fit is the standardisation and SVD of the 
+class-centred data (and the estimation of lambda_cor from it). The class-
+centred scatter matrix is the total scatter matrix of the data less the
+rank K between-class scatter of the K centroids, so the label-independent 
+part, the low rank factor of the standardised total scatter matrix and the
+column scales, is stored under a content hash of X and the weights. A fit 
+with any labels on the same X and weights takes the factor from the cache 
+and corrects it for its centroids: a rank K downdate of the factor of rank
+r in O(p*(r+K)^2) plus O(n*p) for the class-centred variances, instead of
+the O(n*p*min(n, p)) SVD. The estimated lambda_cor of each label set is 
+stored in a small entry of its own, keyed by the dtype and raw values of 
+the labels. Entries are single .npz files written atomically; the least 
+recently used entries are removed when the cache grows beyond max_bytes.
+
+The downdate subtracts the between-class scatter from the total one, so 
+correlations from a cached factor carry rounding errors of the order of 
+machine precision times the ratio of total to within-class variances.
+
+@author Miika Ahdesmaki
+"""
+from __future__ import print_function, division
+import hashlib
+import os
+import tempfile
+import zipfile
+import numpy as np
+from .corpcor.shrink_misc import minmax, pvt_check_w, pvt_row_blocks, pvt_w2
+from .corpcor.wt_scale import wt_moments, wt_scale
+from .corpcor.fast_svd import fast_svd
+from .corpcor.pvt_cppowscor import pvt_cppowscor_apply
+from .corpcor.pvt_instrument import stage, note
+
+CACHE_VERSION = 2
+
+class FitCache(object):
+    """Directory of cached correlation factors with size-based LRU eviction
+
+    Parameters
+    ----------
+    path : string
+        Cache directory (created if it does not exist). May be shared by 
+        concurrent processes.
+    max_bytes : int
+        Total size of the cache files above which the least recently used
+        entries are removed (1 GiB).
+    """
+    def __init__(self, path, max_bytes = 2**30):
+        self.path = path
+        self.max_bytes = max_bytes
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def key(self, X, w = None):
+        """Content hash (hex string) of the data and weights: any change to
+        one of them gives another key
+        """
+        h = hashlib.blake2b(digest_size = 20)
+        h.update(str(CACHE_VERSION).encode())
+        for a in (X, w):
+            if a is None:
+                h.update(b"none")
+                continue
+            a = np.asarray(a)
+            h.update((str(a.dtype) + str(a.shape)).encode())
+            if a.ndim < 2:
+                h.update(np.ascontiguousarray(a).data)
+                continue
+            for b in pvt_row_blocks(*a.shape[:2]): # no full size copy of non-contiguous arrays
+                h.update(np.ascontiguousarray(a[b]).data)
+        return h.hexdigest()
+
+    def labels_key(self, key, L):
+        """Key of the entry of a label set for the data of key: the content 
+        hash of the dtype and raw values of the labels (so that 1 and "1" 
+        differ), of their types and representations for object arrays
+        """
+        L = np.asarray(L)
+        h = hashlib.blake2b(digest_size = 20)
+        h.update((str(L.dtype) + str(L.shape)).encode())
+        if L.dtype.kind == "O":
+            for label in np.ravel(L):
+                h.update((type(label).__name__ + ":" + repr(label) + "\0").encode())
+        else:
+            h.update(np.ascontiguousarray(L).data)
+        return key + "-" + h.hexdigest()
+
+    def get(self, key):
+        """Cached entry (dict of arrays) or None
+        """
+        fname = os.path.join(self.path, key + ".npz")
+        try:
+            with np.load(fname, allow_pickle = False) as f:
+                entry = dict((k, f[k]) for k in f.files)
+        except (IOError, OSError, ValueError, zipfile.BadZipFile):
+            return None
+        try:
+            os.utime(fname) # mark as recently used
+        except OSError: # evicted by another process meanwhile
+            pass
+        return entry
+
+    def put(self, key, entry):
+        """Store an entry (dict of arrays) atomically and evict least recently
+        used entries
+        """
+        fd, tmp = tempfile.mkstemp(dir = self.path, suffix = ".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **dict((k, np.asarray(a)) for k, a in entry.items()))
+            os.replace(tmp, os.path.join(self.path, key + ".npz"))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits max_bytes
+        """
+        entries = []
+        for name in os.listdir(self.path):
+            if name.endswith(".npz"):
+                try:
+                    st = os.stat(os.path.join(self.path, name))
+                except OSError: # removed by another process
+                    continue
+                entries.append((st.st_mtime, st.st_size, name))
+        total = sum(e[1] for e in entries)
+        for mtime, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        """Remove all entries
+        """
+        for name in os.listdir(self.path):
+            if name.endswith(".npz"):
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    pass
+
+def cached_cppowscor(cache, key, x, y, alpha, L, means, groups, lambda_cor = None, w = None, verbose = False):
+    """pvt_cppowscor(x, y, alpha, lambda_cor, w, return_factor=True, 
+    overwrite_x=True) taking the factor of the total scatter matrix and the 
+    estimated lambda_cor from the cache if available and storing them 
+    otherwise
+    
+    Parameters
+    ----------
+    cache : FitCache
+        The cache.
+    key : string
+        Key of the entry, FitCache.key() of the data and weights x was 
+        computed from.
+    x : matrix array
+        Class-centred data; overwritten.
+    L : list
+        Class labels of the rows of x.
+    means : matrix array
+        Class centroids, one column per class.
+    groups : list
+        Class labels of the columns of means.
+    """
+    n, p = x.shape
+    w2 = pvt_w2(w, n)
+    wv = np.ravel(pvt_check_w(w, n))
+    with stage("fit_cache", shape = x.shape):
+        codes = np.zeros(n, dtype = int)
+        L = np.asarray(L)
+        for k in range(len(groups)):
+            codes[L == groups[k]] = k
+        class_w = np.bincount(codes, weights = wv, minlength = len(groups))
+        between = (means - np.matmul(means, class_w)[:, None]) * np.sqrt(class_w) # B B' = between-class scatter
+        v_within = wt_moments(x, w)["var"]
+        entry = cache.get(key)
+        note(cache = "miss" if entry is None else "hit")
+        labels_key = cache.labels_key(key, L)
+        labels_entry = None if lambda_cor is not None else cache.get(labels_key)
+        row_terms = None
+        if lambda_cor is None and labels_entry is None and p > 1:
+            row_terms = pvt_row_terms(x, v_within, wv) # before x is overwritten
+        if entry is None:
+            entry = pvt_total_factor(x, codes, means, w)
+            cache.put(key, entry)
+        factor = pvt_within_factor(entry, between, v_within, wv, w2, max(n, p))
+        if lambda_cor is None:
+            if labels_entry is None:
+                lambda_cor = 1 if p == 1 else pvt_lambda_cor(factor, row_terms, w2)
+                cache.put(labels_key, dict(lambda_cor = lambda_cor))
+            else:
+                lambda_cor = float(labels_entry["lambda_cor"])
+        lambda_cor = minmax(lambda_cor)
+        if lambda_cor == 1 or alpha == 0: # in both cases R is the identity matrix
+            return dict(cp_powr = y, lambda_cor = lambda_cor, factor = None)
+        cp_powr = pvt_cppowscor_apply(factor, y, alpha, lambda_cor)
+    return dict(cp_powr = cp_powr, lambda_cor = lambda_cor, factor = factor)
+
+def pvt_total_factor(x, codes, means, w):
+    """Cache entry of the label-independent total scatter: the weighted 
+    standard deviations of the columns of the data (scale) and a factor T 
+    (total) of the standardised total scatter, T T' = xs' W xs with xs the
+    standardised data. x is the class-centred data and overwritten.
+    """
+    for b in pvt_row_blocks(*x.shape): # undo the class centring, in place
+        x[b, :] += means[:, codes[b]].T
+    xs, sc = wt_scale(x, w, center = True, scale = True, copy = False)
+    wv = np.ravel(pvt_check_w(w, x.shape[0]))
+    for b in pvt_row_blocks(*xs.shape):
+        xs[b, :] *= np.sqrt(wv[b])[:, None]
+    d, _, v = fast_svd(xs, compute_u = False)
+    sc[~np.isfinite(sc)] = 0
+    return dict(scale = sc, total = v * d)
+
+def pvt_within_factor(entry, between, v_within, wv, w2, size):
+    """Factor of the standardised class-centred data in the format of 
+    pvt_cppowscor_factor() from the cached total scatter, downdated by the 
+    between-class scatter B B' (rank K)
+    
+    With D the weighted standard deviations of the class-centred columns,
+    xs' W xs = D^-1 (S T T' S - B B') D^-1, S the cached scales. The 
+    eigendecomposition follows from a QR decomposition of the p x (r+K) 
+    matrix [D^-1 S T, D^-1 B] and a (r+K) x (r+K) eigenproblem. Eigenvalues
+    at the rounding level of the total scatter are dropped.
+    """
+    zeros = v_within == 0
+    d_within = np.sqrt(v_within)
+    d_within[zeros] = np.inf
+    total = entry["total"] * (entry["scale"] / d_within)[:, None]
+    columns = np.concatenate((total, between / d_within[:, None]), axis = 1)
+    q, t = np.linalg.qr(columns)
+    signs = np.concatenate((np.ones(total.shape[1]), -np.ones(between.shape[1])))
+    small = np.matmul(t * signs, t.T)
+    e, E = np.linalg.eigh((small + small.T)/2)
+    scale = max(np.max(e) if len(e) else 0, np.sum(total**2, axis = 1).max() if total.size else 0)
+    keep = e > size * np.finfo(float).eps * scale
+    v = np.matmul(q, E[:, keep])
+    e = e[keep]
+    if np.all(wv == wv[0]): # as pvt_cppowscor_factor(): singular values of xs, U'WU = I/n
+        return dict(d = np.sqrt(e / wv[0]), v = v, utwu = np.eye(len(e)) * wv[0], w2 = w2, zeros = zeros)
+    return dict(d = np.sqrt(e), v = v, utwu = np.eye(len(e)), w2 = w2, zeros = zeros)
+
+def pvt_row_terms(x, v_within, wv):
+    """Weighted column sums of squares and the row term of the summed 
+    variances of the correlations (see pvt_lambda_cor_terms()) of the 
+    standardised class-centred data x
+    """
+    sc = np.sqrt(v_within)
+    sc[sc == 0] = np.inf
+    colsq = np.zeros(x.shape[1])
+    sER2 = 0
+    for b in pvt_row_blocks(*x.shape):
+        xs2 = np.power(x[b, :] / sc, 2)
+        colsq += np.matmul(wv[b], xs2)
+        sER2 += np.sum(wv[b] * (np.power(np.sum(xs2, axis = 1), 2) - np.sum(np.power(xs2, 2), axis = 1)))
+    return colsq, sER2
+
+def pvt_lambda_cor(factor, row_terms, w2):
+    """Correlation shrinkage intensity (as estimate_lambda()) from the factor
+    of the standardised data and its row terms
+    """
+    colsq, sER2 = row_terms
+    e = np.power(factor["d"], 2) * np.diag(factor["utwu"]) # eigenvalues of xs' W xs
+    sE2R = np.sum(np.power(e, 2)) - np.sum(np.power(colsq, 2))
+    if sE2R == 0:
+        return 1
+    return minmax((sER2 - sE2R) * w2/(1 - w2) / sE2R)
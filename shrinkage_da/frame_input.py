@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Input from data frames with named columns (pandas DataFrame, Arrow Table or
+RecordBatch)
+
+A model fitted on a data frame records the names of its input columns
+("feature_names"). At prediction, only the columns the model uses are taken
+from a data frame, by name, instead of converting the whole frame to an
+array: a compact model using k of p columns copies n x k values. The frames
+are recognised by their attributes, so neither pandas nor pyarrow is
+imported here (only NumPy), and the column order of the frame does not
+matter.
+
+@author Miika Ahdesmaki
+"""
+from __future__ import print_function, division
+import numpy as np
+
+def feature_names(X):
+    """Column names of a data frame
+
+    Parameters
+    ----------
+    X : object
+        pandas DataFrame, Arrow Table or RecordBatch, or an array.
+
+    Returns
+    -------
+    ndarray or None
+        The column names (str), or None if X is not a data frame or not all
+        of its column names are strings.
+    """
+    if pvt_is_arrow(X):
+        names = list(X.column_names)
+    elif pvt_is_pandas(X):
+        names = list(X.columns)
+    else:
+        return None
+    if len(names) == 0 or not all(isinstance(name, str) for name in names):
+        return None
+    return np.asarray(names, dtype = str)
+
+def model_feature_names(sda_object):
+    """Names of the input columns a model uses, in the order of its beta
+
+    Parameters
+    ----------
+    sda_object : dict
+        dictionary from sda() (or sda_io.load_sda()) containing model
+        parameters
+
+    Returns
+    -------
+    ndarray or None
+        feature_names of the model, restricted to its idx if it uses a
+        subset of the columns; None if the model has no feature names.
+    """
+    names = sda_object.get("feature_names")
+    if names is None:
+        return None
+    names = np.asarray(names)
+    idx = sda_object.get("idx")
+    if idx is not None and len(idx) != len(names):
+        names = names[np.asarray(idx)]
+    return names
+
+def select_columns(X, names):
+    """The named columns of a data frame as a 2D array
+
+    A pandas DataFrame whose columns are all requested in their order is
+    converted as a whole with np.asarray. Otherwise the requested columns
+    are always copied into a new Fortran ordered n x k array (there is no
+    zero-copy path): each column is converted on its own, so only the k
+    requested columns are converted or copied, never the whole frame.
+    Integer and boolean columns are converted to float64.
+
+    Parameters
+    ----------
+    X : object
+        pandas DataFrame, Arrow Table or RecordBatch.
+    names : list
+        Names of the columns to take, in the order of the result.
+
+    Returns
+    -------
+    ndarray, shape (n_samples, len(names))
+
+    Raises
+    ------
+    ValueError
+        If a column is missing from X or a requested column is not numeric.
+    """
+    names = [str(name) for name in names]
+    present = set(feature_names(X))
+    missing = [name for name in names if name not in present]
+    if len(missing) > 0:
+        raise ValueError("Columns missing from the input: " + ", ".join(missing[:10]) +
+                         (" ..." if len(missing) > 10 else ""))
+    if pvt_is_arrow(X):
+        columns = [np.asarray(X.column(name)) for name in names]
+    else:
+        positions = X.columns.get_indexer(names)
+        if np.array_equal(positions, np.arange(X.shape[1])):
+            X = np.asarray(X)
+            return X.astype(pvt_numeric_dtype(X.dtype), copy = False)
+        columns = [np.asarray(X.iloc[:, j]) for j in positions]
+    dtype = pvt_numeric_dtype(np.result_type(*columns))
+    out = np.empty((len(columns[0]), len(columns)), dtype = dtype, order = "F")
+    for j, column in enumerate(columns):
+        out[:, j] = column
+    return out
+
+def pvt_numeric_dtype(dtype):
+    """Floating point dtype of the converted columns (float64 for integers)
+    """
+    if dtype.kind in "f":
+        return dtype
+    if dtype.kind not in "biu":
+        raise ValueError("Columns must be numeric, got dtype " + str(dtype))
+    return np.dtype(np.float64)
+
+def pvt_is_pandas(X):
+    return hasattr(X, "columns") and hasattr(X, "iloc")
+
+def pvt_is_arrow(X):
+    return hasattr(X, "column_names") and hasattr(X, "column") and hasattr(X, "num_rows")
@@ -7,6 +7,8 @@ Shrinkage discriminant analysis (prediction)
 from __future__ import print_function, division
 import numpy as np
 from sys import exit
+from .sda_quantize import pvt_decision_scores
+from .corpcor.shrink_misc import pvt_row_blocks
 
 def predict_sda(sda_object, Xtest, verbose = False):
     """SDA feature ranking
@@ -17,7 +19,13 @@ def predict_sda(sda_object, Xtest, verbose = False):
         dictionary from sda containing model parameters
     Xtest : numpy array
         samples-in-rows matrix. Number of columns must match the number of 
-        variables used in training of the provided sda_object
+        variables used in training of the provided sda_object, unless the
+        sda_object holds the indices "idx" of the columns it was trained on,
+        in which case those columns are taken from Xtest. A model with 
+        beta in low precision (see sda_quantize) is converted in blocks.
+        Models from sda_qda() (class-specific covariances) and ensembles
+        from sda_bagging() (posteriors averaged over the members) are 
+        supported.
     
     Returns
     -------
@@ -25,19 +33,129 @@ def predict_sda(sda_object, Xtest, verbose = False):
         dictionary containin class predictions and posterior probabilities. 
         Predicted class is the one with highest posterior probability.
     """
-    n, p = Xtest.shape
-    alpha = sda_object["alpha"]
-    beta = sda_object["beta"]
-    #cl_count = len(alpha)
-    if p != beta.shape[1]:
-        raise ValueError("Different number of predictors in sda object (" + str(beta.shape[1]) + ") and in Xtest (" + str(p) + ")")
+    Xtest = pvt_model_columns(sda_object, Xtest)
     if verbose:
-        print("Prediction uses ",p," features")
-    probs = (np.matmul(beta, Xtest.T) + alpha).T
-    probs = np.exp(probs - np.max(probs, axis=1, keepdims=True))
-    probs = probs / np.sum(probs, axis=1, keepdims=True)
+        print("Prediction uses ",Xtest.shape[1]," features")
+    probs = pvt_posterior(pvt_scores(sda_object, Xtest), sda_object.get("n_estimators", 1))
     
-    #yhat = sda_object["groups"][np.argmax(probs, axis=1)]
-    yhat = np.array([sda_object["groups"][myind] for myind in np.argmax(probs, axis=1)])
+    yhat = pvt_labels(sda_object["groups"][:-1])[np.argmax(probs, axis=1)] # vectorised, no Python loop over rows
+    
+    return dict(predicted_class = yhat, posterior = probs)
+
+def predict_topk_sda(sda_object, Xtest, k, verbose = False):
+    """The k most probable classes of each sample and their posterior
+    probabilities, without forming the n x K posterior matrix
+    
+    The scores are computed in blocks of rows. Per block the top k classes
+    are found by partial selection (argpartition) and their posteriors are
+    normalised by the log-sum-exp of all K scores of the row, so that memory
+    use is O(n k) plus one block of scores.
+    
+    Parameters
+    ----------
+    sda_object : dict
+        dictionary from sda containing model parameters (any model 
+        predict_sda() accepts)
+    Xtest : numpy array
+        samples-in-rows matrix (see predict_sda()).
+    k : int
+        Number of classes returned per sample, capped at the number of
+        classes K: for k > K all K classes are returned, so the results
+        have min(k, K) columns.
+    verbose : bool
+        Verbose mode (False).
     
-    return dict(predicted_class = yhat, posterior = probs)
\ No newline at end of file
+    Returns
+    -------
+    dict
+        Class labels (classes), their indices in the model's "groups" 
+        (index) and posterior probabilities (posterior), each n x min(k, K)
+        and ordered by decreasing probability
+    """
+    Xtest = pvt_model_columns(sda_object, Xtest)
+    labels = pvt_labels(sda_object["groups"][:-1])
+    k = min(int(k), len(labels))
+    if k < 1:
+        raise ValueError("k must be positive")
+    n, p = Xtest.shape
+    n_estimators = sda_object.get("n_estimators", 1)
+    if verbose:
+        print("Prediction uses ",p," features")
+    index = np.empty((n, k), dtype = np.intp)
+    posterior = np.empty((n, k))
+    for b in pvt_row_blocks(n, max(p, len(labels) * n_estimators)):
+        scores = pvt_scores(sda_object, Xtest[b, :])
+        if n_estimators > 1:
+            scores = np.log(pvt_posterior(scores, n_estimators))
+        index[b, :], posterior[b, :] = pvt_topk(scores, k)
+    return dict(classes = labels[index], index = index, posterior = posterior)
+
+def pvt_topk(scores, k):
+    """Private function returning the indices of the k largest scores of 
+    each row, in decreasing order, and their softmax probabilities over all
+    columns (stable: shifted by the row maximum). Overwrites scores.
+    """
+    K = scores.shape[1]
+    if k < K:
+        top = np.argpartition(scores, K - k, axis = 1)[:, K - k:]
+    else:
+        top = np.broadcast_to(np.arange(K), scores.shape).copy()
+    top_scores = np.take_along_axis(scores, top, axis = 1)
+    order = np.argsort(-top_scores, axis = 1, kind = "stable")
+    top = np.take_along_axis(top, order, axis = 1)
+    top_scores = np.take_along_axis(top_scores, order, axis = 1)
+    shift = top_scores[:, :1].copy() # the row maximum
+    top_scores -= shift
+    np.subtract(scores, shift, out = scores)
+    log_norm = np.log(np.sum(np.exp(scores, out = scores), axis = 1, keepdims = True))
+    return top, np.exp(top_scores - log_norm)
+
+def pvt_model_columns(sda_object, Xtest):
+    """Private function taking the columns the model uses from Xtest (see 
+    predict_sda()) and checking their number
+    """
+    n, p = Xtest.shape
+    qda = sda_object.get("qda")
+    p_model = sda_object["beta"].shape[1] if qda is None else qda["means"].shape[0]
+    idx = sda_object.get("idx")
+    if idx is not None and p != p_model:
+        Xtest = Xtest[:, idx]
+        p = Xtest.shape[1]
+    if p != p_model:
+        raise ValueError("Different number of predictors in sda object (" + str(p_model) + ") and in Xtest (" + str(p) + ")")
+    return Xtest
+
+def pvt_scores(sda_object, Xtest):
+    """Private function computing the discriminant scores (log posterior up
+    to a constant per sample; per member for ensembles) of Xtest
+    """
+    if "qda" not in sda_object:
+        return pvt_decision_scores(Xtest, sda_object["alpha"], sda_object["beta"], sda_object.get("beta_scale"))
+    from .sda_qda import pvt_qda_scores # imported here, linear models need NumPy only
+    return pvt_qda_scores(sda_object, Xtest)
+
+def pvt_labels(labels):
+    """Private function turning a list of class labels into an array without
+    coercing them to a common type: labels of mixed types (e.g. numbers and
+    strings) give an object array
+    """
+    array = np.asarray(labels)
+    if array.dtype.kind in "US" and not all(isinstance(l, (str, bytes, np.str_, np.bytes_)) for l in labels):
+        array = np.empty(len(labels), dtype = object)
+        array[:] = list(labels)
+    return array
+
+def pvt_posterior(scores, n_estimators = 1):
+    """Private function turning discriminant scores into posterior 
+    probabilities (overwriting scores). For an ensemble the scores hold 
+    n_estimators blocks of columns, one per member, and the members' 
+    posteriors are averaged.
+    """
+    n = scores.shape[0]
+    probs = scores.reshape(n, n_estimators, -1)
+    probs -= np.max(probs, axis=2, keepdims=True)
+    np.exp(probs, out = probs)
+    probs /= np.sum(probs, axis=2, keepdims=True)
+    if n_estimators == 1:
+        return probs.reshape(n, -1)
+    return np.mean(probs, axis=1)
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Removal of constant and duplicate features before fitting
+
+Constant features carry no information and identical features carry the
+same information twice, yet both go through the standardisation and the SVD
+of the correlation adjustment. find_redundant_features() detects them in one
+pass over the data, hashing each column (in blocks of columns) and comparing
+only columns with equal hashes exactly. sda() and catscore() then fit on the
+remaining features and the results are mapped back to all features:
+
+    constant features   beta, CAT scores and discriminant directions are 0
+    duplicate features  CAT scores are those of the kept copy; beta and the
+                        discriminant directions are split evenly between
+                        the copies, so predictions on data in which the
+                        copies are equal are those of the reduced model
+
+@author Miika Ahdesmaki
+"""
+from __future__ import print_function, division
+import numpy as np
+from .corpcor.shrink_misc import pvt_row_blocks
+
+def find_redundant_features(X, var_tol = 0, block_bytes = 2**23):
+    """Constant, near-constant and duplicate columns of X
+
+    Parameters
+    ----------
+    X : numpy array
+        Samples-in-rows matrix.
+    var_tol : float
+        Columns with a variance of at most var_tol times the median variance
+        of the columns count as constant (0: only exactly constant columns).
+    block_bytes : int
+        Size of the blocks of columns hashed at a time (8 MiB).
+
+    Returns
+    -------
+    dict
+        keep (sorted indices of the columns to fit on), representative (for
+        each column the position in keep of the column it equals, -1 for
+        constant columns), copies (number of columns each kept column
+        stands for), means (column means, the value of the constant
+        columns), n_constant and n_duplicate
+    """
+    n, p = X.shape
+    rng = np.random.RandomState(0)
+    multipliers = rng.randint(1, 2**62, size = n, dtype = np.int64).astype(np.uint64) | np.uint64(1)
+    hashes = np.empty(p, dtype = np.uint64)
+    means = np.empty(p)
+    variances = np.empty(p)
+    constant = np.empty(p, dtype = bool)
+    for b in pvt_row_blocks(p, n, block_bytes): # blocks of columns
+        xt = np.add(X[:, b].T, 0.0, dtype = np.float64) # column-major copy, -0.0 becomes 0.0
+        hashes[b] = np.matmul(xt.view(np.uint64), multipliers) # wraps around mod 2^64
+        constant[b] = np.min(xt, axis = 1) == np.max(xt, axis = 1)
+        means[b] = np.mean(xt, axis = 1)
+        xt -= means[b, None]
+        variances[b] = np.mean(xt * xt, axis = 1)
+    if var_tol > 0:
+        constant |= variances <= var_tol * np.median(variances)
+    representative = np.full(p, -1, dtype = np.intp)
+    candidates = np.flatnonzero(~constant)
+    order = candidates[np.argsort(hashes[candidates], kind = "stable")]
+    keep = []
+    i = 0
+    while i < len(order):
+        j = i + 1
+        while j < len(order) and hashes[order[j]] == hashes[order[i]]:
+            j += 1
+        group = list(order[i:j]) # equal hashes, in column order
+        while group:
+            first = group[0]
+            same = [c for c in group if c == first or np.array_equal(X[:, c], X[:, first])]
+            keep.append(first)
+            representative[same] = first
+            group = [c for c in group if c not in same]
+        i = j
+    keep = np.sort(np.array(keep, dtype = np.intp))
+    position = np.full(p, -1, dtype = np.intp)
+    position[keep] = np.arange(len(keep))
+    representative[~constant] = position[representative[~constant]]
+    copies = np.bincount(representative[~constant], minlength = len(keep))
+    return dict(keep = keep, representative = representative, copies = copies, means = means,
+                n_constant = int(np.sum(constant)), n_duplicate = int(p - len(keep) - np.sum(constant)))
+
+def expand_features(values, redundant, split = False, fill = 0):
+    """Map per-feature rows of a result on the kept columns back to all
+    columns
+
+    Parameters
+    ----------
+    values : numpy array
+        One row per kept column (e.g. CAT scores or beta.T).
+    redundant : dict
+        From find_redundant_features().
+    split : bool
+        Divide the values of a duplicated column evenly between its copies
+        (for coefficients, False).
+    fill : float
+        Value of the constant columns (0).
+
+    Returns
+    -------
+    numpy array
+        One row per column of the original data
+    """
+    rep = redundant["representative"]
+    values = np.asarray(values)
+    full = np.full((len(rep),) + values.shape[1:], fill, dtype = np.result_type(values, np.float64))
+    kept = rep >= 0
+    full[kept] = values[rep[kept]]
+    if split:
+        full[kept] /= redundant["copies"][rep[kept]].reshape((-1,) + (1,) * (values.ndim - 1))
+    return full
+
+def pvt_prefilter_options(prefilter):
+    """Private function turning the prefilter argument (bool or dict) into
+    options for find_redundant_features(), None if disabled
+    """
+    return dict() if prefilter is True else (prefilter or None)
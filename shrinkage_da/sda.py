@@ -7,10 +7,16 @@ Shrinkage discriminant analysis (training the classifier)
 from __future__ import print_function, division
 import numpy as np
 from sys import exit
-from centroids import centroids
-from corpcor.shrink_estimates import crossprod_powcor_shrink
+from .centroids import centroids
+from .corpcor.shrink_estimates import crossprod_powcor_shrink, crossprod_powcor_shrink_groups
+from .corpcor.shrink_misc import pvt_row_blocks, FrequencyWeights
+from .corpcor.shrink_intensity import estimate_lambda_subsample
+from .corpcor.pvt_instrument import staged
+from .fit_cache import cached_cppowscor
+from .prefilter import find_redundant_features, expand_features, pvt_prefilter_options
 
-def sda(Xtrain, L, lambda_cor = None, lambda_var = None, lambda_freqs = None, diagonal=False, verbose=False):
+@staged("sda")
+def sda(Xtrain, L, lambda_cor = None, lambda_var = None, lambda_freqs = None, diagonal=False, verbose=False, keep_stats=False, overwrite_x=False, lambda_approx=False, cache=None, w=None, feature_groups=None, n_jobs=None, prefilter=False):
     """Machine learning inference using shrinkage discriminant analysis
     
     Parameters
@@ -29,19 +35,76 @@ def sda(Xtrain, L, lambda_cor = None, lambda_var = None, lambda_freqs = None, di
         If True, skip correlation adjustment and assume diagonal model (False)
     verbose : bool
         Verbose mode (False).
+    keep_stats : bool
+        Also return the sufficient statistics (class sizes and means, pooled 
+        moments of the centred data and the low rank correlation factor) 
+        needed to extend the model with sda_add_class() (False).
+    overwrite_x : bool
+        Use Xtrain (a float array) as scratch space for the centred and 
+        standardised data instead of allocating a copy (False). The contents 
+        of Xtrain are destroyed.
+    lambda_approx : bool or dict
+        Estimate lambda_cor and lambda_var (unless given) from random 
+        subsamples of the centred data, falling back to the exact estimate if
+        their standard error is too large (see estimate_lambda_subsample()).
+        True uses the default options, a dict passes options (False).
+    cache : FitCache
+        Take the correlation factor of the data (corrected for the class 
+        centroids) and the estimated lambda_cor from this cache, or store 
+        them there (None).
+    w : vector array
+        Sample weights counting how often each row occurs (see centroids()).
+        Integer weights give the same model as repeating the rows (None).
+    feature_groups : vector array
+        Group label of each feature (column of Xtrain). If given, features 
+        are only correlated within their group: the correlation matrix is 
+        block diagonal, with the shrinkage intensity estimated per group 
+        (lambda_cor may also give one value per group), and the groups are
+        processed in parallel (None). The cache and lambda_approx are not 
+        used for the correlation, and the model cannot be extended with
+        sda_add_class().
+    n_jobs : int
+        Number of threads processing the feature groups. None uses all 
+        cores.
+    prefilter : bool or dict
+        Fit on the features that are neither constant nor a duplicate of 
+        another feature, and map the model back to all features (see 
+        prefilter.find_redundant_features()). True uses the default 
+        options, a dict passes options (e.g. var_tol) (False). The model
+        cannot be extended with sda_add_class() then.
     
     Returns
     -------
     dictionary
         Dictionary containing information about regularisation parameters, 
-        prior probabilities and linear model parameters (alpha, beta)
+        prior probabilities, linear model parameters (alpha, beta) and the
+        projection onto the discriminant directions (scalings, xbar). With
+        feature_groups also the group labels and the correlation shrinkage
+        intensity of each group (feature_groups)
         
     """
     nX, pX = Xtrain.shape
     if len(L) != nX:
         raise ValueError("Number of rows in input matrix Xtrain must match the number of class labels")
+    if prefilter:
+        redundant = find_redundant_features(Xtrain, **pvt_prefilter_options(prefilter))
+        keep = redundant["keep"]
+        if verbose:
+            print("Prefilter: dropping", redundant["n_constant"], "constant and", redundant["n_duplicate"], "duplicate features")
+        if len(keep) == 0:
+            raise ValueError("All features are constant")
+        if len(keep) < pX:
+            groups_kept = None if feature_groups is None else np.asarray(feature_groups)[keep]
+            result = sda(Xtrain[:, keep], L, lambda_cor, lambda_var, lambda_freqs, diagonal, verbose, keep_stats, 
+                         True, lambda_approx, cache, w, groups_kept, n_jobs) # Xtrain[:, keep] is a copy
+            return pvt_expand_model(result, redundant)
     regularisation = dict(lambda_cor = 1, lambda_var = np.nan, lambda_freqs = np.nan) # regularisation parameters for correlation, variance and priors
-    my_cent = centroids(Xtrain, L, lambda_var, lambda_freqs, var_groups = False, centered_data = True, verbose = verbose)
+    approx_options = dict() if lambda_approx is True else (lambda_approx or None)
+    w = None if w is None else FrequencyWeights(w)
+    cache_key = None if cache is None else cache.key(Xtrain, w) # before Xtrain may be overwritten
+    my_cent = centroids(Xtrain, L, lambda_var, lambda_freqs, var_groups = False, centered_data = True, verbose = verbose,
+                        out = Xtrain if overwrite_x else None, lambda_approx = approx_options, w = w)
+    approx = dict(lambda_var = my_cent["lambda_var_approx"], lambda_cor = None)
     cl_count = len(my_cent["groups"]) - 1 # number of classes 
     n = np.sum(my_cent["samples"]) # number of samples
     p = my_cent["means"].shape[0] # number of features
@@ -55,6 +118,16 @@ def sda(Xtrain, L, lambda_cor = None, lambda_var = None, lambda_freqs = None, di
     freqs = my_cent["freqs"]
     regularisation["lambda_freqs"] = my_cent["freqs_lambda"]
     xc = my_cent["centered_data"]
+    if keep_stats:
+        # pooled moments of the centred data, before xc is standardised in place
+        m2 = np.zeros(p)
+        m4 = np.zeros(p)
+        wv = np.ones(nX) if w is None else np.ravel(w).view(np.ndarray)
+        for b in pvt_row_blocks(nX, pX):
+            xc2 = np.power(xc[b,:], 2, dtype=np.float64)
+            m2 += np.matmul(wv[b], xc2)
+            m4 += np.matmul(wv[b], xc2*xc2)
+        del xc2 # a block of n x p, not needed while the correlation factor is computed
     
     ############################################################# 
     # compute coefficients for prediction 
@@ -67,25 +140,73 @@ def sda(Xtrain, L, lambda_cor = None, lambda_var = None, lambda_freqs = None, di
         pw[:,k] = diff/sc
     
     was_diagonal = diagonal
+    grouped = None
     if not diagonal:
         if verbose:
             print("Computing inverse correlation matrix (pooled across classes) product")
         try:
-            pwdict = crossprod_powcor_shrink(xc, pw, alpha=-1, lambda_cor=lambda_cor, 
-                                             verbose=False)
+            my_lambda_cor = lambda_cor
+            if lambda_cor is None and approx_options is not None and feature_groups is None:
+                approx["lambda_cor"] = estimate_lambda_subsample(xc, w=w, verbose=verbose, overwrite_x=True, **approx_options)
+                my_lambda_cor = approx["lambda_cor"]["lambda_cor"]
+            if feature_groups is not None:
+                pwdict = crossprod_powcor_shrink_groups(xc, pw, alpha=-1, groups=feature_groups, lambda_cor=lambda_cor,
+                                                        w=w, verbose=False, n_jobs=n_jobs)
+                grouped = dict(groups=pwdict["groups"], lambda_cor=pwdict["lambda_cor"])
+                pwdict = dict(pwdict, lambda_cor=np.nan, factor=None) # one intensity per group, in grouped
+            elif cache is None:
+                pwdict = crossprod_powcor_shrink(xc, pw, alpha=-1, lambda_cor=my_lambda_cor, w=w,
+                                                 verbose=False, return_factor=keep_stats, overwrite_x=True)
+            else:
+                pwdict = cached_cppowscor(cache, cache_key, xc, pw, -1, L, mu, my_cent["groups"][:cl_count],
+                                          lambda_cor=my_lambda_cor, w=w)
             pw = pwdict["cp_powr"]
-            regularisation["lambda_cor"] = pwdict["lambda_cor"] if lambda_cor is None else lambda_cor
+            regularisation["lambda_cor"] = pwdict["lambda_cor"] if np.ndim(lambda_cor) > 0 or lambda_cor is None else lambda_cor
             lambda_estimated = True if lambda_cor is None else False
             if verbose:
                 if lambda_estimated:  
                     print("Estimating optimal shrinkage intensity lambda (correlation matrix):", 
-                          regularisation["lambda_cor"])
+                          regularisation["lambda_cor"] if grouped is None else grouped["lambda_cor"])
                 else:
                     print("Specified shrinkage intensity lambda (correlation matrix):", 
-                          regularisation["lambda_cor"])
+                          lambda_cor)
         except np.linalg.LinAlgError:
             was_diagonal = True
     ###
+    alpha = pvt_coefficients(pw, sc, mu, mup, freqs)
+    ############################################################# 
+    result = dict(regularisation=regularisation, freqs=freqs, alpha=alpha, 
+                  beta=pw.T, groups = my_cent["groups"], was_diagonal = was_diagonal,
+                  scalings=pvt_discriminant_directions(mu, mup, pw.T, freqs), xbar=mup)
+    if approx_options is not None:
+        result["lambda_approx"] = approx
+    if grouped is not None:
+        result["feature_groups"] = grouped
+    if keep_stats:
+        # eigendecomposition of the scatter matrix of the centred data on 
+        # the scale S of its standardisation: xc'xc = S V diag(e) V' S 
+        # (xc' diag(w) xc with weights), V = basis rotation
+        factor = None
+        if not was_diagonal and pwdict["factor"] is not None:
+            f = pwdict["factor"]
+            basis, e = f["v"], np.power(f["d"], 2)
+            if w is not None:
+                e, Q = pvt_weighted_gram_eigen(f, n)
+                basis = np.matmul(basis, Q)
+            factor = dict(basis=basis, rotation=np.eye(len(e)), e=e, scale=np.sqrt(m2 / (n-1)))
+        result["stats"] = dict(samples=my_cent["samples"], means=mu, m2=m2, 
+                               m4=m4, factor=factor, lambda_var=lambda_var, 
+                               lambda_freqs=lambda_freqs)
+        if grouped is not None:
+            result["stats"]["feature_groups"] = feature_groups
+    return result
+
+def pvt_coefficients(pw, sc, mu, mup, freqs):
+    """Private function scaling the correlation adjusted prediction weights 
+    pw (p x K) in place by the standard deviations sc into beta' and 
+    returning the constant terms alpha
+    """
+    cl_count = pw.shape[1]
     for k in range(0,cl_count):
         pw[:,k] = pw[:,k]/sc
     alpha = np.zeros((len(freqs),1))
@@ -93,7 +214,55 @@ def sda(Xtrain, L, lambda_cor = None, lambda_var = None, lambda_freqs = None, di
     for k in range(0,cl_count):
         refk = (mu[:,k]+mup)/2
         alpha[k,0] = alpha[k,0]-np.matmul(pw[:,k].T, refk) 
-    ############################################################# 
+    return alpha
+
+def pvt_expand_model(result, redundant):
+    """Private function mapping a model fitted on the kept features back to
+    all features (see prefilter.expand_features())
+    """
+    result["beta"] = expand_features(result["beta"].T, redundant, split = True).T
+    result["scalings"] = expand_features(result["scalings"], redundant, split = True)
+    xbar = expand_features(result["xbar"], redundant)
+    constant = redundant["representative"] < 0
+    xbar[constant] = redundant["means"][constant]
+    result["xbar"] = xbar
+    result["prefilter"] = dict(keep = redundant["keep"], n_constant = redundant["n_constant"],
+                               n_duplicate = redundant["n_duplicate"])
+    if "stats" in result:
+        result["stats"]["prefilter"] = result["prefilter"]
+    return result
+
+def pvt_weighted_gram_eigen(f, n):
+    """Private function returning the eigendecomposition (e, Q) of 
+    D U'diag(c)U D, the scatter matrix of the standardised data in the basis
+    of its right singular vectors, from a factor of pvt_cppowscor_factor() 
+    with frequency weights c summing up to n
+    """
+    if "utwu" in f:
+        G = f["utwu"] * n
+    else:
+        G = np.matmul(f["u"].T, f["u"] * f["w"]) * n
+    G = G * f["d"][:, None] * f["d"]
+    e, Q = np.linalg.eigh((G + G.T)/2)
+    return np.maximum(e, 0), Q
+
+def pvt_discriminant_directions(mu, mup, beta, freqs):
+    """Private function computing the p x r matrix (r <= K-1) projecting data 
+    centred by the pooled centroid onto the discriminant directions
+    
+    In the space whitened by the shrunken covariance matrix S the centroid 
+    differences are S^(1/2) beta_k, whose Gram matrix G = beta (mu - mup) 
+    is only K x K. The directions are the eigenvectors of the between-class
+    scatter, ordered by the between-class variance, and in the projected 
+    coordinates Euclidean distances are (shrinkage) Mahalanobis distances.
+    """
+    G = np.matmul(beta, (mu.T - mup).T) # K x K: beta_k' S beta_l
+    sf = np.sqrt(freqs)
+    H = (G + G.T)/2 * sf[:, None] * sf
+    e, U = np.linalg.eigh(H)
+    order = np.argsort(e)[::-1]
+    e = e[order]
+    U = U[:, order]
+    positive = e > len(e) * max(np.max(e), 0) * np.finfo(float).eps
+    return np.matmul(beta.T, U[:, positive] * sf[:, None] / np.sqrt(e[positive]))
 
-    return dict(regularisation=regularisation, freqs=freqs, alpha=alpha, 
-                beta=pw.T, groups = my_cent["groups"], was_diagonal = was_diagonal)
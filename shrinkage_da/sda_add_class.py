@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Shrinkage discriminant analysis (extending a trained model with a new class)
+
+@author Miika Ahdesmaki
+"""
+from __future__ import print_function, division
+import numpy as np
+from .centroids import pvt_freqs_shrink
+from .corpcor.shrink_misc import minmax
+from .corpcor.shrink_intensity import pvt_lambda_var_moments
+from .corpcor.pvt_cppowscor import pvt_cppowscor_apply, pvt_eigen_update, pvt_rescale_factor
+from .sda import pvt_discriminant_directions
+
+def sda_add_class(sda_object, Xnew, label, verbose = False):
+    """Add a class to a model trained with sda(..., keep_stats=True) without
+    refitting on the original training data
+
+    The new class only adds rows to the class-centred data, so the class
+    sizes, centroids and pooled moments are updated from the new samples alone
+    and the low rank correlation factor is extended by the new centred rows.
+    Class frequencies, pooled centroid, variances, the variance and frequency
+    shrinkage intensities and all rows of alpha and beta are then recomputed
+    from these statistics. The correlation shrinkage intensity is kept at the
+    value of the original fit, since re-estimating it would need a pass over
+    the original data. 
+    
+    The stored factor is the eigendecomposition of the scatter matrix on 
+    the scale of the original fit. The m new rows are projected onto its 
+    basis (O(m*r*p) for rank r), only their residual is orthogonalised 
+    (O(m^2*p)) and a (r+m) x (r+m) eigenproblem gives the new factor. The 
+    correlation adjustment re-standardises a copy of it to the pooled 
+    variances of the extended data (a QR decomposition of p x r, O(r^2*p)).
+    A per-class lambda_var is not supported (sda() uses a single one).
+
+    Parameters
+    ----------
+    sda_object : dict
+        dictionary from sda(..., keep_stats=True)
+    Xnew : numpy array
+        Samples-in-rows matrix of the new class. Number of columns must match
+        the number of variables in sda_object.
+    label : object
+        Label of the new class.
+    verbose : bool
+        Verbose mode (False).
+
+    Returns
+    -------
+    dictionary
+        Updated model in the format returned by sda(..., keep_stats=True)
+    """
+    if sda_object.get("n_estimators", 1) > 1:
+        raise ValueError("Classes cannot be added to a bagged ensemble")
+    if "qda" in sda_object:
+        raise ValueError("Classes cannot be added to a model with class-specific covariances")
+    if "stats" not in sda_object:
+        raise ValueError("sda_object must be trained with keep_stats=True to add classes")
+    st = sda_object["stats"]
+    if st.get("feature_groups") is not None:
+        raise ValueError("Classes cannot be added to a model with feature_groups")
+    if st.get("prefilter") is not None:
+        raise ValueError("Classes cannot be added to a model fitted with prefilter")
+    groups = list(sda_object["groups"][:-1])
+    if label in groups:
+        raise ValueError("Class " + str(label) + " is already in the model")
+    m, p = Xnew.shape
+    if p != st["means"].shape[0]:
+        raise ValueError("Different number of predictors in sda object (" + str(st["means"].shape[0]) + ") and in Xnew (" + str(p) + ")")
+    mu_new = np.average(Xnew, axis=0)
+    xn = Xnew - mu_new
+    xn2 = xn*xn
+    samples = np.append(st["samples"], m)
+    mu = np.column_stack((st["means"], mu_new))
+    m2 = st["m2"] + np.sum(xn2, axis=0)
+    m4 = st["m4"] + np.sum(xn2*xn2, axis=0)
+    n = np.sum(samples)
+    cl_count = len(samples)
+    regularisation = dict(sda_object["regularisation"])
+    if verbose:
+        print("Adding class", label, "with", m, "samples")
+    freqs, regularisation["lambda_freqs"] = pvt_freqs_shrink(samples, lambda_freqs = st["lambda_freqs"], verbose = verbose)
+    mup = np.matmul(mu, freqs)
+    # pooled variances (as centroids(), equal weights)
+    lambda_var, v = pvt_lambda_var_moments(m2, m4, n)
+    if st["lambda_var"] is not None:
+        if np.size(st["lambda_var"]) != 1:
+            raise ValueError("Classes cannot be added to a model fitted with one lambda_var per class")
+        lambda_var = minmax(float(np.ravel(st["lambda_var"])[0]))
+    v[v < np.finfo(float).eps] = 0
+    regularisation["lambda_var"] = lambda_var
+    sc = np.sqrt((lambda_var * np.median(v) + (1-lambda_var) * v) * (n-1)/(n-cl_count))
+    pw = ((mu.T - mup) / sc).T
+    factor = st["factor"]
+    if factor is not None:
+        # extend the factor by the new centred rows on its scale; features 
+        # that were constant have zero rows in it and take the new scale
+        sd = np.sqrt(v)
+        scale = np.where(factor["scale"] > 0, factor["scale"], sd)
+        inv = np.zeros(p)
+        inv[scale > 0] = 1 / scale[scale > 0]
+        basis, rotation, e = pvt_eigen_update((factor["basis"], factor["rotation"], factor["e"]),
+                                              (xn * inv).T, np.ones(m), max(n, p) * np.finfo(float).eps)
+        factor = dict(basis=basis, rotation=rotation, e=e, scale=scale)
+        # re-standardised to the pooled variances, with w=1/n: U'WU = I/n and sum(w^2) = 1/n
+        ratio = np.zeros(p)
+        ratio[sd > 0] = scale[sd > 0] / sd[sd > 0]
+        vs, _, es = pvt_rescale_factor((basis, rotation, e), ratio)
+        d = np.sqrt(es)
+        cpfactor = dict(d = d, v = vs, utwu = np.eye(len(d))/n, w2 = 1/n, zeros = sd == 0)
+        pw = pvt_cppowscor_apply(cpfactor, pw, -1, regularisation["lambda_cor"])
+    pw = (pw.T / sc).T
+    alpha = np.zeros((cl_count, 1))
+    alpha[:, 0] = np.log(freqs) - np.sum(pw * ((mu.T + mup)/2).T, axis=0)
+    groups.append(label)
+    groups.append("(pooled)")
+    stats = dict(st, samples=samples, means=mu, m2=m2, m4=m4, factor=factor)
+    return dict(regularisation=regularisation, freqs=freqs, alpha=alpha, beta=pw.T,
+                groups=groups, was_diagonal=sda_object["was_diagonal"], stats=stats,
+                scalings=pvt_discriminant_directions(mu, mup, pw.T, freqs), xbar=mup)
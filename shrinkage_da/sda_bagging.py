@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Bagged shrinkage discriminant analysis (parallel, shared memory)
+
+Each member of the ensemble is fitted on a stratified bootstrap sample of
+the training data. A bag is not a copy of the drawn rows but a vector of
+frequency weights (how often each row was drawn), passed to the weighted
+estimators of sda(), which give the same model as the repeated rows. The
+members are fitted by a pool of worker processes that all read Xtrain from
+one shared memory block (as in stability_rank), so the data is neither
+pickled nor copied per worker or per bag.
+
+The members' alpha and beta are stacked into one (B*K) x p model, so that
+the ensemble scores all B members with a single matrix product; the
+posterior probabilities of the members are then averaged (see
+predict_sda.pvt_posterior()).
+
+@author Miika Ahdesmaki
+"""
+from __future__ import print_function, division
+import numpy as np
+from multiprocessing import Pool, cpu_count, shared_memory
+from .sda import sda
+
+# per-process state set up by pvt_bagging_init(); the data matrix is a view
+# into shared memory so that no worker holds its own copy of Xtrain
+_shared = dict()
+
+def sda_bagging(Xtrain, L, n_estimators = 10, sample_fraction = 1.0, replace = True, lambda_cor = None,
+                lambda_var = None, lambda_freqs = None, diagonal = False, w = None, n_jobs = None,
+                random_state = None, verbose = False):
+    """Fit an ensemble of SDA models on stratified bootstrap samples
+
+    Parameters
+    ----------
+    Xtrain : numpy array
+        Samples-in-rows matrix.
+    L : list
+        Class labels in a list. Must match number of rows in Xtrain.
+    n_estimators : int
+        Number of members (bags) of the ensemble (10).
+    sample_fraction : float
+        Number of samples drawn per bag as a fraction of the size of each
+        class (1.0, at least 2 per class).
+    replace : bool
+        Draw with replacement (bootstrap, True) or subsample without.
+    lambda_cor, lambda_var, lambda_freqs : float
+        Shrinkage parameters of the members (see sda()), estimated per bag
+        if None.
+    diagonal : bool
+        If True, skip correlation adjustment and assume diagonal models
+        (False).
+    w : vector array
+        Sample weights counting how often each row occurs (see sda());
+        multiplied by the bag weights (None).
+    n_jobs : int
+        Number of worker processes. None uses all cores, 1 runs in-process.
+    random_state : int
+        Seed for drawing the bags.
+    verbose : bool
+        Verbose mode (False).
+
+    Returns
+    -------
+    dictionary
+        Model in the format of sda() with the members' alpha and beta
+        stacked (B*K rows, member by member, classes in the order of
+        "groups"), n_estimators, the class frequencies averaged over the
+        members and the regularisation parameters averaged over the
+        members, those of each member being in "members". Use with
+        predict_sda().
+    """
+    Xtrain = np.ascontiguousarray(Xtrain)
+    n, p = Xtrain.shape
+    if len(L) != n:
+        raise ValueError("Number of rows in input matrix Xtrain must match the number of class labels")
+    n_estimators = int(n_estimators)
+    if n_estimators < 1:
+        raise ValueError("n_estimators must be positive")
+    labels, codes = np.unique(np.array(L), return_inverse=True)
+    cl_count = len(labels)
+    settings = dict(sample_fraction=sample_fraction, replace=replace, lambda_cor=lambda_cor,
+                    lambda_var=lambda_var, lambda_freqs=lambda_freqs, diagonal=diagonal,
+                    w=None if w is None else np.ravel(np.asarray(w, dtype=np.float64)))
+    seeds = np.random.RandomState(random_state).randint(np.iinfo(np.int32).max, size=n_estimators)
+    alpha = np.zeros((n_estimators * cl_count, 1))
+    beta = np.zeros((n_estimators * cl_count, p))
+    freqs = np.zeros(cl_count)
+    members = []
+    def collect(b, member):
+        alpha[b*cl_count:(b+1)*cl_count, :] = member["alpha"]
+        beta[b*cl_count:(b+1)*cl_count, :] = member["beta"]
+        freqs[:] += member["freqs"] / n_estimators
+        members.append(dict(regularisation=member["regularisation"], was_diagonal=member["was_diagonal"]))
+        if verbose and (b + 1) % 10 == 0:
+            print("Completed bags:", b + 1)
+    if n_jobs == 1:
+        _shared.update(x=Xtrain, codes=codes, settings=settings)
+        try:
+            for b, seed in enumerate(seeds):
+                collect(b, pvt_bagging_member(seed))
+        finally:
+            _shared.clear()
+    else:
+        shm = shared_memory.SharedMemory(create=True, size=max(Xtrain.nbytes, 1))
+        try:
+            x_shared = np.ndarray(Xtrain.shape, dtype=Xtrain.dtype, buffer=shm.buf)
+            x_shared[:] = Xtrain
+            del x_shared
+            n_workers = cpu_count() if n_jobs is None else n_jobs
+            pool = Pool(processes=min(n_workers, n_estimators), initializer=pvt_bagging_init,
+                        initargs=(shm.name, Xtrain.shape, Xtrain.dtype.str, codes, settings))
+            try:
+                # in the order of the seeds, so that the result does not depend on n_jobs
+                for b, member in enumerate(pool.imap(pvt_bagging_member, seeds)):
+                    collect(b, member)
+            finally:
+                pool.terminate()
+                pool.join()
+        finally:
+            shm.close()
+            shm.unlink()
+    regularisation = dict((key, float(np.mean([m["regularisation"][key] for m in members])))
+                          for key in ("lambda_cor", "lambda_var", "lambda_freqs"))
+    return dict(regularisation=regularisation, freqs=freqs, alpha=alpha, beta=beta,
+                groups=list(labels) + ["(pooled)"], was_diagonal=all(m["was_diagonal"] for m in members),
+                n_estimators=n_estimators, members=members)
+
+def pvt_bagging_init(shm_name, shape, dtype, codes, settings):
+    """Attach a worker process to the shared data matrix
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _shared.update(shm=shm, x=np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf),
+                   codes=codes, settings=settings)
+
+def pvt_bagging_member(seed):
+    """Fit one member on a stratified bag, drawn as frequency weights, and
+    return its alpha and beta with the classes in the order of the codes
+    """
+    x = _shared["x"]
+    codes = _shared["codes"]
+    s = _shared["settings"]
+    rng = np.random.RandomState(seed)
+    rows = []
+    for k in range(0, codes.max() + 1):
+        members = np.flatnonzero(codes == k)
+        m = max(2, int(round(s["sample_fraction"] * len(members))))
+        if not s["replace"]:
+            m = min(m, len(members))
+        rows.append(rng.choice(members, size=m, replace=s["replace"]))
+    weights = np.bincount(np.concatenate(rows), minlength=len(codes)).astype(np.float64)
+    if s["w"] is not None:
+        weights *= s["w"]
+    model = sda(x, codes, lambda_cor=s["lambda_cor"], lambda_var=s["lambda_var"],
+                lambda_freqs=s["lambda_freqs"], diagonal=s["diagonal"], w=weights)
+    order = [model["groups"].index(k) for k in range(0, codes.max() + 1)]
+    return dict(alpha=model["alpha"][order, :], beta=model["beta"][order, :], freqs=model["freqs"][order],
+                regularisation=model["regularisation"], was_diagonal=model["was_diagonal"])
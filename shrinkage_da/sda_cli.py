@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Command line interface: shrinkage-da fit | rank | predict | convert
+
+    shrinkage-da fit data/khan_x.csv data/khan_y.csv -o model --top 100
+    shrinkage-da rank data/khan_x.csv data/khan_y.csv -o ranking.csv
+    shrinkage-da predict model data/khan_x.csv -o predictions.csv --proba
+    shrinkage-da convert data/khan_x.csv
+
+Data matrices are CSV files (samples in rows; a header row and a first
+column of row names are detected) or .npy files. CSV files are parsed once
+into a cached .npy file (see data_cache), so later runs on the same file
+memory map it instead of parsing it again. Labels are CSV files with one
+label per row (the last column). Predictions are computed and written in
+blocks of rows, so the output never has to fit into memory.
+
+@author Miika Ahdesmaki
+"""
+from __future__ import print_function, division
+import argparse
+import csv
+import sys
+import numpy as np
+from .data_cache import load_matrix, load_labels
+from .corpcor.shrink_misc import pvt_row_blocks
+
+def pvt_load(args, path):
+    return load_matrix(path, cache_dir = args.cache_dir, header = args.header,
+                       index_col = args.index_col, delimiter = args.delimiter)
+
+def pvt_open_output(path):
+    if path == "-":
+        return sys.stdout
+    return open(path, "w", newline = "")
+
+def pvt_ranking(args, X, y):
+    from .sda_ranking import sda_ranking # imported here, predict needs NumPy only
+    return sda_ranking(X, y, lambda_cor = args.lambda_cor, lambda_var = args.lambda_var,
+                       lambda_freqs = args.lambda_freqs, ranking_score = args.ranking_score,
+                       diagonal = args.diagonal)
+
+def cmd_fit(args):
+    from .sda import sda
+    from .sda_io import save_sda
+    X, names = pvt_load(args, args.X)
+    y = load_labels(args.y, delimiter = args.delimiter)
+    idx = None
+    if args.top is not None:
+        idx = np.sort(pvt_ranking(args, X, y)["idx"][:args.top])
+        X = X[:, idx]
+    model = sda(X, y, lambda_cor = args.lambda_cor, lambda_var = args.lambda_var,
+                lambda_freqs = args.lambda_freqs, diagonal = args.diagonal,
+                overwrite_x = idx is not None) # X[:, idx] is a copy
+    save_sda(model, args.output, idx = idx, beta_dtype = args.beta_dtype)
+    print("fitted %d classes on %d samples and %d features, saved to %s"
+          % (len(model["freqs"]), X.shape[0], X.shape[1], args.output), file = sys.stderr)
+    return 0
+
+def cmd_rank(args):
+    X, names = pvt_load(args, args.X)
+    y = load_labels(args.y, delimiter = args.delimiter)
+    ranking = pvt_ranking(args, X, y)
+    top = len(ranking["idx"]) if args.top is None else args.top
+    columns = names["columns"]
+    out = pvt_open_output(args.output)
+    try:
+        writer = csv.writer(out)
+        writer.writerow(["rank", "column", "name", "score"])
+        for r, (j, score) in enumerate(zip(ranking["idx"][:top], ranking["score"][:top])):
+            writer.writerow([r + 1, j, columns[j] if columns else j, repr(float(score))])
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+def cmd_predict(args):
+    from .sda_predictor import SdaPredictor
+    model = SdaPredictor.load(args.model)
+    X, names = pvt_load(args, args.X)
+    rows = names["rows"]
+    classes = [str(c) for c in model.classes_]
+    out = pvt_open_output(args.output)
+    try:
+        writer = csv.writer(out)
+        writer.writerow(["row", "predicted_class"] + (classes if args.proba else []))
+        for b in pvt_row_blocks(X.shape[0], X.shape[1], args.block_bytes):
+            probs = model.predict_proba(np.asarray(X[b, :]))
+            predicted = [classes[k] for k in np.argmax(probs, axis = 1)]
+            labels = rows[b] if rows else range(b.start, b.stop)
+            if args.proba:
+                writer.writerows([r, c] + p for r, c, p in zip(labels, predicted, probs.tolist()))
+            else:
+                writer.writerows(zip(labels, predicted))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+def cmd_convert(args):
+    for path in args.X:
+        X, names = pvt_load(args, path)
+        print("%s: %d x %d %s" % (path, X.shape[0], X.shape[1], getattr(X, "filename", "")))
+    return 0
+
+def pvt_parser():
+    parser = argparse.ArgumentParser(prog = "shrinkage-da",
+                                     description = "Shrinkage discriminant analysis: fit, rank and predict")
+    data = argparse.ArgumentParser(add_help = False)
+    data.add_argument("--cache-dir", default = None,
+                      help = "directory of the .npy files caching parsed CSV files (default: the user cache directory)")
+    data.add_argument("--header", default = None, action = argparse.BooleanOptionalAction,
+                      help = "the first row holds column names (default: detected)")
+    data.add_argument("--index-col", default = None, action = argparse.BooleanOptionalAction,
+                      help = "the first column holds row names (default: detected)")
+    data.add_argument("--delimiter", default = ",", help = "field delimiter (default: ,)")
+    model = argparse.ArgumentParser(add_help = False)
+    model.add_argument("--lambda-cor", type = float, default = None, help = "correlation shrinkage intensity (default: estimated)")
+    model.add_argument("--lambda-var", type = float, default = None, help = "variance shrinkage intensity (default: estimated)")
+    model.add_argument("--lambda-freqs", type = float, default = None, help = "frequency shrinkage intensity (default: estimated)")
+    model.add_argument("--diagonal", action = "store_true", help = "diagonal model, no correlation adjustment")
+    model.add_argument("--ranking-score", default = "entropy", choices = ["entropy", "avg", "max"])
+    model.add_argument("--top", type = int, default = None, help = "number of top ranked features to use or report")
+    commands = parser.add_subparsers(dest = "command")
+    commands.required = True
+    fit = commands.add_parser("fit", parents = [data, model], help = "fit a model and save it")
+    fit.add_argument("X", help = "training data (.csv or .npy), samples in rows")
+    fit.add_argument("y", help = "class labels (.csv), one per sample")
+    fit.add_argument("-o", "--output", required = True, help = "model directory")
+    fit.add_argument("--beta-dtype", default = None, choices = ["float16", "int8"], help = "store beta in low precision")
+    fit.set_defaults(func = cmd_fit)
+    rank = commands.add_parser("rank", parents = [data, model], help = "rank features by CAT scores")
+    rank.add_argument("X", help = "training data (.csv or .npy), samples in rows")
+    rank.add_argument("y", help = "class labels (.csv), one per sample")
+    rank.add_argument("-o", "--output", default = "-", help = "ranking CSV file (default: standard output)")
+    rank.set_defaults(func = cmd_rank)
+    predict = commands.add_parser("predict", parents = [data], help = "predict with a saved model")
+    predict.add_argument("model", help = "model directory (from fit)")
+    predict.add_argument("X", help = "data (.csv or .npy), samples in rows")
+    predict.add_argument("-o", "--output", default = "-", help = "predictions CSV file (default: standard output)")
+    predict.add_argument("--proba", action = "store_true", help = "also write the posterior probabilities")
+    predict.add_argument("--block-bytes", type = int, default = 2**23, help = "bytes of data predicted at a time")
+    predict.set_defaults(func = cmd_predict)
+    convert = commands.add_parser("convert", parents = [data], help = "parse CSV files into the .npy cache")
+    convert.add_argument("X", nargs = "+", help = "CSV files")
+    convert.set_defaults(func = cmd_convert)
+    return parser
+
+def main(argv = None):
+    """Entry point of the shrinkage-da command
+    """
+    args = pvt_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except (IOError, OSError, ValueError) as e:
+        print("shrinkage-da: error: " + str(e), file = sys.stderr)
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
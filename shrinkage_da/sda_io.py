@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Compact, memory-mappable storage of trained SDA models
+
+A model is stored as a directory of .npy files (alpha, beta, freqs, class
+labels, optionally the indices of the selected input columns, the names of
+the input columns, the projection onto the discriminant directions and the
+feature groups with their correlation shrinkage intensities) plus a small 
+JSON file with the regularisation parameters (undefined ones, such as 
+lambda_cor of a model with feature groups, as null). No training data is stored and
+no pickling is involved, so loading is independent of the training set size,
+and with mmap_mode='r' all processes loading the same model share one
+physical copy of beta through the page cache.
+
+Only NumPy and the standard library are imported here.
+
+@author Miika Ahdesmaki
+"""
+from __future__ import print_function, division
+import json
+import os
+import numpy as np
+from .sda_quantize import quantize_sda
+
+FORMAT_VERSION = 2 # version 2 adds stacked ensembles; other models are still written as version 1
+
+def save_sda(sda_object, path, idx = None, beta_dtype = None):
+    """Save the prediction parameters of a trained model
+
+    Parameters
+    ----------
+    sda_object : dict
+        dictionary from sda() containing model parameters
+    path : string
+        Directory to write to (created if it does not exist).
+    idx : array
+        Indices of the input columns the model uses, if it was trained on a
+        subset of the columns (e.g. top ranked features). Taken from
+        sda_object["idx"] if not given.
+    beta_dtype : string
+        Store beta in low precision, 'float16' or 'int8' with per-class 
+        scales (see sda_quantize.quantize_sda()). None keeps the precision of
+        sda_object (which may itself be quantized).
+    """
+    if "qda" in sda_object:
+        raise ValueError("Models with class-specific covariances (sda_qda) cannot be saved")
+    if beta_dtype is not None:
+        sda_object = quantize_sda(sda_object, beta_dtype)
+    if idx is None:
+        idx = sda_object.get("idx")
+    labels = np.asarray(sda_object["groups"][:-1]) # without "(pooled)"
+    if labels.dtype == object:
+        raise ValueError("Class labels must all be numbers or all be strings to be saved")
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    np.save(os.path.join(path, "alpha.npy"), np.ascontiguousarray(sda_object["alpha"]))
+    np.save(os.path.join(path, "beta.npy"), np.ascontiguousarray(sda_object["beta"]))
+    np.save(os.path.join(path, "freqs.npy"), np.ascontiguousarray(sda_object["freqs"]))
+    np.save(os.path.join(path, "groups.npy"), labels)
+    if idx is not None:
+        np.save(os.path.join(path, "idx.npy"), np.ascontiguousarray(idx, dtype=np.intp))
+    elif os.path.exists(os.path.join(path, "idx.npy")):
+        os.remove(os.path.join(path, "idx.npy"))
+    for name in ("scalings", "xbar", "beta_scale", "feature_names"): # optional: projection for transform_sda(), int8 scales, column names
+        if sda_object.get(name) is not None:
+            np.save(os.path.join(path, name + ".npy"), np.ascontiguousarray(sda_object[name]))
+        elif os.path.exists(os.path.join(path, name + ".npy")):
+            os.remove(os.path.join(path, name + ".npy"))
+    grouped = sda_object.get("feature_groups")
+    if grouped is not None: # group labels and the lambda_cor of each group
+        np.save(os.path.join(path, "feature_groups.npy"), pvt_group_labels(grouped["groups"]))
+        np.save(os.path.join(path, "feature_groups_lambda_cor.npy"), np.asarray(grouped["lambda_cor"], dtype=np.float64))
+    else:
+        for name in ("feature_groups", "feature_groups_lambda_cor"):
+            if os.path.exists(os.path.join(path, name + ".npy")):
+                os.remove(os.path.join(path, name + ".npy"))
+    # NaN (not defined, e.g. lambda_cor with feature groups) is not valid JSON: stored as null
+    regularisation = dict((k, None if np.isnan(v) else float(v)) for k, v in sda_object["regularisation"].items())
+    meta = dict(format_version = 1, regularisation = regularisation,
+                was_diagonal = bool(sda_object["was_diagonal"]))
+    if sda_object.get("n_estimators", 1) > 1: # stacked ensemble (sda_bagging), unreadable by version 1 loaders
+        meta.update(format_version = FORMAT_VERSION, n_estimators = int(sda_object["n_estimators"]))
+    with open(os.path.join(path, "model.json"), "w") as f:
+        json.dump(meta, f, indent = 1, allow_nan = False)
+
+def pvt_group_labels(groups):
+    """Feature group labels as an array that can be saved without pickling
+    """
+    labels = np.asarray(groups)
+    if labels.dtype == object:
+        raise ValueError("Feature group labels must all be numbers or all be strings to be saved")
+    return labels
+
+def load_sda(path, mmap_mode = "r"):
+    """Load a model saved with save_sda()
+
+    Parameters
+    ----------
+    path : string
+        Directory the model was saved to.
+    mmap_mode : string
+        Passed to numpy.load for beta ('r' by default: read-only memory map
+        shared between processes). None reads beta into memory.
+
+    Returns
+    -------
+    dict
+        Model parameters in the format returned by sda(), usable with
+        predict_sda()
+    """
+    with open(os.path.join(path, "model.json")) as f:
+        meta = json.load(f)
+    if meta["format_version"] > FORMAT_VERSION:
+        raise ValueError("Model format version " + str(meta["format_version"]) + " is not supported")
+    groups = list(np.load(os.path.join(path, "groups.npy")))
+    groups.append("(pooled)")
+    regularisation = dict((k, np.nan if v is None else v) for k, v in meta["regularisation"].items())
+    sda_object = dict(regularisation = regularisation, was_diagonal = meta["was_diagonal"],
+                      alpha = np.load(os.path.join(path, "alpha.npy")),
+                      beta = np.load(os.path.join(path, "beta.npy"), mmap_mode = mmap_mode),
+                      freqs = np.load(os.path.join(path, "freqs.npy")), groups = groups)
+    if "n_estimators" in meta:
+        sda_object["n_estimators"] = meta["n_estimators"]
+    for name in ("idx", "scalings", "xbar", "beta_scale", "feature_names"):
+        if os.path.exists(os.path.join(path, name + ".npy")):
+            sda_object[name] = np.load(os.path.join(path, name + ".npy"))
+    if os.path.exists(os.path.join(path, "feature_groups.npy")):
+        sda_object["feature_groups"] = dict(groups = np.load(os.path.join(path, "feature_groups.npy")),
+                                            lambda_cor = np.load(os.path.join(path, "feature_groups_lambda_cor.npy")))
+    return sda_object
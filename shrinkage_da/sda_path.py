@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Shrinkage discriminant analysis on nested sets of top ranked features
+
+Fitting SDA on the top k CAT score ranked features for several k would
+repeat most of the work per k: the centroids and variances of the top k
+features are column subsets of those of the top k_max features, and the
+correlation factor of the standardised data only grows by the added columns.
+sda_path() therefore centres and standardises the top k_max columns once and
+grows the cross-product of the standardised data column block by column 
+block: the k x k matrix M = xs' W xs by bordering if there are more samples
+than features (n > k_max), and the n x n Gram matrix G = xs xs' otherwise.
+For each k the shrinkage intensities are computed from running column and
+row sums, and the low rank factor from the eigendecomposition of M (whose
+eigenvectors are the right singular vectors) or of G (see 
+pvt_cppowscor_apply(), which then applies the right singular vectors
+implicitly). The cost is O(n min(n, k_max) k_max) plus O(min(n, k)^3) per k,
+in O(min(n, k_max)^2) memory, instead of O(n k min(n, k)) per k. Each model
+equals the one from sda() on the same columns (up to rounding).
+
+@author Miika Ahdesmaki
+"""
+from __future__ import print_function, division
+import numpy as np
+from .centroids import centroids
+from .sda import pvt_coefficients, pvt_discriminant_directions
+from .sda_ranking import sda_ranking
+from .predict_sda import predict_sda
+from .corpcor.shrink_misc import minmax, pvt_check_w, pvt_row_blocks, FrequencyWeights
+from .corpcor.shrink_intensity import pvt_lambda_var_columns, pvt_lambda_var_sums
+from .corpcor.wt_scale import wt_moments, wt_scale
+from .corpcor.pvt_cppowscor import pvt_cppowscor_apply
+from .corpcor.fast_svd import pvt_positive
+from .corpcor.pvt_instrument import staged, stage
+
+@staged("sda_path")
+def sda_path(Xtrain, L, ks, ranking = None, lambda_cor = None, lambda_var = None, lambda_freqs = None,
+             ranking_score = "entropy", diagonal = False, verbose = False, w = None, Xtest = None, Ltest = None):
+    """SDA models on the top k ranked features for each k in ks
+
+    Parameters
+    ----------
+    Xtrain : numpy array
+        Samples-in-rows matrix.
+    L : list
+        Class labels in a list. Must match number of rows in Xtrain.
+    ks : list
+        Numbers of top ranked features to fit models on (capped at the
+        number of columns of Xtrain).
+    ranking : vector array
+        Column indices of Xtrain in decreasing order of importance (e.g.
+        "idx" from sda_ranking()). Computed with sda_ranking() if None.
+    lambda_cor : float
+        Correlation shrinkage parameter (estimated for each k if None).
+    lambda_var : float
+        Variance shrinkage parameter (estimated for each k if None).
+    lambda_freqs : float
+        Shrinkage parameter for class prevalences.
+    ranking_score : string
+        Score used for the ranking if it is computed (see sda_ranking()).
+    diagonal : bool
+        Diagonal models, no correlation adjustment (False).
+    verbose : bool
+        Verbose mode (False).
+    w : vector array
+        Sample weights counting how often each row occurs (see sda()).
+    Xtest : numpy array
+        Validation samples with the columns of Xtrain (None).
+    Ltest : list
+        Class labels of Xtest (None).
+
+    Returns
+    -------
+    dictionary
+        The feature counts (ks, sorted), the ranking (idx), one model per k
+        in the format of sda() whose "idx" holds the (sorted) columns of 
+        Xtrain it uses, so that predict_sda() takes the full data (models),
+        and with Xtest the misclassification rate on it for each k (error)
+    """
+    nX, pX = Xtrain.shape
+    if len(L) != nX:
+        raise ValueError("Number of rows in input matrix Xtrain must match the number of class labels")
+    ks = sorted(set(min(int(k), pX) for k in ks))
+    if len(ks) == 0 or ks[0] < 1:
+        raise ValueError("ks must hold positive numbers of features")
+    if ranking is None:
+        ranking = sda_ranking(Xtrain, L, lambda_cor, lambda_var, lambda_freqs, ranking_score,
+                              diagonal, verbose, w = w)["idx"]
+    order = np.asarray(ranking)[:ks[-1]]
+    w = None if w is None else FrequencyWeights(w)
+    xc = np.array(Xtrain[:, order], dtype = np.float64) # copy of the top columns, centred in place
+    my_cent = centroids(xc, L, 1 if lambda_var is None else lambda_var, lambda_freqs, centered_data = True,
+                        verbose = verbose, out = xc, w = w)
+    cl_count = len(my_cent["groups"]) - 1
+    n = np.sum(my_cent["samples"])
+    freqs = my_cent["freqs"]
+    mu = my_cent["means"][:, :cl_count]
+    mup = my_cent["means"][:, cl_count]
+    # per column statistics of the centred data, from which the pooled
+    # variances of any top k follow
+    v_emp = wt_moments(xc, w)["var"]
+    q1, qq, w2 = pvt_lambda_var_columns(xc, w)
+    wv = np.ravel(pvt_check_w(w, nX))
+    if not diagonal:
+        xs, _ = wt_scale(xc, w, center = True, scale = True, copy = False) # standardise in place
+        zeros = np.ravel(v_emp) == 0
+        by_features = nX > ks[-1]
+        G = np.zeros((ks[-1], ks[-1]) if by_features else (nX, nX))
+        colsq = np.zeros(len(order))
+        rowsq = np.zeros(nX)
+        row4 = np.zeros(nX)
+    models = []
+    done = 0
+    for k in ks:
+        # variances of the top k
+        if lambda_var is None:
+            numerator, denominator = pvt_lambda_var_sums(q1[:k], qq[:k], w2)
+            lam_var = 1 if denominator == 0 else minmax(numerator/denominator)
+        else:
+            lam_var = minmax(np.ravel(lambda_var)[0])
+        v = v_emp[:k]
+        v = (lam_var * np.median(v) + (1 - lam_var) * v) * (n - 1)/(n - cl_count)
+        sc = np.sqrt(v)
+        pw = (mu[:k, :] - mup[:k, None]) / sc[:, None]
+        regularisation = dict(lambda_cor = 1, lambda_var = float(lam_var), lambda_freqs = my_cent["freqs_lambda"])
+        if not diagonal:
+            with stage("pvt_gram_update", shape = (nX, k - done)):
+                for b in pvt_row_blocks(k - done, nX): # blocks of new columns
+                    xb = xs[:, done + b.start:done + b.stop]
+                    if by_features: # border M by the new columns
+                        new = slice(done + b.start, done + b.stop)
+                        G[:new.stop, new] = np.matmul(xs[:, :new.stop].T, xb * wv[:, None])
+                        G[new, :new.start] = G[:new.start, new].T
+                    else:
+                        G += np.matmul(xb, xb.T)
+                    xb2 = xb * xb
+                    colsq[done + b.start:done + b.stop] = np.matmul(wv, xb2)
+                    rowsq += np.sum(xb2, axis = 1)
+                    row4 += np.sum(xb2 * xb2, axis = 1)
+            done = k
+            lam_cor = lambda_cor
+            if lam_cor is None and k > 1:
+                if by_features:
+                    sE2R = np.sum(np.power(G[:k, :k], 2)) - np.sum(np.power(colsq[:k], 2))
+                else:
+                    sw = np.sqrt(wv)
+                    sE2R = np.sum(np.power(G * sw[:, None] * sw, 2)) - np.sum(np.power(colsq[:k], 2))
+                lam_cor = pvt_path_lambda_cor(sE2R, rowsq, row4, wv, w2)
+            elif lam_cor is None:
+                lam_cor = 1
+            lam_cor = minmax(lam_cor)
+            regularisation["lambda_cor"] = lam_cor
+            if lam_cor < 1:
+                if by_features:
+                    factor = pvt_gram_factor(G[:k, :k], nX)
+                    factor = dict(d = factor["d"], v = factor["u"], utwu = np.eye(len(factor["d"])))
+                else:
+                    factor = pvt_gram_factor(G, k)
+                    factor.update(xs = xs[:, :k], w = wv[:, None])
+                factor.update(w2 = w2, zeros = zeros[:k])
+                pw = pvt_cppowscor_apply(factor, pw, -1, lam_cor)
+        alpha = pvt_coefficients(pw, sc, mu[:k, :], mup[:k], freqs)
+        scalings = pvt_discriminant_directions(mu[:k, :], mup[:k], pw.T, freqs)
+        cols = np.argsort(order[:k]) # columns in the order of Xtrain, as predict_sda() selects them
+        models.append(dict(regularisation = regularisation, freqs = freqs, alpha = alpha, beta = pw.T[:, cols],
+                           groups = my_cent["groups"], was_diagonal = diagonal, idx = order[:k][cols],
+                           scalings = scalings[cols, :], xbar = mup[:k][cols]))
+        if verbose:
+            print("k =", k, "lambda_cor:", regularisation["lambda_cor"], "lambda_var:", lam_var)
+    result = dict(ks = ks, idx = np.asarray(ranking), models = models)
+    if Xtest is not None:
+        Ltest = np.asarray(Ltest)
+        result["error"] = np.array([np.mean(predict_sda(m, Xtest)["predicted_class"] != Ltest) for m in models])
+    return result
+
+def pvt_path_lambda_cor(sE2R, rowsq, row4, wv, w2):
+    """Private function computing the correlation shrinkage intensity (as
+    estimate_lambda()) of the standardised columns from the sum of their 
+    squared weighted cross-products (sE2R, off the diagonal) and the row 
+    sums of their squares (rowsq) and fourth powers (row4)
+    """
+    sER2 = np.sum(wv * (np.power(rowsq, 2) - row4))
+    if sE2R == 0:
+        return 1
+    return (sER2 - sE2R) * w2/(1 - w2) / sE2R
+
+def pvt_gram_factor(G, p):
+    """Private function computing the singular values d and left singular
+    vectors u of the standardised data (n x p) from its Gram matrix G, with
+    the rank tolerance of fast_svd() (for M = xs' W xs, the square roots of
+    its eigenvalues and its eigenvectors, the right singular vectors)
+    """
+    with stage("eigh", shape = G.shape):
+        e, u = np.linalg.eigh(G)
+    d = np.sqrt(np.maximum(e, 0))
+    positive = pvt_positive(d, (G.shape[0], p), None, np.finfo(float).eps)
+    return dict(d = d[positive][::-1], u = u[:, positive][:, ::-1])
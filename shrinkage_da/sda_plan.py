@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Predicted peak memory and run time of fitting an SDA model
+
+The fit of sda() is a sequence of stages (centroids and pooled variances,
+correlation shrinkage intensity, low rank correlation factor, matrix power)
+whose temporaries and flop counts follow from n, p and the number of
+classes. plan_fit() turns them into an estimate of the peak memory (bytes
+allocated on top of the training data) and of the run time per stage for
+each way of fitting:
+
+    full      the default
+    approx    the shrinkage intensities estimated from subsamples 
+              (lambda_approx=True)
+    diagonal  without correlation adjustment (diagonal=True)
+
+each either on a copy of the data or in place (in_place=True, i.e. 
+store_training_data=False and copy_X=False: X is centred and standardised
+in place, the same model without an n x p copy).
+
+Run times are scaled by rates measured once per process on small problems
+(matrix product, memory streaming, SVD and matrix power); when the SVD
+route is autotuned (corpcor.svd_autotune) its cost model is used for the
+SVD. Estimates are rough (tens of percent), see benchmarks/bench_plan.py
+for a comparison with measured numbers.
+
+@author Miika Ahdesmaki
+"""
+from __future__ import print_function, division
+import time
+import numpy as np
+from .corpcor import fast_svd as pvt_fast_svd
+
+# the routes in order of preference: the first one within budget is chosen
+ROUTES = ("full", "approx", "diagonal")
+ROUTE_OPTIONS = dict(full = dict(), approx = dict(lambda_approx = True), diagonal = dict(diagonal = True))
+IN_PLACE_OPTIONS = dict(store_training_data = False, copy_X = False)
+BLOCK_BYTES = 2**23 # as corpcor.shrink_misc.pvt_row_blocks()
+EDGE_RATIO = 2 # as corpcor.fast_svd.fast_svd()
+SUBSAMPLE = (1000, 1000, 10) # defaults of estimate_lambda_subsample()
+DIAGONAL_PASSES = 13 # passes over the data of centroids() and the moments kept by sda()
+
+_rates = None
+
+def pvt_best(f, repeats = 3):
+    """Shortest of repeats timings of f()
+    """
+    t = np.inf
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        f()
+        t = min(t, time.perf_counter() - t0)
+    return t
+
+def machine_rates(recalibrate = False):
+    """Throughput of this machine measured on small problems (cached)
+
+    Returns
+    -------
+    dict
+        gemm (flop/s of a matrix product), stream (bytes/s of one pass of
+        the element-wise operations over the data, from the time of fitting
+        a diagonal model), svd_values, svd_vectors and fmp ((seconds, 
+        exponent) of the SVD and the fractional matrix power of an s x s
+        matrix: t = seconds * (s / 256)**exponent, fitted at s = 128 and 
+        384 since multithreaded LAPACK is more efficient on larger 
+        matrices), and overhead and overhead_diagonal (seconds of fitting
+        a tiny problem)
+    """
+    global _rates
+    if _rates is not None and not recalibrate:
+        return _rates
+    from scipy.linalg import fractional_matrix_power # imported here to keep module import light
+    from .sda import sda # imported here, only needed for calibration
+    rng = np.random.RandomState(0)
+    a = rng.standard_normal((384, 1024))
+    rates = dict(gemm = 2 * 384**2 * 1024 / pvt_best(lambda: np.matmul(a, a.T)))
+    # the passes over the data of the diagonal model (centroids, variances, moments)
+    x = rng.standard_normal((4096, 1024))
+    L = np.arange(4096) % 3
+    t = pvt_best(lambda: sda(x, L, diagonal = True, keep_stats = True, overwrite_x = False), 2)
+    rates["stream"] = DIAGONAL_PASSES * x.nbytes / t
+    kernels = dict(svd_values = lambda m: np.linalg.svd(m, compute_uv = False),
+                   svd_vectors = lambda m: np.linalg.svd(m, full_matrices = False),
+                   fmp = lambda m: fractional_matrix_power(np.matmul(m, m.T) / len(m) + np.eye(len(m)), -1))
+    for name, kernel in kernels.items():
+        t = [pvt_best(lambda: kernel(m), 2) for m in (rng.standard_normal((s, s)) for s in (128, 384))]
+        exponent = min(max(np.log(t[1] / t[0]) / np.log(3), 2.0), 3.0)
+        rates[name] = (t[1] * (256 / 384)**exponent, exponent)
+    x = rng.standard_normal((30, 10))
+    L = np.arange(30) % 3
+    rates["overhead"] = pvt_best(lambda: sda(x, L, keep_stats = True))
+    rates["overhead_diagonal"] = pvt_best(lambda: sda(x, L, diagonal = True, keep_stats = True))
+    _rates = rates
+    return _rates
+
+def pvt_cubic_time(name, n, p, rates):
+    """Time of an O(s^2 l) LAPACK kernel of an n x p matrix
+    """
+    seconds, exponent = rates[name]
+    return seconds * ((min(n, p)**2 * max(n, p))**(1 / 3) / 256)**exponent
+
+def pvt_direct_svd(n, p):
+    """True if fast_svd() computes the svd of an n x p matrix directly
+    """
+    return max(n, p) <= EDGE_RATIO * min(n, p)
+
+def pvt_svd_time(n, p, vectors, rates):
+    """Time of fast_svd() of an n x p matrix (with the right singular vectors
+    if vectors, as pvt_cppowscor_factor() asks for them)
+    """
+    model = pvt_fast_svd._cost_model
+    if model is not None:
+        return model.predict(n, p, False, vectors)[model.choose(n, p, False, vectors)]
+    name = "svd_vectors" if vectors else "svd_values"
+    if pvt_direct_svd(n, p):
+        return pvt_cubic_time(name, n, p, rates)
+    s, l = min(n, p), max(n, p)
+    t = 2 * s * s * l / rates["gemm"] + pvt_cubic_time(name, s, s, rates) # Gram matrix and its svd
+    if vectors and n < p:
+        t += 2 * s * s * l / rates["gemm"] # v = m' u
+    return t
+
+def pvt_block(n, p):
+    """Bytes of one row block of an n x p float64 array
+    """
+    return 8 * p * min(n, max(1, BLOCK_BYTES // (8 * max(p, 1))))
+
+def pvt_blocks_memory(n, p):
+    """Temporaries of the row block loops over n x p data: two blocks, 
+    three if there is more than one block
+    """
+    B = pvt_block(n, p)
+    return 2 * B if B >= 8 * n * p else 3 * B
+
+def pvt_lambda_cor_stage(n, p, rates):
+    """Memory and time of estimate_lambda() on data standardised in place
+    """
+    s = min(n, p)
+    passes = 7 # moments, centring and scaling, squared column sums
+    time_ = passes * 8 * n * p / rates["stream"] + pvt_svd_time(n, p, False, rates)
+    gram = 0 if pvt_direct_svd(n, p) else 8 * s * s
+    return max(pvt_blocks_memory(n, p), gram), time_
+
+def plan_route(n, p, n_classes, route, in_place = False, rates = None, keep_stats = False):
+    """Predicted peak memory and run time of each stage of one route (with
+    keep_stats: of a fit keeping the statistics for add_class)
+
+    Returns
+    -------
+    dict
+        route, options (estimator parameters), stages (list of dicts with
+        stage, memory in bytes and time in seconds), peak_memory and time
+    """
+    rates = machine_rates() if rates is None else rates
+    K = n_classes
+    N = n * p
+    s = min(n, p)
+    r = max(min(n - K, p), 1) # rank of the centred data
+    stream = 8 * N / rates["stream"] # one pass over the data
+    copy = 0 if in_place else 8 * N
+    blocks = pvt_blocks_memory(n, p)
+    stages = []
+    def add(name, memory, time_):
+        stages.append(dict(stage = name, memory = int(copy + memory), time = float(time_)))
+    add("centroids", blocks + 16 * p * (K + 1), (DIAGONAL_PASSES - 3) * stream + 2 * N * K / rates["gemm"])
+    if keep_stats:
+        add("keep_stats", blocks, 3 * stream)
+    if route != "diagonal":
+        if route == "approx" and (n > SUBSAMPLE[0] or p > SUBSAMPLE[1]):
+            m, q = min(n, SUBSAMPLE[0]), min(p, SUBSAMPLE[1])
+            mem, t = pvt_lambda_cor_stage(m, q, rates)
+            # both intensities, each on n_subsamples copied subsamples
+            add("estimate_lambda", 2 * 8 * m * q + mem, 2 * SUBSAMPLE[2] * (t + 2 * 8 * m * q / rates["stream"]))
+        else:
+            add("estimate_lambda", *pvt_lambda_cor_stage(n, p, rates))
+        if pvt_direct_svd(n, p):
+            factor = 8 * (n * s + s * p) # u and v
+        else:
+            factor = 8 * (3 * s * s + p * s) # Gram matrix, its svd and v
+        add("pvt_cppowscor_factor", max(pvt_block(n, p), factor), 4 * stream + pvt_svd_time(n, p, True, rates))
+        # the factor is held while its matrix power is computed
+        held = 8 * max(3 * s * s, p * s)
+        add("fractional_matrix_power", held + 24 * r * r,
+            pvt_cubic_time("fmp", r, r, rates) + 4 * p * s * K / rates["gemm"])
+    outputs = 8 * p * (4 * K + 4) # beta, scalings, means, variances
+    if keep_stats:
+        outputs += 8 * p * (2 + (r if route != "diagonal" else 0)) # moments and the low rank factor
+    peak = max(st["memory"] for st in stages) + outputs
+    overhead = rates["overhead_diagonal" if route == "diagonal" else "overhead"]
+    options = dict(ROUTE_OPTIONS[route], **(IN_PLACE_OPTIONS if in_place else dict()))
+    return dict(route = route, options = options, stages = stages, peak_memory = int(peak), 
+                time = float(overhead + sum(st["time"] for st in stages)))
+
+def plan_fit(n, p, n_classes, memory_budget = None, time_budget = None, routes = ROUTES, 
+             in_place = False, rates = None, keep_stats = False):
+    """Predicted peak memory and run time of each route, and the preferred
+    route within the budgets
+
+    Parameters
+    ----------
+    n, p : int
+        Number of samples and features.
+    n_classes : int
+        Number of classes.
+    memory_budget : int
+        Bytes that may be allocated on top of the training data (None: no
+        limit).
+    time_budget : float
+        Seconds the fit may take (None: no limit).
+    routes : tuple
+        Routes to consider, in order of preference (ROUTES).
+    in_place : bool
+        Plan fits that overwrite X instead of copying it (False).
+    keep_stats : bool
+        Plan fits that keep the statistics for add_class (incremental=True
+        of the estimator, False).
+
+    Returns
+    -------
+    dict
+        routes (plan_route() of each route) and chosen (the first route
+        within both budgets, or None if no route is)
+    """
+    rates = machine_rates() if rates is None else rates
+    plans = [plan_route(n, p, n_classes, route, in_place, rates, keep_stats) for route in routes]
+    chosen = None
+    for plan in plans:
+        if memory_budget is not None and plan["peak_memory"] > memory_budget:
+            continue
+        if time_budget is not None and plan["time"] > time_budget:
+            continue
+        chosen = plan["route"]
+        break
+    return dict(routes = plans, chosen = chosen)
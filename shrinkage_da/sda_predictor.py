@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+Lightweight prediction from a trained SDA model
+
+Only NumPy and sda_io (NumPy and the standard library) are imported, so 
+"from shrinkage_da import SdaPredictor" does not load scikit-learn or SciPy.
+Meant for short-lived scoring processes that load a model saved with 
+ShrinkageDiscriminantAnalysis.save() or sda_io.save_sda().
+
+@author Miika Ahdesmaki
+"""
+from __future__ import print_function, division
+import threading
+import numpy as np
+from .sda_io import load_sda
+from .sda_quantize import pvt_decision_scores
+from .corpcor.shrink_misc import pvt_row_blocks
+from .predict_sda import pvt_posterior, pvt_topk, pvt_labels
+from .frame_input import feature_names, model_feature_names, select_columns
+
+class SdaPredictor(object):
+    """Predictor for a trained SDA model using NumPy only
+
+    Thread safety: the model arrays are read-only views fixed at
+    construction, and prediction never modifies the predictor except for
+    scratch buffers private to the calling thread, so one predictor may be
+    used by any number of threads at the same time. Rows are processed in 
+    blocks whose scores are written into the thread's reused buffer by a 
+    BLAS matrix product, and all other per-block work (softmax, argmax, 
+    label lookup) is vectorised NumPy, so the GIL is held only briefly per
+    block and concurrent calls scale with the number of cores. To replace 
+    the model while serving, swap the reference to a new predictor.
+
+    Parameters
+    ----------
+    sda_object : dict
+        dictionary from sda() or sda_io.load_sda() containing model parameters
+    block_bytes : int
+        Size of the blocks of input rows processed at a time (8 MiB of 
+        float64); bounds the scratch memory per thread.
+
+    Attributes
+    ----------
+    classes_ : ndarray, shape (n_classes,)
+        Class labels in the order of the columns of predict_proba().
+    alpha : ndarray, shape (n_classes,)
+        Intercepts of the discriminant functions.
+    beta : ndarray, shape (n_classes, n_features)
+        Coefficients of the discriminant functions (float16 or int8 for a
+        quantized model, see sda_quantize).
+    beta_scale : ndarray, shape (n_classes,) or None
+        Per-class scale of an int8 beta.
+    idx : ndarray or None
+        Indices of the input columns the model uses (None: all columns).
+    n_estimators : int
+        Number of members of a bagged ensemble (see sda_bagging), whose 
+        alpha and beta hold n_estimators * n_classes rows; 1 otherwise.
+    feature_names : ndarray or None
+        Names of the input columns the model uses, in the order of beta, if
+        it was fitted on a data frame. These columns are then taken from a
+        pandas DataFrame or Arrow table by name, without converting the 
+        other columns (see frame_input).
+    """
+    def __init__(self, sda_object, block_bytes = 2**23):
+        self.alpha = pvt_read_only(np.ravel(sda_object["alpha"]))
+        self.beta = pvt_read_only(sda_object["beta"])
+        self.beta_scale = pvt_read_only(sda_object.get("beta_scale"))
+        self.idx = pvt_read_only(sda_object.get("idx"))
+        self.feature_names = pvt_read_only(model_feature_names(sda_object))
+        self.classes_ = pvt_read_only(pvt_labels(sda_object["groups"][:-1])) # without "(pooled)"
+        self.n_estimators = sda_object.get("n_estimators", 1)
+        self.block_bytes = block_bytes
+        self._scratch = threading.local()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["_scratch"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._scratch = threading.local()
+
+    @classmethod
+    def load(cls, path, mmap_mode = "r"):
+        """Load a model saved with sda_io.save_sda()
+
+        Parameters
+        ----------
+        path : string
+            Directory the model was saved to.
+        mmap_mode : string
+            Memory map beta ('r', default) or read it into memory (None).
+        """
+        return cls(load_sda(path, mmap_mode = mmap_mode))
+
+    def decision_function(self, X):
+        """Discriminant scores (log posterior up to a constant per sample;
+        for an ensemble the log of the averaged posterior)
+
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features)
+            The input samples.
+
+        Returns
+        -------
+        ndarray, shape (n_samples, n_classes)
+        """
+        if self.n_estimators > 1:
+            return np.log(self.predict_proba(X))
+        X = self.pvt_check_X(X)
+        out = np.empty((X.shape[0], len(self.classes_)))
+        for b in pvt_row_blocks(X.shape[0], X.shape[1], self.block_bytes):
+            out[b, :] = self.pvt_scores(X, b)
+        return out
+
+    def predict_proba(self, X):
+        """Posterior class probabilities
+
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features)
+            The input samples.
+
+        Returns
+        -------
+        ndarray, shape (n_samples, n_classes)
+        """
+        X = self.pvt_check_X(X)
+        out = np.empty((X.shape[0], len(self.classes_)))
+        for b in pvt_row_blocks(X.shape[0], X.shape[1], self.block_bytes):
+            out[b, :] = pvt_posterior(self.pvt_scores(X, b), self.n_estimators)
+        return out
+
+    def predict(self, X):
+        """Class with the highest posterior probability
+
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features)
+            The input samples.
+
+        Returns
+        -------
+        ndarray, shape (n_samples,)
+        """
+        X = self.pvt_check_X(X)
+        codes = np.empty(X.shape[0], dtype = np.intp)
+        for b in pvt_row_blocks(X.shape[0], X.shape[1], self.block_bytes):
+            scores = self.pvt_scores(X, b)
+            if self.n_estimators > 1:
+                scores = pvt_posterior(scores, self.n_estimators)
+            np.argmax(scores, axis=1, out = codes[b])
+        return self.classes_[codes]
+
+    def predict_topk(self, X, k):
+        """The k most probable classes per sample and their posterior
+        probabilities, without forming the full posterior matrix (see 
+        predict_sda.predict_topk_sda)
+
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features)
+            The input samples.
+        k : int
+            Number of classes per sample, capped at the number of classes:
+            a larger k returns all n_classes columns.
+
+        Returns
+        -------
+        classes : ndarray, shape (n_samples, min(k, n_classes))
+            Class labels, most probable first.
+        posterior : ndarray, shape (n_samples, min(k, n_classes))
+            Their posterior probabilities.
+        """
+        X = self.pvt_check_X(X)
+        k = min(int(k), len(self.classes_))
+        if k < 1:
+            raise ValueError("k must be positive")
+        index = np.empty((X.shape[0], k), dtype = np.intp)
+        posterior = np.empty((X.shape[0], k))
+        for b in pvt_row_blocks(X.shape[0], max(X.shape[1], self.beta.shape[0]), self.block_bytes):
+            scores = self.pvt_scores(X, b)
+            if self.n_estimators > 1:
+                scores = np.log(pvt_posterior(scores, self.n_estimators))
+            index[b, :], posterior[b, :] = pvt_topk(scores, k)
+        return self.classes_[index], posterior
+
+    def pvt_check_X(self, X):
+        if self.feature_names is not None and feature_names(X) is not None:
+            X = select_columns(X, self.feature_names)
+        X = np.asarray(X)
+        if X.ndim != 2:
+            raise ValueError("Expected 2D array, got array with shape " + str(X.shape))
+        p = self.beta.shape[1]
+        n_cols = len(self.idx) if self.idx is not None and X.shape[1] != p else X.shape[1]
+        if n_cols != p:
+            raise ValueError("Different number of predictors in model (" + str(p) + ") and in X (" + str(X.shape[1]) + ")")
+        return X
+
+    def pvt_scores(self, X, b):
+        """Scores of the rows b of X, in the calling thread's scratch buffer
+        (valid until the thread's next call)
+        """
+        xb = X[b, :]
+        if self.idx is not None and X.shape[1] != self.beta.shape[1]:
+            xb = xb[:, self.idx]
+        dtype = np.result_type(xb.dtype, self.beta.dtype, np.float32)
+        shape = (xb.shape[0], self.beta.shape[0])
+        buf = getattr(self._scratch, "buf", None)
+        if buf is None or buf.dtype != dtype or buf.size < shape[0] * shape[1]:
+            buf = self._scratch.buf = np.empty(shape[0] * shape[1], dtype = dtype)
+        out = buf[:shape[0] * shape[1]].reshape(shape)
+        return pvt_decision_scores(xb, self.alpha, self.beta, self.beta_scale, out = out)
+
+def pvt_read_only(a):
+    """Read-only view of the array a (None stays None); the array itself 
+    stays writeable for its other users
+    """
+    if a is None:
+        return None
+    a = np.asarray(a).view()
+    a.flags.writeable = False
+    return a
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Shrinkage discriminant analysis with class-specific covariance matrices
+(quadratic discriminant analysis)
+
+Each class k has its own shrunken covariance matrix
+S_k = D_k^(1/2) R_k D_k^(1/2), with shrunken variances D_k and the shrunken
+correlation matrix R_k = lambda_k I + (1 - lambda_k) V_k C_k V_k' of the
+class, estimated from the class's own low rank SVD as in pvt_cppowscor.
+After rotating V_k to the eigenvectors of the m_k x m_k matrix C_k
+(diagonal for equal weights) the inverse and the determinant follow from the
+Woodbury identity:
+
+    R_k^-1 = I / lambda_k + V_k diag(1/(lambda_k + e_j) - 1/lambda_k) V_k'
+    log|R_k| = (p - m_k) log(lambda_k) + sum_j log(lambda_k + e_j)
+
+so that neither S_k nor its inverse is ever formed: fitting costs
+O(n_k^2 p) per class and scoring O(p m_k) per sample and class, where m_k is
+at most n_k - 1. Variables with zero variance in a class keep a correlation
+of 1 with themselves, as in pvt_cppowscor.
+
+@author Miika Ahdesmaki
+"""
+from __future__ import print_function, division
+import numpy as np
+from .centroids import centroids
+from .corpcor.shrink_misc import minmax, pvt_row_blocks, FrequencyWeights
+from .corpcor.shrink_intensity import estimate_lambda
+from .corpcor.pvt_cppowscor import pvt_cppowscor_factor
+from .corpcor.pvt_instrument import staged
+
+@staged("sda_qda")
+def sda_qda(Xtrain, L, lambda_cor = None, lambda_var = None, lambda_freqs = None, diagonal = False,
+            verbose = False, overwrite_x = False, w = None):
+    """Shrinkage discriminant analysis with a covariance matrix per class
+
+    Parameters
+    ----------
+    Xtrain : numpy array
+        Samples-in-rows matrix.
+    L : list
+        Class labels in a list. Must match number of rows in Xtrain.
+    lambda_cor : float or list
+        Correlation shrinkage parameter, one for all classes or one per class
+        (in the order of the model's "groups"). Estimated per class if None.
+    lambda_var : float or list
+        Variance shrinkage parameter, one for all classes or one per class
+        plus one for the pooled variances (see centroids()). Estimated per
+        class if None.
+    lambda_freqs : float
+        Shrinkage parameter for class prevalences.
+    diagonal : bool
+        If True, skip the correlations: per class diagonal covariance
+        matrices (False).
+    verbose : bool
+        Verbose mode (False).
+    overwrite_x : bool
+        Use Xtrain (a float array) as scratch space for the centred data
+        instead of allocating a copy (False). The contents of Xtrain are
+        destroyed.
+    w : vector array
+        Sample weights counting how often each row occurs (see centroids()).
+
+    Returns
+    -------
+    dictionary
+        Dictionary containing information about regularisation parameters,
+        prior probabilities, the constant term alpha of each class (log prior
+        minus half the log determinant of its covariance matrix) and the
+        class-specific parameters (qda): centroids (means), standard
+        deviations (scale), the low rank correlation factors (factors, p x
+        m_k each), the weights of the squared projections onto them (shrink),
+        the weights of the squared standardised variables (inverse) and the
+        shrinkage intensities (lambda_cor, lambda_var) of each class. Use
+        with predict_sda().
+    """
+    nX, pX = Xtrain.shape
+    if len(L) != nX:
+        raise ValueError("Number of rows in input matrix Xtrain must match the number of class labels")
+    w = None if w is None else FrequencyWeights(w)
+    labels, codes_L = np.unique(np.asarray(L), return_inverse = True)
+    sizes = np.bincount(codes_L, weights = None if w is None else np.ravel(w.view(np.ndarray)), minlength = len(labels))
+    if np.any(sizes < 2):
+        raise ValueError("Class-specific covariances need at least two samples per class")
+    my_cent = centroids(Xtrain, L, lambda_var, lambda_freqs, var_groups = True, centered_data = True,
+                        verbose = verbose, out = Xtrain if overwrite_x else None, w = w)
+    cl_count = len(my_cent["groups"]) - 1
+    freqs = my_cent["freqs"]
+    mu = my_cent["means"][:, :cl_count]
+    variances = my_cent["variances"][:, :cl_count]
+    if np.any(variances <= 0):
+        raise ValueError("Some features have zero shrunken variance within a class; "
+                         "use a positive lambda_var or remove these features")
+    if lambda_cor is None or np.ndim(lambda_cor) == 0:
+        lambdas = [lambda_cor] * cl_count
+    else:
+        lambdas = list(np.ravel(lambda_cor))
+        if len(lambdas) != cl_count:
+            raise ValueError("lambda_cor must be a scalar or have one value per class")
+    xc = my_cent["centered_data"]
+    codes = np.asarray(my_cent["groups"][:-1])
+    Larr = np.asarray(L)
+    factors = []
+    shrink = []
+    inverse = np.ones((pX, cl_count))
+    logdet = np.sum(np.log(variances), axis = 0)
+    lambda_cor_k = np.ones(cl_count)
+    for k in range(cl_count):
+        rows = np.flatnonzero(Larr == codes[k])
+        wk = None if w is None else w[rows]
+        if diagonal:
+            V, h, zeros, lam = np.zeros((pX, 0)), np.zeros(0), None, 1.0
+        else:
+            if verbose:
+                print("Estimating the correlation factor (class #", k, ")")
+            xk = xc[rows, :] # a copy, standardised in place below
+            lam = lambdas[k]
+            if lam is None:
+                lam = estimate_lambda(xk, w = wk, verbose = verbose, overwrite_x = True)
+            lam = minmax(lam)
+            V, h, zeros, ld = pvt_class_factor(xk, wk, lam)
+            logdet[k] += ld
+        lambda_cor_k[k] = lam
+        if zeros is not None:
+            inverse[~zeros, k] = 0 if lam == 0 else 1/lam
+        factors.append(V)
+        shrink.append(h)
+    del xc
+    alpha = np.zeros((cl_count, 1))
+    alpha[:, 0] = np.log(freqs) - logdet/2
+    regularisation = dict(lambda_cor = np.nan, lambda_var = np.nan, lambda_freqs = my_cent["freqs_lambda"])
+    qda = dict(means = mu, scale = np.sqrt(variances), factors = factors, shrink = shrink, inverse = inverse,
+               lambda_cor = lambda_cor_k, lambda_var = np.asarray(my_cent["var_lambdas"][:cl_count]))
+    if verbose:
+        print("Shrinkage intensities lambda (correlation matrices):", lambda_cor_k)
+    return dict(regularisation = regularisation, freqs = freqs, alpha = alpha, groups = my_cent["groups"],
+                was_diagonal = diagonal, qda = qda)
+
+def pvt_class_factor(xc, w, lambda_cor):
+    """Private function computing the rotated low rank factor V (p x m) of
+    the shrunken correlation matrix of one class from its centred data xc
+    (overwritten), the weights h of the squared projections in the
+    Mahalanobis distance, a boolean index of zero-variance variables and
+    log|R|
+    """
+    n, p = xc.shape
+    if lambda_cor == 1:
+        return np.zeros((p, 0)), np.zeros(0), np.zeros(p, dtype = bool), 0.0
+    f = pvt_cppowscor_factor(xc, w, overwrite_x = True)
+    zeros = np.asarray(f["zeros"])
+    d = f["d"]
+    UTWU = f["utwu"] if "utwu" in f else np.matmul(f["u"].T, f["u"] * f["w"])
+    h1 = 1/(1 - f["w2"])
+    C = (1 - lambda_cor) * h1 * UTWU * d[:, None] * d[None, :] # D matmul UTWU matmul D
+    e, Q = np.linalg.eigh((C + C.T)/2)
+    V = np.matmul(f["v"], Q)
+    m_free = p - np.sum(zeros) - len(e) # variables outside the span of V (diagonal lambda)
+    if lambda_cor == 0:
+        if m_free > 0 or np.any(e <= len(e) * np.max(e) * np.finfo(float).eps):
+            raise ValueError("lambda_cor = 0 leaves the correlation matrix of a class singular")
+        return V, 1/e, zeros, np.sum(np.log(e))
+    h = 1/(lambda_cor + e) - 1/lambda_cor
+    return V, h, zeros, m_free * np.log(lambda_cor) + np.sum(np.log(lambda_cor + e))
+
+def pvt_qda_scores(sda_object, Xtest):
+    """Private function computing the log posterior scores (up to a common
+    constant) of a model from sda_qda(), in blocks of rows
+    """
+    qda = sda_object["qda"]
+    mu, scale, inverse = qda["means"], qda["scale"], qda["inverse"]
+    alpha = np.ravel(sda_object["alpha"])
+    n, p = Xtest.shape
+    cl_count = len(alpha)
+    scores = np.empty((n, cl_count))
+    for b in pvt_row_blocks(n, p):
+        xb = np.asarray(Xtest[b, :], dtype = np.float64)
+        for k in range(cl_count):
+            yk = (xb - mu[:, k]) / scale[:, k]
+            q = np.matmul(yk * yk, inverse[:, k])
+            V = qda["factors"][k]
+            if V.shape[1] > 0:
+                t = np.matmul(yk, V)
+                q += np.matmul(t * t, qda["shrink"][k])
+            scores[b, k] = alpha[k] - q/2
+    return scores
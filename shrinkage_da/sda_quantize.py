@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Low-precision storage of the discriminant coefficients
+
+Storing beta (K x p) in float16 (4x smaller than float64) or in int8 with
+one scale factor per class (8x smaller) cuts the model memory, the size of
+saved models and the page cache shared by scoring processes accordingly.
+It does not make prediction faster: the scores are computed in blocks of
+columns, each block of beta being converted to floating point just before
+its product with the data (for int8 the per-class scale is applied once to
+the final scores), and with NumPy that conversion costs about as much as 
+the memory traffic saved on small batches, while large batches are bound 
+by the matrix product, which is the same. Expect prediction at the speed 
+of the full precision model or slightly slower.
+
+Only NumPy is imported here.
+
+@author Miika Ahdesmaki
+"""
+from __future__ import print_function, division
+import numpy as np
+from .corpcor.shrink_misc import pvt_row_blocks
+
+QUANTIZED_DTYPES = ("float16", "int8")
+
+def quantize_sda(sda_object, dtype = "int8"):
+    """Copy of a model with beta stored in low precision
+
+    Parameters
+    ----------
+    sda_object : dict
+        dictionary from sda() containing model parameters
+    dtype : string
+        'float16', or 'int8' with beta[k, :] = beta_scale[k] * q[k, :]
+        (the scale chosen so that the largest coefficient of each class
+        maps to +-127).
+
+    Returns
+    -------
+    dict
+        Model parameters as sda_object (sharing all arrays but beta), with
+        the quantized beta and for int8 the per-class "beta_scale"
+    """
+    if dtype not in QUANTIZED_DTYPES:
+        raise ValueError("dtype must be one of " + ", ".join(QUANTIZED_DTYPES))
+    beta = np.asarray(sda_object["beta"])
+    if beta.dtype not in (np.float32, np.float64):
+        raise ValueError("sda_object is already quantized (beta is " + str(beta.dtype) + ")")
+    quantized = dict(sda_object)
+    if dtype == "float16":
+        quantized["beta"] = beta.astype(np.float16)
+        quantized["beta_scale"] = None
+        return quantized
+    scale = np.max(np.abs(beta), axis = 1) / 127
+    scale[scale == 0] = 1 # all-zero rows
+    q = np.empty(beta.shape, dtype = np.int8)
+    for b in pvt_row_blocks(beta.shape[1], beta.shape[0]): # column blocks, no full size float temporary
+        q[:, b] = np.rint(beta[:, b] / scale[:, None])
+    quantized["beta"] = q
+    quantized["beta_scale"] = scale
+    return quantized
+
+def pvt_decision_scores(Xtest, alpha, beta, beta_scale = None, block_bytes = 2**18, out = None):
+    """Private function computing Xtest beta' + alpha for beta of any dtype,
+    converting low precision beta to floating point in column blocks small
+    enough (block_bytes) to stay in cache until their product is formed.
+    The scores are written to out (n x K) if given.
+    """
+    alpha = np.ravel(alpha)
+    if beta.dtype in (np.float32, np.float64):
+        scores = np.matmul(Xtest, beta.T, out = out)
+        scores += alpha
+        return scores
+    n, p = Xtest.shape
+    dtype = np.result_type(Xtest.dtype, np.float32)
+    if out is None:
+        scores = np.zeros((n, beta.shape[0]), dtype = dtype)
+    else:
+        scores = out
+        scores[...] = 0
+    for b in pvt_row_blocks(p, beta.shape[0], block_bytes): # blocks over the columns of beta
+        scores += np.matmul(Xtest[:, b], beta[:, b].astype(dtype).T)
+    if beta_scale is not None:
+        scores *= beta_scale
+    scores += alpha
+    return scores
+
+def quantization_report(sda_object, Xval, dtype = "int8", yval = None):
+    """Accuracy of a quantized model relative to the full precision model
+
+    Parameters
+    ----------
+    sda_object : dict
+        dictionary from sda() containing model parameters (full precision)
+    Xval : numpy array
+        Validation samples (samples in rows).
+    dtype : string or dict
+        Quantization ('float16' or 'int8'), or an already quantized model
+        from quantize_sda().
+    yval : array
+        True class labels of Xval, to also report both accuracies (None).
+
+    Returns
+    -------
+    dict
+        argmax_agreement (fraction of samples with the same predicted class),
+        max_abs_posterior_diff, mean_abs_posterior_diff, beta_bytes and
+        quantized_beta_bytes, and accuracy and quantized_accuracy if yval is
+        given
+    """
+    from .predict_sda import predict_sda # imported here, predict_sda uses this module
+    quantized = quantize_sda(sda_object, dtype) if not isinstance(dtype, dict) else dtype
+    full = predict_sda(sda_object, Xval)
+    low = predict_sda(quantized, Xval)
+    diff = np.abs(full["posterior"] - low["posterior"])
+    report = dict(argmax_agreement = float(np.mean(full["predicted_class"] == low["predicted_class"])),
+                  max_abs_posterior_diff = float(np.max(diff)),
+                  mean_abs_posterior_diff = float(np.mean(diff)),
+                  beta_bytes = int(np.asarray(sda_object["beta"]).nbytes),
+                  quantized_beta_bytes = int(quantized["beta"].nbytes))
+    if yval is not None:
+        yval = np.asarray(yval)
+        report["accuracy"] = float(np.mean(full["predicted_class"] == yval))
+        report["quantized_accuracy"] = float(np.mean(low["predicted_class"] == yval))
+    return report
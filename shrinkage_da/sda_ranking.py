@@ -7,9 +7,9 @@ Shrinkage discriminant analysis (feature ranking)
 from __future__ import print_function, division
 import numpy as np
 from sys import exit
-from catscore import catscore
+from .catscore import catscore
 
-def sda_ranking(Xtrain, L, lambda_cor = None, lambda_var = None, lambda_freqs = None, ranking_score = "entropy", diagonal=False, verbose=False):
+def sda_ranking(Xtrain, L, lambda_cor = None, lambda_var = None, lambda_freqs = None, ranking_score = "entropy", diagonal=False, verbose=False, lambda_approx=False, cache=None, w=None, feature_groups=None, n_jobs=None, prefilter=False):
     """SDA feature ranking
     
     Parameters
@@ -31,6 +31,20 @@ def sda_ranking(Xtrain, L, lambda_cor = None, lambda_var = None, lambda_freqs =
         If True, skip correlation adjustment and assume diagonal model (False)
     verbose : bool
         Verbose mode (False).
+    lambda_approx : bool or dict
+        Estimate the shrinkage intensities from subsamples (see catscore()).
+    cache : FitCache
+        Cache of correlation factors (see catscore()).
+    w : vector array
+        Sample weights counting how often each row occurs (see centroids()).
+    feature_groups : vector array
+        Group label of each feature, for a block diagonal correlation matrix
+        (see catscore()).
+    n_jobs : int
+        Number of threads processing the feature groups (None: all cores).
+    prefilter : bool or dict
+        Score only features that are neither constant nor duplicates (see 
+        catscore()); duplicates share the score of their kept copy.
     
     Returns
     -------
@@ -41,19 +55,32 @@ def sda_ranking(Xtrain, L, lambda_cor = None, lambda_var = None, lambda_freqs =
     if ranking_score not in ["entropy","avg","max"]:
         raise ValueError("ranking_score must be one of 'entropy', 'avg' or 'max'")
     cat = catscore(Xtrain, L, lambda_cor=lambda_cor, lambda_var=lambda_var, 
-                   lambda_freqs=lambda_freqs, diagonal=diagonal, verbose=verbose)
-    cl_count = cat["cat"].shape[1]
-    if ranking_score == "entropy":
-        score = np.matmul(np.power(cat["cat"], 2), 1-cat["freqs"])  # weighted sum of squared CAT scores
-    if ranking_score == "avg":
-        score = np.sum(np.power(cat["cat"], 2), axis=1) / cl_count # average of squared CAT-scores
-    if ranking_score == "max":
-        score = np.max(np.power(cat["cat"], 2), axis=1)          # max of squared CAT-scores
+                   lambda_freqs=lambda_freqs, diagonal=diagonal, verbose=verbose,
+                   lambda_approx=lambda_approx, cache=cache, w=w, feature_groups=feature_groups,
+                   n_jobs=n_jobs, prefilter=prefilter)
+    score = pvt_ranking_score(cat["cat"], cat["freqs"], ranking_score)
     idx = np.argsort(score)[::-1] # decreasing sort order of cat scores
     
     # Future implementation of FDR evaluation goes here
     
     # Without FDR just return sort order, scores, cats
     
-    return dict(idx=idx, score = score[idx], cat = cat["cat"][idx,:], 
-                regularisation = cat["regularisation"], freqs = cat["freqs"], was_diagonal = cat["was_diagonal"])
\ No newline at end of file
+    result = dict(idx=idx, score = score[idx], cat = cat["cat"][idx,:], 
+                  regularisation = cat["regularisation"], freqs = cat["freqs"], was_diagonal = cat["was_diagonal"])
+    for key in ("feature_groups", "prefilter"):
+        if key in cat:
+            result[key] = cat[key]
+    return result
+
+def pvt_ranking_score(cat, freqs, ranking_score):
+    """Summarise the CAT scores of each feature across classes into a single
+    ranking score
+    """
+    cl_count = cat.shape[1]
+    if ranking_score == "entropy":
+        score = np.matmul(np.power(cat, 2), 1-freqs)  # weighted sum of squared CAT scores
+    if ranking_score == "avg":
+        score = np.sum(np.power(cat, 2), axis=1) / cl_count # average of squared CAT-scores
+    if ranking_score == "max":
+        score = np.max(np.power(cat, 2), axis=1)          # max of squared CAT-scores
+    return score
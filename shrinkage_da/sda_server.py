@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-batching prediction server
+
+Requests carrying one or a few samples are queued and coalesced into one
+batch of up to max_batch_size rows, waiting at most max_latency seconds for
+more requests to arrive. predict_proba() then runs once per batch in a
+worker thread, so the event loop keeps accepting requests meanwhile. The
+model can be swapped at any time: batches already running finish with the
+old model, all later batches use the new one, and no request is dropped.
+
+Only NumPy and the standard library are imported (the model is usually an
+SdaPredictor). A minimal HTTP/1.1 front end with JSON bodies is provided:
+
+    POST /predict   {"X": [[...], ...]} -> {"predicted_class": [...], "posterior": [[...]], "classes": [...]}
+    POST /model     {"path": "name"} loads a saved model and swaps it in
+    GET  /stats     latency percentiles and latency/batch size histograms
+
+POST /model only loads models from the directory given as model_dir, with
+paths relative to it; without model_dir it is refused (403), as anyone who
+can reach the port could otherwise load any directory readable by the 
+server process. The server has no authentication: bind it to a trusted 
+interface.
+
+@author Miika Ahdesmaki
+"""
+from __future__ import print_function, division
+import asyncio
+import collections
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .sda_predictor import SdaPredictor
+
+# upper edges of the latency histogram bins in seconds (last bin open ended)
+LATENCY_EDGES = tuple(1e-4 * 2**i for i in range(16))
+
+class BatchingPredictor(object):
+    """Coalesces concurrent prediction requests into batches
+
+    Must be used from a running event loop: start() (or ``async with``)
+    starts the batching task, stop() finishes the queued requests and stops it.
+
+    Parameters
+    ----------
+    model : object
+        Model with predict_proba(X) and classes_, e.g. an SdaPredictor or a
+        fitted ShrinkageDiscriminantAnalysis.
+    max_batch_size : int
+        Maximum number of rows per batch (256). A single larger request
+        forms a batch of its own.
+    max_latency : float
+        Time in seconds a batch waits for further requests after its first
+        request arrived (0.002).
+    n_recent : int
+        Number of most recent request latencies kept for the percentiles
+        (10000).
+    """
+    def __init__(self, model, max_batch_size = 256, max_latency = 0.002, n_recent = 10000):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self._recent = collections.deque(maxlen = n_recent)
+        self._latency_counts = [0] * (len(LATENCY_EDGES) + 1)
+        self._batch_counts = collections.Counter()
+        self._n_requests = 0
+        self._n_batches = 0
+        self._n_swaps = 0
+        self._queue = None
+        self._task = None
+        self._executor = None
+
+    async def start(self):
+        """Start the batching task
+        """
+        if self._task is not None:
+            return self
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers = 1)
+        self._task = asyncio.ensure_future(self._run())
+        return self
+
+    async def stop(self):
+        """Finish the queued requests and stop the batching task
+        """
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        self._executor.shutdown(wait = True)
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    def swap_model(self, model):
+        """Use model for all batches that have not started yet
+        """
+        self.model = model
+        self._n_swaps += 1
+
+    async def predict_proba(self, X):
+        """Posterior probabilities for the rows of X (computed in a batch)
+
+        Returns
+        -------
+        ndarray, shape (n_samples, n_classes)
+        """
+        return (await self._submit(X))[0]
+
+    async def predict(self, X):
+        """Class predictions and posterior probabilities for the rows of X
+
+        Returns
+        -------
+        dict
+            predicted_class, posterior and classes (of the model that
+            computed the batch, which matters if models are swapped)
+        """
+        probs, classes = await self._submit(X)
+        return dict(predicted_class = classes[np.argmax(probs, axis = 1)],
+                    posterior = probs, classes = classes)
+
+    def stats(self):
+        """Request and batch statistics
+
+        Returns
+        -------
+        dict
+            n_requests, n_batches, n_swaps, latency_p50 and latency_p99 (in
+            seconds, over the n_recent most recent requests; None before the
+            first request), latency_histogram (list of (upper edge in 
+            seconds, count), the last edge is None) and batch_size_histogram
+            (list of (upper edge in rows, count) over powers of two).
+        """
+        p50 = p99 = None
+        if self._recent:
+            p50, p99 = (float(q) for q in np.percentile(np.array(self._recent), [50, 99]))
+        edges = LATENCY_EDGES + (None,) # JSON has no inf
+        batch_hist = sorted(self._batch_counts.items())
+        return dict(n_requests = self._n_requests, n_batches = self._n_batches,
+                    n_swaps = self._n_swaps, latency_p50 = p50, latency_p99 = p99,
+                    latency_histogram = list(zip(edges, self._latency_counts)),
+                    batch_size_histogram = batch_hist)
+
+    async def _submit(self, X):
+        if self._task is None:
+            raise RuntimeError("BatchingPredictor has not been started")
+        X = np.asarray(X, dtype = np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        if X.ndim != 2:
+            raise ValueError("Expected 1D or 2D array, got array with shape " + str(X.shape))
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((X, future, time.perf_counter()))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        carry = None # request that did not fit into the previous batch
+        stopping = False
+        while not stopping or carry is not None:
+            item = carry if carry is not None else await self._queue.get()
+            carry = None
+            if item is None:
+                break
+            batch = [item]
+            rows = item[0].shape[0]
+            deadline = loop.time() + self.max_latency
+            while rows < self.max_batch_size:
+                try:
+                    nxt = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        nxt = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if nxt is None:
+                    stopping = True
+                    break
+                if rows + nxt[0].shape[0] > self.max_batch_size:
+                    carry = nxt
+                    break
+                batch.append(nxt)
+                rows += nxt[0].shape[0]
+            await self._run_batch(loop, batch, rows)
+
+    async def _run_batch(self, loop, batch, rows):
+        model = self.model # swaps during the batch apply to the next one
+        try:
+            X = batch[0][0] if len(batch) == 1 else np.vstack([b[0] for b in batch])
+            probs = await loop.run_in_executor(self._executor, model.predict_proba, X)
+        except Exception as e:
+            if len(batch) == 1:
+                self._finish(batch[0], exception = e)
+            else: # e.g. a request with the wrong number of columns: fail only that one
+                for b in batch:
+                    await self._run_batch(loop, [b], b[0].shape[0])
+            return
+        self._n_batches += 1
+        self._batch_counts[1 << (rows - 1).bit_length()] += 1
+        classes = np.asarray(model.classes_)
+        start = 0
+        for b in batch:
+            n = b[0].shape[0]
+            self._finish(b, result = (probs[start:start + n], classes))
+            start += n
+
+    def _finish(self, item, result = None, exception = None):
+        X, future, t0 = item
+        latency = time.perf_counter() - t0
+        self._n_requests += 1
+        self._recent.append(latency)
+        i = 0
+        while i < len(LATENCY_EDGES) and latency > LATENCY_EDGES[i]:
+            i += 1
+        self._latency_counts[i] += 1
+        if future.done(): # cancelled by the caller
+            return
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+class _BodyTooLarge(Exception):
+    """The Content-Length of a request exceeds max_body_bytes"""
+
+async def _read_request(reader, max_body_bytes):
+    line = await reader.readline()
+    if not line:
+        return None
+    method, target, version = line.decode("latin-1").split(None, 2)
+    headers = dict()
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    if length < 0:
+        raise ValueError("negative Content-Length")
+    if length > max_body_bytes:
+        raise _BodyTooLarge() # not read: the connection is closed
+    body = await reader.readexactly(length) if length else b""
+    keep_alive = headers.get("connection", "").lower() != "close" and version.strip() == "HTTP/1.1"
+    return method, target, body, keep_alive
+
+def _response(status, payload, keep_alive):
+    body = json.dumps(payload).encode("utf-8")
+    reasons = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 413: "Payload Too Large",
+               500: "Internal Server Error"}
+    head = ("HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n"
+            "Connection: %s\r\n\r\n") % (status, reasons[status], len(body),
+                                         "keep-alive" if keep_alive else "close")
+    return head.encode("latin-1") + body
+
+def _model_path(model_dir, name):
+    """Path of the model name inside model_dir, or None if it is outside
+    """
+    if model_dir is None or not isinstance(name, str):
+        return None
+    root = os.path.realpath(model_dir)
+    path = os.path.realpath(os.path.join(root, name))
+    return path if path.startswith(root + os.sep) else None # no "..", absolute paths or links out of model_dir
+
+async def _handle(batcher, method, target, body, model_dir = None):
+    if method == "GET" and target == "/stats":
+        return 200, batcher.stats()
+    if method != "POST" or target not in ("/predict", "/model"):
+        return 404, dict(error = "unknown endpoint " + method + " " + target)
+    try:
+        request = json.loads(body.decode("utf-8"))
+    except ValueError as e:
+        return 400, dict(error = "invalid JSON: " + str(e))
+    if target == "/model":
+        if model_dir is None:
+            return 403, dict(error = "loading models is disabled (no model_dir)")
+        if not isinstance(request, dict) or "path" not in request:
+            return 400, dict(error = "expected {\"path\": ...}")
+        path = _model_path(model_dir, request["path"])
+        if path is None:
+            return 403, dict(error = "path must be a model inside model_dir")
+        if not os.path.isfile(os.path.join(path, "model.json")):
+            return 400, dict(error = "no saved model at " + str(request["path"]))
+        loop = asyncio.get_running_loop()
+        model = await loop.run_in_executor(None, SdaPredictor.load, path)
+        batcher.swap_model(model)
+        return 200, dict(n_features = int(model.beta.shape[1]), classes = model.classes_.tolist())
+    try:
+        result = await batcher.predict(request["X"])
+    except (KeyError, TypeError, ValueError) as e:
+        return 400, dict(error = str(e))
+    return 200, dict((k, v.tolist()) for k, v in result.items())
+
+async def serve_sda(batcher, host = "127.0.0.1", port = 8000, model_dir = None, max_body_bytes = 2**24):
+    """Serve predictions of a started BatchingPredictor over HTTP
+
+    Parameters
+    ----------
+    batcher : BatchingPredictor
+        The (started) batching predictor.
+    host, port : string, int
+        Address to listen on (port 0 picks a free port).
+    model_dir : string
+        Directory of the models POST /model may load, by path relative to
+        it (None: POST /model is refused).
+    max_body_bytes : int
+        Largest request body accepted (16 MiB); a request with a larger
+        Content-Length is answered with 413 and its connection closed
+        without reading the body.
+
+    Returns
+    -------
+    asyncio.Server
+        The listening server (its sockets give the actual port).
+    """
+    async def client(reader, writer):
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader, max_body_bytes)
+                except (ValueError, asyncio.IncompleteReadError):
+                    writer.write(_response(400, dict(error = "malformed request"), False))
+                    break
+                except _BodyTooLarge:
+                    writer.write(_response(413, dict(error = "request body larger than %d bytes" % max_body_bytes),
+                                           False))
+                    break
+                if request is None:
+                    break
+                method, target, body, keep_alive = request
+                try:
+                    status, payload = await _handle(batcher, method, target, body, model_dir)
+                except Exception as e:
+                    status, payload = 500, dict(error = repr(e))
+                writer.write(_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+    return await asyncio.start_server(client, host, port)
+
+def run_server(path, host = "127.0.0.1", port = 8000, model_dir = None, max_body_bytes = 2**24, **kwargs):
+    """Load a saved model and serve it until interrupted
+
+    Parameters
+    ----------
+    path : string
+        Directory of a model saved with sda_io.save_sda().
+    host, port : string, int
+        Address to listen on.
+    model_dir : string
+        Directory of the models that may be swapped in with POST /model
+        (None: swapping over HTTP is disabled).
+    max_body_bytes : int
+        Largest request body accepted (16 MiB, see serve_sda()).
+    **kwargs
+        Passed to BatchingPredictor (max_batch_size, max_latency, n_recent).
+    """
+    async def main():
+        async with BatchingPredictor(SdaPredictor.load(path), **kwargs) as batcher:
+            server = await serve_sda(batcher, host, port, model_dir, max_body_bytes)
+            async with server:
+                await server.serve_forever()
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Stability selection over CAT score rankings (parallel subsampling)
+
+@author Miika Ahdesmaki
+"""
+from __future__ import print_function, division
+import numpy as np
+from multiprocessing import Pool, cpu_count, shared_memory
+from .catscore import catscore
+from .sda_ranking import pvt_ranking_score
+
+# per-process state set up by pvt_stability_init(); the data matrix is a view
+# into shared memory so that no worker holds its own copy of Xtrain
+_shared = dict()
+
+def stability_rank(Xtrain, L, top_k, n_draws = 100, sample_fraction = 0.5, replace = False,
+                   lambda_cor = None, lambda_var = None, lambda_freqs = None, ranking_score = "entropy",
+                   diagonal = False, n_jobs = None, random_state = None, verbose = False):
+    """Stability selection of features: how often does each feature land in
+    the top_k of the CAT score ranking over random subsamples of the data
+
+    Subsamples are drawn within each class so that every draw contains all
+    classes. The draws are distributed over a pool of worker processes which
+    all read Xtrain from one shared memory block.
+
+    Parameters
+    ----------
+    Xtrain : numpy array
+        Samples-in-rows matrix.
+    L : list
+        Class labels in a list. Must match number of rows in Xtrain.
+    top_k : int
+        Number of top ranking features counted as selected in each draw.
+    n_draws : int
+        Number of subsamples (100).
+    sample_fraction : float
+        Fraction of samples of each class drawn per subsample (0.5).
+    replace : bool
+        Draw with replacement, i.e. bootstrap instead of subsampling (False).
+    lambda_cor : float
+        Correlation shrinkage parameter.
+    lambda_var : float or list
+        Shrinkage parameter for variances or list specified_lambda_var = lambda_varif separate ones used per class
+    lambda_freqs : float
+        Shrinkage parameter for class prevalences.
+    ranking_score : string
+        One of "entropy", "avg" or "max".
+    diagonal : bool
+        If True, skip correlation adjustment and assume diagonal model (False)
+    n_jobs : int
+        Number of worker processes. None uses all cores, 1 runs in-process.
+    random_state : int
+        Seed for drawing the subsamples.
+    verbose : bool
+        Verbose mode (False).
+
+    Returns
+    -------
+    dictionary
+        Dictionary containing features ordered by selection frequency,
+        selection frequencies and counts of the features (in original order)
+        and the number of draws
+    """
+    if ranking_score not in ["entropy","avg","max"]:
+        raise ValueError("ranking_score must be one of 'entropy', 'avg' or 'max'")
+    Xtrain = np.ascontiguousarray(Xtrain)
+    n, p = Xtrain.shape
+    if len(L) != n:
+        raise ValueError("Number of rows in input matrix Xtrain must match the number of class labels")
+    top_k = int(top_k)
+    if top_k < 1 or top_k > p:
+        raise ValueError("top_k must be between 1 and the number of features")
+    _, codes = np.unique(np.array(L), return_inverse=True)
+    settings = dict(top_k=top_k, sample_fraction=sample_fraction, replace=replace,
+                    lambda_cor=lambda_cor, lambda_var=lambda_var, lambda_freqs=lambda_freqs,
+                    ranking_score=ranking_score, diagonal=diagonal)
+    seeds = np.random.RandomState(random_state).randint(np.iinfo(np.int32).max, size=n_draws)
+    counts = np.zeros(p, dtype=np.int64)
+    if n_jobs == 1:
+        _shared.update(x=Xtrain, codes=codes, settings=settings)
+        try:
+            for seed in seeds:
+                counts[pvt_stability_draw(seed)] += 1
+        finally:
+            _shared.clear()
+    else:
+        shm = shared_memory.SharedMemory(create=True, size=max(Xtrain.nbytes, 1))
+        try:
+            x_shared = np.ndarray(Xtrain.shape, dtype=Xtrain.dtype, buffer=shm.buf)
+            x_shared[:] = Xtrain
+            del x_shared
+            n_workers = cpu_count() if n_jobs is None else n_jobs
+            pool = Pool(processes=n_workers, initializer=pvt_stability_init,
+                        initargs=(shm.name, Xtrain.shape, Xtrain.dtype.str, codes, settings))
+            try:
+                chunksize = max(1, n_draws // (4 * n_workers))
+                # aggregate incrementally as draws complete
+                for done, selected in enumerate(pool.imap_unordered(pvt_stability_draw, seeds, chunksize)):
+                    counts[selected] += 1
+                    if verbose and (done + 1) % 50 == 0:
+                        print("Completed draws:", done + 1)
+            finally:
+                pool.terminate()
+                pool.join()
+        finally:
+            shm.close()
+            shm.unlink()
+    freq = counts / n_draws
+    idx = np.argsort(-freq, kind="mergesort") # stable, so ties keep feature order
+    return dict(idx=idx, freq=freq[idx], counts=counts, n_draws=n_draws, top_k=top_k)
+
+def pvt_stability_init(shm_name, shape, dtype, codes, settings):
+    """Attach a worker process to the shared data matrix
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _shared.update(shm=shm, x=np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf),
+                   codes=codes, settings=settings)
+
+def pvt_stability_draw(seed):
+    """Rank features on one stratified subsample and return the indices of
+    the top_k features (in no particular order)
+    """
+    x = _shared["x"]
+    codes = _shared["codes"]
+    s = _shared["settings"]
+    rng = np.random.RandomState(seed)
+    rows = []
+    for k in range(0, codes.max() + 1):
+        members = np.flatnonzero(codes == k)
+        m = max(2, int(round(s["sample_fraction"] * len(members))))
+        if not s["replace"]:
+            m = min(m, len(members))
+        rows.append(rng.choice(members, size=m, replace=s["replace"]))
+    rows = np.sort(np.concatenate(rows))
+    cat = catscore(x[rows, :], codes[rows], lambda_cor=s["lambda_cor"], lambda_var=s["lambda_var"],
+                   lambda_freqs=s["lambda_freqs"], diagonal=s["diagonal"], verbose=False)
+    score = pvt_ranking_score(cat["cat"], cat["freqs"], s["ranking_score"])
+    top_k = s["top_k"]
+    return np.argpartition(score, score.shape[0] - top_k)[-top_k:] # partial selection of the top_k
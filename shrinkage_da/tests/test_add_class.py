@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from shrinkage_da import ShrinkageDiscriminantAnalysis
+
+
+@pytest.fixture
+def data():
+    rng = np.random.RandomState(0)
+    y = np.repeat([1, 2, 3], 10)
+    X = rng.randn(30, 40) + y[:, None]
+    return X, y, rng.randn(8, 40) - 3
+
+
+def test_add_class_needs_incremental(data):
+    X, y, X_new = data
+    est = ShrinkageDiscriminantAnalysis().fit(X, y)
+    assert "stats" not in est.sdamodel_
+    with pytest.raises(ValueError, match="incremental=True"):
+        est.add_class(X_new, 0)
+
+
+def test_add_class_equals_refit_with_same_lambda_cor(data):
+    X, y, X_new = data
+    est = ShrinkageDiscriminantAnalysis(incremental=True).fit(X, y)
+    lambda_cor = est.sdamodel_["regularisation"]["lambda_cor"]
+    est.add_class(X_new, 0)
+    refit = ShrinkageDiscriminantAnalysis(lambda_cor=lambda_cor).fit(
+        np.vstack((X, X_new)), np.append(y, [0] * len(X_new)))
+    order = [list(refit.classes_).index(c) for c in est.classes_]
+    np.testing.assert_allclose(est.predict_proba(X), refit.predict_proba(X)[:, order], atol=1e-10)
+
+
+def test_add_class_with_label_of_another_type(data):
+    X, y, X_new = data
+    est = ShrinkageDiscriminantAnalysis(incremental=True).fit(X, y)
+    est.add_class(X_new, "new")
+    assert list(est.classes_) == [1, 2, 3, "new"]
+    assert est.classes_.dtype == object
+    assert list(est.predict(X[:3])) == [1, 1, 1]
+    assert list(est.predict(X_new[:2])) == ["new", "new"]
+    assert list(est.y_[-2:]) == ["new", "new"]
+    # predict_proba columns follow classes_
+    proba = est.predict_proba(X_new)
+    np.testing.assert_array_equal(est.classes_[np.argmax(proba, axis=1)], est.predict(X_new))
+
+
+@pytest.mark.parametrize("p", [5, 40, 200])
+def test_adding_classes_in_turn_equals_refit(p):
+    rng = np.random.RandomState(p)
+    y = np.repeat([0, 1, 2], 15)
+    X = np.matmul(rng.randn(45, p), rng.randn(p, p) / np.sqrt(p)) + y[:, None]
+    est = ShrinkageDiscriminantAnalysis(incremental=True).fit(X, y)
+    lambda_cor = est.sdamodel_["regularisation"]["lambda_cor"]
+    X_all, y_all = X, y
+    for label, size in ((3, 1), (4, 12), (5, 30)):
+        X_new = rng.randn(size, p) * 2 + label
+        est.add_class(X_new, label)
+        X_all, y_all = np.vstack((X_all, X_new)), np.append(y_all, [label] * size)
+        refit = ShrinkageDiscriminantAnalysis(lambda_cor=lambda_cor).fit(X_all, y_all)
+        order = [list(refit.classes_).index(c) for c in est.classes_]
+        np.testing.assert_allclose(est.predict_proba(X_all), refit.predict_proba(X_all)[:, order], atol=1e-9)
+        np.testing.assert_allclose(est.sdamodel_["regularisation"]["lambda_var"],
+                                   refit.sdamodel_["regularisation"]["lambda_var"], rtol=1e-10)
+
+
+def test_add_class_after_weighted_fit_equals_refit(data):
+    X, y, X_new = data
+    w = np.arange(30) % 3 + 1
+    est = ShrinkageDiscriminantAnalysis(incremental=True).fit(X, y, sample_weight=w)
+    lambda_cor = est.sdamodel_["regularisation"]["lambda_cor"]
+    est.add_class(X_new, 0)
+    refit = ShrinkageDiscriminantAnalysis(lambda_cor=lambda_cor).fit(
+        np.vstack((np.repeat(X, w, axis=0), X_new)), np.append(np.repeat(y, w), [0] * len(X_new)))
+    order = [list(refit.classes_).index(c) for c in est.classes_]
+    np.testing.assert_allclose(est.predict_proba(X), refit.predict_proba(X)[:, order], atol=1e-10)
+
+
+def test_add_class_rejects_per_class_lambda_var(data):
+    from shrinkage_da.sda import sda
+    from shrinkage_da.sda_add_class import sda_add_class
+    X, y, X_new = data
+    model = sda(X, y, lambda_var=[0.2, 0.3, 0.4, 0.5], keep_stats=True)
+    with pytest.raises(ValueError, match="one lambda_var per class"):
+        sda_add_class(model, X_new, 0)
+    single = sda_add_class(sda(X, y, lambda_var=[0.3], keep_stats=True), X_new, 0)
+    assert single["regularisation"]["lambda_var"] == 0.3
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from shrinkage_da import BaggedShrinkageDiscriminantAnalysis
+from shrinkage_da.sda import sda
+from shrinkage_da.sda_bagging import sda_bagging
+from shrinkage_da.predict_sda import predict_sda
+
+
+@pytest.fixture
+def data():
+    rng = np.random.RandomState(1)
+    n, p = 45, 60
+    y = np.repeat([0, 1, 2], 15)
+    X = np.matmul(rng.randn(n, 3), rng.randn(3, p)) + 0.5 * rng.randn(n, p) + y[:, None]
+    return X, y
+
+
+def bootstrap_counts(y, n_estimators, random_state):
+    """The bags of sda_bagging (stratified, one seed per member) as counts"""
+    seeds = np.random.RandomState(random_state).randint(np.iinfo(np.int32).max, size=n_estimators)
+    bags = []
+    for seed in seeds:
+        rng = np.random.RandomState(seed)
+        rows = [rng.choice(np.flatnonzero(y == k), size=np.sum(y == k), replace=True)
+                for k in np.unique(y)]
+        bags.append(np.bincount(np.concatenate(rows), minlength=len(y)))
+    return bags
+
+
+def test_members_equal_fits_on_bootstrap_rows(data):
+    X, y = data
+    model = sda_bagging(X, y, n_estimators=3, n_jobs=1, random_state=0)
+    K = len(np.unique(y))
+    for b, counts in enumerate(bootstrap_counts(y, 3, 0)):
+        member = sda(np.repeat(X, counts, 0), np.repeat(y, counts))
+        for key in ("lambda_cor", "lambda_var", "lambda_freqs"):
+            np.testing.assert_allclose(model["members"][b]["regularisation"][key],
+                                       member["regularisation"][key], rtol=1e-10)
+        np.testing.assert_allclose(model["alpha"][b*K:(b+1)*K], member["alpha"], rtol=1e-10, atol=1e-10)
+        np.testing.assert_allclose(model["beta"][b*K:(b+1)*K], member["beta"], rtol=1e-10, atol=1e-10)
+
+
+def test_worker_processes_give_the_same_ensemble(data):
+    X, y = data
+    serial = sda_bagging(X, y, n_estimators=4, n_jobs=1, random_state=0)
+    parallel = sda_bagging(X, y, n_estimators=4, n_jobs=2, random_state=0)
+    np.testing.assert_array_equal(serial["beta"], parallel["beta"])
+    np.testing.assert_array_equal(serial["alpha"], parallel["alpha"])
+
+
+def test_ensemble_posterior_is_member_average(data):
+    X, y = data
+    est = BaggedShrinkageDiscriminantAnalysis(n_estimators=3, n_jobs=1, random_state=0).fit(X, y)
+    model = est.sdamodel_
+    K = len(est.classes_)
+    members = [predict_sda(dict(alpha=model["alpha"][b*K:(b+1)*K], beta=model["beta"][b*K:(b+1)*K],
+                                groups=model["groups"]), X)["posterior"] for b in range(3)]
+    np.testing.assert_allclose(est.predict_proba(X), np.mean(members, axis=0), rtol=1e-12, atol=1e-15)
@@ -0,0 +1,70 @@
+import csv
+
+import numpy as np
+import pytest
+
+from shrinkage_da import SdaPredictor
+from shrinkage_da.sda_cli import main
+from shrinkage_da.sda_ranking import sda_ranking
+
+
+@pytest.fixture
+def files(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    rng = np.random.RandomState(0)
+    y = np.repeat(["a", "b", "c"], 10)
+    X = rng.randn(30, 12) + 1.5 * (y == "b")[:, None] - 1.5 * (y == "c")[:, None]
+    with open(str(tmp_path / "x.csv"), "w") as f:
+        f.write("," + ",".join("g%d" % j for j in range(12)) + "\n")
+        for i, row in enumerate(X):
+            f.write('"s%d",' % i + ",".join(repr(float(v)) for v in row) + "\n")
+    with open(str(tmp_path / "y.csv"), "w") as f:
+        f.write('"","x"\n' + "".join('"%d","%s"\n' % (i + 1, label) for i, label in enumerate(y)))
+    return tmp_path, X, y
+
+
+def read_csv(path):
+    with open(str(path), newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_fit_and_predict(files):
+    tmp_path, X, y = files
+    assert main(["fit", str(tmp_path / "x.csv"), str(tmp_path / "y.csv"), "-o", str(tmp_path / "model"),
+                 "--top", "5"]) == 0
+    predictor = SdaPredictor.load(str(tmp_path / "model"))
+    assert sorted(predictor.idx) == sorted(sda_ranking(X, y)["idx"][:5])
+    assert main(["predict", str(tmp_path / "model"), str(tmp_path / "x.csv"), "-o", str(tmp_path / "p.csv"),
+                 "--proba", "--block-bytes", "200"]) == 0
+    rows = read_csv(tmp_path / "p.csv")
+    assert rows[0] == ["row", "predicted_class"] + list(predictor.classes_) # in the order of the model
+    assert [r[0] for r in rows[1:]] == ["s%d" % i for i in range(30)]
+    assert [r[1] for r in rows[1:]] == list(predictor.predict(X))
+    np.testing.assert_allclose(np.array([r[2:] for r in rows[1:]], dtype=float), predictor.predict_proba(X))
+
+
+def test_rank(files):
+    tmp_path, X, y = files
+    assert main(["rank", str(tmp_path / "x.csv"), str(tmp_path / "y.csv"), "-o", str(tmp_path / "r.csv"),
+                 "--top", "4", "--diagonal"]) == 0
+    rows = read_csv(tmp_path / "r.csv")
+    ranking = sda_ranking(X, y, diagonal=True)
+    assert rows[0] == ["rank", "column", "name", "score"]
+    assert [int(r[1]) for r in rows[1:]] == list(ranking["idx"][:4])
+    assert [r[2] for r in rows[1:]] == ["g%d" % j for j in ranking["idx"][:4]]
+    np.testing.assert_allclose([float(r[3]) for r in rows[1:]], ranking["score"][:4])
+
+
+def test_convert_and_cache_dir(files, capsys):
+    tmp_path, X, y = files
+    assert main(["convert", str(tmp_path / "x.csv"), "--cache-dir", str(tmp_path / "npy")]) == 0
+    out = capsys.readouterr().out
+    assert "30 x 12" in out and str(tmp_path / "npy") in out
+
+
+def test_errors_are_reported(files, capsys):
+    tmp_path, X, y = files
+    assert main(["predict", str(tmp_path / "missing"), str(tmp_path / "x.csv")]) == 1
+    assert "shrinkage-da: error:" in capsys.readouterr().err
+    (tmp_path / "bad.csv").write_text("1,2\n3\n")
+    assert main(["convert", str(tmp_path / "bad.csv")]) == 1
@@ -0,0 +1,109 @@
+import os
+
+import numpy as np
+import pytest
+
+from shrinkage_da import data_cache
+from shrinkage_da.data_cache import load_matrix, load_labels, cache_path
+
+
+@pytest.fixture(autouse=True)
+def user_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    return tmp_path / "cache" / "shrinkage_da" / "data"
+
+
+def write_csv(path, X, header=True, index_col=True):
+    with open(str(path), "w") as f:
+        if header:
+            f.write(",".join([""] * index_col + ["c%d" % j for j in range(X.shape[1])]) + "\n")
+        for i, row in enumerate(X):
+            f.write(",".join(['"r%d"' % i] * index_col + [repr(float(v)) for v in row]) + "\n")
+
+
+@pytest.fixture
+def X():
+    return np.random.RandomState(0).randn(50, 7)
+
+
+@pytest.mark.parametrize("header", [True, False])
+@pytest.mark.parametrize("index_col", [True, False])
+def test_names_are_detected(tmp_path, X, header, index_col):
+    path = tmp_path / "x.csv"
+    write_csv(path, X, header, index_col)
+    loaded, names = load_matrix(str(path), chunk_bytes=200) # many chunks
+    np.testing.assert_array_equal(loaded, X)
+    assert names["columns"] == (["c%d" % j for j in range(7)] if header else None)
+    assert names["rows"] == (["r%d" % i for i in range(50)] if index_col else None)
+
+
+def test_parsed_once_into_the_user_cache(tmp_path, X, user_cache, monkeypatch):
+    path = tmp_path / "x.csv"
+    write_csv(path, X)
+    first, _ = load_matrix(str(path))
+    assert isinstance(first, np.memmap)
+    assert os.path.dirname(first.filename) == str(user_cache)
+    assert sorted(os.listdir(str(tmp_path))) == ["cache", "x.csv"] # nothing next to the CSV file
+
+    def fail(*args):
+        raise AssertionError("parsed again")
+    monkeypatch.setattr(data_cache, "pvt_convert", fail)
+    again, _ = load_matrix(str(path))
+    np.testing.assert_array_equal(again, X)
+
+
+def test_changed_file_replaces_its_cache(tmp_path, X, user_cache):
+    path = tmp_path / "x.csv"
+    write_csv(path, X)
+    old = cache_path(str(path), header=True, index_col=True)
+    load_matrix(str(path))
+    write_csv(path, 2 * X)
+    os.utime(str(path), ns=(0, os.stat(str(path)).st_mtime_ns + 10**9))
+    loaded, _ = load_matrix(str(path))
+    np.testing.assert_array_equal(loaded, 2 * X)
+    assert not os.path.exists(old)
+    assert len([f for f in os.listdir(str(user_cache)) if f.endswith(".npy")]) == 1
+
+
+def test_files_of_the_same_name_keep_their_caches(tmp_path, X, user_cache):
+    for sub, scale in (("a", 1), ("b", 2)):
+        os.makedirs(str(tmp_path / sub))
+        write_csv(tmp_path / sub / "x.csv", scale * X)
+        load_matrix(str(tmp_path / sub / "x.csv"))
+    for sub, scale in (("a", 1), ("b", 2)):
+        np.testing.assert_array_equal(load_matrix(str(tmp_path / sub / "x.csv"))[0], scale * X)
+    assert len([f for f in os.listdir(str(user_cache)) if f.endswith(".npy")]) == 2
+
+
+def test_parse_error_leaves_no_files(tmp_path, X, user_cache):
+    path = tmp_path / "x.csv"
+    write_csv(path, X)
+    with open(str(path), "a") as f:
+        f.write('"r50",1.0,2.0\n') # a short row in the last chunk
+    with pytest.raises(ValueError):
+        load_matrix(str(path), chunk_bytes=300)
+    assert os.listdir(str(user_cache)) == []
+    empty = tmp_path / "empty.csv"
+    empty.write_text("a,b\n")
+    with pytest.raises(ValueError, match="no data"):
+        load_matrix(str(empty), header=True, index_col=False)
+    assert os.listdir(str(user_cache)) == []
+
+
+def test_cache_dir_and_npy_input(tmp_path, X):
+    path = tmp_path / "x.csv"
+    write_csv(path, X)
+    loaded, _ = load_matrix(str(path), cache_dir=str(tmp_path / "here"))
+    assert os.path.dirname(loaded.filename) == str(tmp_path / "here")
+    np.save(str(tmp_path / "x.npy"), X)
+    np.testing.assert_array_equal(load_matrix(str(tmp_path / "x.npy"))[0], X)
+
+
+def test_load_labels(tmp_path):
+    path = tmp_path / "y.csv"
+    path.write_text('"","x"\n"1",2\n"2",1\n"3",2\n')
+    np.testing.assert_array_equal(load_labels(str(path)), [2, 1, 2])
+    path.write_text("class\na\nb\na\n")
+    np.testing.assert_array_equal(load_labels(str(path)), ["a", "b", "a"])
+    path.write_text("1.5\n2\n")
+    np.testing.assert_array_equal(load_labels(str(path)), [1.5, 2.0])
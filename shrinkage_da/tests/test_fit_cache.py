@@ -0,0 +1,74 @@
+import os
+
+import numpy as np
+import pytest
+
+from shrinkage_da import ShrinkageDiscriminantAnalysis
+from shrinkage_da.fit_cache import FitCache
+
+
+def data():
+    rng = np.random.RandomState(0)
+    y = np.arange(60) % 3
+    return np.matmul(rng.randn(60, 4), rng.randn(4, 80)) + rng.randn(60, 80) + y[:, None], y
+
+
+def cache_result(est):
+    return [r["cache"] for r in est.fit_stats_ if r["stage"] == "fit_cache"]
+
+
+def test_refit_on_the_same_data_hits_the_cache(tmp_path):
+    X, y = data()
+    first = ShrinkageDiscriminantAnalysis(cache_dir=str(tmp_path), instrument=True).fit(X, y)
+    again = ShrinkageDiscriminantAnalysis(cache_dir=str(tmp_path), instrument=True, lambda_var=0.2).fit(X, y)
+    assert cache_result(first) == ["miss"]
+    assert cache_result(again) == ["hit"]
+    uncached = ShrinkageDiscriminantAnalysis(lambda_var=0.2).fit(X, y)
+    np.testing.assert_allclose(again.predict_proba(X), uncached.predict_proba(X), rtol=1e-10, atol=1e-14)
+
+
+@pytest.mark.parametrize("labels", [lambda y: y[::-1], lambda y: np.arange(60) % 4, lambda y: (y == 0).astype(str)])
+def test_new_labels_reuse_the_factor_of_the_data(tmp_path, labels):
+    X, y = data()
+    ShrinkageDiscriminantAnalysis(cache_dir=str(tmp_path)).fit(X, y)
+    relabelled = ShrinkageDiscriminantAnalysis(cache_dir=str(tmp_path), instrument=True).fit(X, labels(y))
+    assert cache_result(relabelled) == ["hit"]
+    uncached = ShrinkageDiscriminantAnalysis().fit(X, labels(y))
+    np.testing.assert_allclose(relabelled.sdamodel_["regularisation"]["lambda_cor"],
+                               uncached.sdamodel_["regularisation"]["lambda_cor"], rtol=1e-12)
+    np.testing.assert_allclose(relabelled.predict_proba(X), uncached.predict_proba(X), rtol=1e-10, atol=1e-14)
+    ranked = ShrinkageDiscriminantAnalysis(cache_dir=str(tmp_path)).feature_rank(X, labels(y))
+    reference = ShrinkageDiscriminantAnalysis().feature_rank(X, labels(y))
+    np.testing.assert_allclose(ranked.rankings_["score"], reference.rankings_["score"], rtol=1e-10)
+
+
+def test_new_weights_miss_the_cache(tmp_path):
+    X, y = data()
+    w = np.arange(60) % 2 + 1
+    ShrinkageDiscriminantAnalysis(cache_dir=str(tmp_path)).fit(X, y)
+    weighted = ShrinkageDiscriminantAnalysis(cache_dir=str(tmp_path), instrument=True).fit(X, y, sample_weight=w)
+    assert cache_result(weighted) == ["miss"]
+    relabelled = ShrinkageDiscriminantAnalysis(cache_dir=str(tmp_path), instrument=True).fit(
+        X, y[::-1], sample_weight=w)
+    assert cache_result(relabelled) == ["hit"]
+    uncached = ShrinkageDiscriminantAnalysis().fit(X, y[::-1], sample_weight=w)
+    np.testing.assert_allclose(relabelled.predict_proba(X), uncached.predict_proba(X), rtol=1e-10, atol=1e-14)
+
+
+def test_labels_key_hashes_dtype_and_values(tmp_path):
+    cache = FitCache(str(tmp_path))
+    keys = [cache.labels_key("k", labels) for labels in
+            ([1, 2, 1], ["1", "2", "1"], np.array([1, 2, 1], dtype=np.int32), [1.0, 2.0, 1.0],
+             np.array([1, "2", 1], dtype=object), np.array(["1", "2", 1], dtype=object), [2, 1, 1])]
+    assert len(set(keys)) == len(keys)
+    assert cache.labels_key("k", [1, 2, 1]) == cache.labels_key("k", np.array([1, 2, 1]))
+
+
+def test_estimated_lambda_cor_is_stored_per_label_set(tmp_path):
+    X, y = data()
+    for labels in (y, y.astype(str)):
+        ShrinkageDiscriminantAnalysis(cache_dir=str(tmp_path)).fit(X, labels)
+    # one entry of the data and one lambda_cor per label set
+    assert len([name for name in os.listdir(str(tmp_path)) if name.endswith(".npz")]) == 3
+    ShrinkageDiscriminantAnalysis(cache_dir=str(tmp_path), lambda_cor=0.3).fit(X, y[::-1])
+    assert len([name for name in os.listdir(str(tmp_path)) if name.endswith(".npz")]) == 3
@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+
+from shrinkage_da import ShrinkageDiscriminantAnalysis, SdaPredictor
+from shrinkage_da.frame_input import feature_names, select_columns
+from shrinkage_da.sda_io import load_sda, save_sda
+
+NAMES = ["f%d" % j for j in range(12)]
+
+
+@pytest.fixture
+def data():
+    rng = np.random.RandomState(0)
+    y = np.arange(40) % 2
+    return rng.randn(40, len(NAMES)) + y[:, None], y
+
+
+@pytest.fixture
+def pd():
+    return pytest.importorskip("pandas")
+
+
+@pytest.fixture
+def pa():
+    return pytest.importorskip("pyarrow")
+
+
+def test_pandas_columns_taken_by_name(pd, data):
+    X, y = data
+    est = ShrinkageDiscriminantAnalysis().fit(pd.DataFrame(X, columns=NAMES), y)
+    assert list(est.feature_names_in_) == NAMES
+    expected = est.predict_proba(X)
+    order = np.random.RandomState(1).permutation(len(NAMES))
+    permuted = pd.DataFrame(X[:, order], columns=[NAMES[j] for j in order])
+    np.testing.assert_array_equal(est.predict_proba(permuted), expected)
+    wider = pd.DataFrame(X, columns=NAMES)
+    wider.insert(3, "extra", np.ones(len(X)))
+    wider["label"] = ["a"] * len(X) # non-numeric columns the model does not use are not converted
+    np.testing.assert_array_equal(est.predict_proba(wider), expected)
+
+
+def test_pandas_missing_and_non_numeric_columns(pd, data):
+    X, y = data
+    est = ShrinkageDiscriminantAnalysis().fit(pd.DataFrame(X, columns=NAMES), y)
+    with pytest.raises(ValueError, match="Columns missing from the input: f4"):
+        est.predict(pd.DataFrame(X, columns=NAMES).drop(columns=["f4"]))
+    frame = pd.DataFrame(X, columns=NAMES)
+    frame["f4"] = ["x"] * len(X)
+    with pytest.raises(ValueError, match="numeric"):
+        est.predict(frame)
+
+
+def test_pandas_compact_model_reads_its_columns(pd, data, tmp_path):
+    X, y = data
+    est = ShrinkageDiscriminantAnalysis().fit(pd.DataFrame(X, columns=NAMES), y)
+    idx = np.array([7, 2, 9])
+    compact = ShrinkageDiscriminantAnalysis().fit(X[:, idx], y).sdamodel_
+    compact["feature_names"] = est.feature_names_in_
+    save_sda(compact, str(tmp_path / "model"), idx=idx)
+    predictor = SdaPredictor(load_sda(str(tmp_path / "model")))
+    order = np.random.RandomState(2).permutation(len(NAMES))
+    permuted = pd.DataFrame(X[:, order], columns=[NAMES[j] for j in order])
+    np.testing.assert_allclose(predictor.predict_proba(permuted), predictor.predict_proba(X), rtol=1e-12)
+
+
+def test_arrow_columns_taken_by_name(pa, data):
+    X, y = data
+    table = pa.table(dict((name, X[:, j]) for j, name in enumerate(NAMES)))
+    est = ShrinkageDiscriminantAnalysis().fit(table, y)
+    assert list(est.feature_names_in_) == NAMES
+    expected = est.predict_proba(X)
+    order = np.random.RandomState(1).permutation(len(NAMES))
+    permuted = pa.table(dict((NAMES[j], X[:, j]) for j in order))
+    np.testing.assert_array_equal(est.predict_proba(permuted), expected)
+    wider = permuted.append_column("label", pa.array(["a"] * len(X)))
+    np.testing.assert_array_equal(est.predict_proba(wider.to_batches()[0]), expected)
+
+
+def test_arrow_missing_and_non_numeric_columns(pa, data):
+    X, y = data
+    table = pa.table(dict((name, X[:, j]) for j, name in enumerate(NAMES)))
+    est = ShrinkageDiscriminantAnalysis().fit(table, y)
+    with pytest.raises(ValueError, match="Columns missing from the input: f4"):
+        est.predict(table.drop(["f4"]))
+    text = table.set_column(4, "f4", pa.array(["x"] * len(X)))
+    with pytest.raises(ValueError, match="numeric"):
+        est.predict(text)
+
+
+def test_select_columns_copies_into_fortran_order(pd, data):
+    X, _ = data
+    frame = pd.DataFrame(X, columns=NAMES)
+    selected = select_columns(frame, ["f3", "f1"])
+    assert selected.flags.f_contiguous
+    np.testing.assert_array_equal(selected, X[:, [3, 1]])
+    selected[:] = 0 # a copy, the frame is unchanged
+    np.testing.assert_array_equal(frame.to_numpy(), X)
+    assert feature_names(X) is None
+    assert feature_names(pd.DataFrame(X)) is None # integer column names: taken by position
+
+
+def test_ranking_methods_take_frames(pd, pa, data):
+    X, y = data
+    ref = ShrinkageDiscriminantAnalysis().feature_rank(X, y).rankings_
+    stability = ShrinkageDiscriminantAnalysis().stability_rank(X, y, 3, n_draws=4, n_jobs=1, random_state=0)
+    for frame in (pd.DataFrame(X, columns=NAMES), pa.table(dict(zip(NAMES, X.T)))):
+        est = ShrinkageDiscriminantAnalysis().feature_rank(frame, y)
+        np.testing.assert_array_equal(est.rankings_["idx"], ref["idx"])
+        est.stability_rank(frame, y, 3, n_draws=4, n_jobs=1, random_state=0)
+        np.testing.assert_array_equal(est.stability_["counts"], stability.stability_["counts"])
@@ -0,0 +1,31 @@
+import numpy as np
+
+from shrinkage_da import ShrinkageDiscriminantAnalysis
+
+
+def correlated_data(n=40, p=60, seed=0):
+    rng = np.random.RandomState(seed)
+    y = np.repeat([0, 1, 2], n // 3 + 1)[:n]
+    factor = rng.randn(n, 3)
+    X = np.matmul(factor, rng.randn(3, p)) + 0.5 * rng.randn(n, p) + y[:, None]
+    return X, y
+
+
+def test_fit_stats_include_corpcor_stages():
+    X, y = correlated_data()
+    est = ShrinkageDiscriminantAnalysis(instrument=True).fit(X, y)
+    assert est.sdamodel_["regularisation"]["lambda_cor"] < 1
+    stages = set(s["stage"] for s in est.fit_stats_)
+    assert {"sda", "centroids", "estimate_lambda_var", "estimate_lambda", "pvt_cppowscor",
+            "pvt_cppowscor_factor", "wt_scale", "fast_svd",
+            "fractional_matrix_power"} <= stages
+    svd = [s for s in est.fit_stats_ if s["stage"] == "fast_svd"]
+    assert all("branch" in s and "rank" in s for s in svd)
+    assert all(s["depth"] > 0 for s in est.fit_stats_ if s["stage"] != "sda")
+
+
+def test_instrument_callback_sees_corpcor_stages():
+    X, y = correlated_data()
+    seen = []
+    ShrinkageDiscriminantAnalysis(instrument_callback=seen.append).fit(X, y)
+    assert "estimate_lambda" in [s["stage"] for s in seen]
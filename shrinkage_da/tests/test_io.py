@@ -0,0 +1,48 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from shrinkage_da import ShrinkageDiscriminantAnalysis
+from shrinkage_da.sda_io import load_sda, save_sda
+
+
+def strict_json(path):
+    def reject(constant):
+        raise ValueError("invalid JSON constant " + constant)
+    with open(os.path.join(path, "model.json")) as f:
+        return json.load(f, parse_constant=reject)
+
+
+@pytest.fixture
+def data():
+    rng = np.random.RandomState(0)
+    y = np.arange(50) % 2
+    return np.matmul(rng.randn(50, 3), rng.randn(3, 30)) + rng.randn(50, 30) + y[:, None], y
+
+
+def test_grouped_model_round_trip(data, tmp_path):
+    X, y = data
+    groups = np.repeat(["a", "b", "c"], 10)
+    est = ShrinkageDiscriminantAnalysis(feature_groups=groups).fit(X, y)
+    assert np.isnan(est.sdamodel_["regularisation"]["lambda_cor"])
+    path = str(tmp_path / "model")
+    est.save(path)
+    assert strict_json(path)["regularisation"]["lambda_cor"] is None
+    loaded = ShrinkageDiscriminantAnalysis.load(path)
+    assert np.isnan(loaded.sdamodel_["regularisation"]["lambda_cor"])
+    np.testing.assert_array_equal(loaded.sdamodel_["feature_groups"]["groups"], ["a", "b", "c"])
+    np.testing.assert_array_equal(loaded.sdamodel_["feature_groups"]["lambda_cor"],
+                                  est.sdamodel_["feature_groups"]["lambda_cor"])
+    np.testing.assert_allclose(loaded.predict_proba(X), est.predict_proba(X), rtol=1e-12)
+
+
+def test_overwriting_a_grouped_model_removes_its_groups(data, tmp_path):
+    X, y = data
+    path = str(tmp_path / "model")
+    save_sda(ShrinkageDiscriminantAnalysis(feature_groups=np.arange(30) % 2).fit(X, y).sdamodel_, path)
+    save_sda(ShrinkageDiscriminantAnalysis().fit(X, y).sdamodel_, path)
+    loaded = load_sda(path)
+    assert "feature_groups" not in loaded
+    assert strict_json(path)["regularisation"]["lambda_cor"] == loaded["regularisation"]["lambda_cor"]
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from shrinkage_da import ShrinkageDiscriminantAnalysis
+from shrinkage_da.sda import sda
+from shrinkage_da.corpcor.shrink_intensity import (estimate_lambda, estimate_lambda_var, 
+                                                   estimate_lambda_subsample, estimate_lambda_var_subsample)
+
+
+def data(n=1200, p=300, seed=0):
+    rng = np.random.RandomState(seed)
+    return np.matmul(rng.randn(n, 20), rng.randn(20, p)) * 0.3 + rng.randn(n, p) * rng.uniform(0.5, 2, p)
+
+
+def test_subsample_estimate_is_close_to_exact():
+    x = data()
+    result = estimate_lambda_subsample(x, n_rows=400, n_cols=150, n_subsamples=8, tol=1, random_state=0)
+    assert not result["exact"]
+    assert len(result["estimates"]) == 8
+    np.testing.assert_allclose(result["se"], np.std(result["estimates"], ddof=1) / np.sqrt(8))
+    assert result["lambda_cor"] == pytest.approx(np.mean(result["estimates"]))
+    assert result["lambda_cor"] == pytest.approx(estimate_lambda(x), rel=0.05)
+    result = estimate_lambda_var_subsample(x, n_rows=400, n_cols=150, n_subsamples=8, tol=1, random_state=0)
+    assert result["lambda_var"] == pytest.approx(estimate_lambda_var(x), rel=0.1)
+
+
+def test_tolerance_is_relative_to_the_estimate():
+    x = data()
+    options = dict(n_rows=400, n_cols=150, n_subsamples=8, random_state=0)
+    approx = estimate_lambda_subsample(x, tol=1, **options)
+    relative_se = approx["se"] / approx["lambda_cor"]
+    accepted = estimate_lambda_subsample(x, tol=relative_se * 1.01, **options)
+    assert not accepted["exact"]
+    rejected = estimate_lambda_subsample(x, tol=relative_se * 0.99, **options)
+    assert rejected["exact"]
+    assert rejected["lambda_cor"] == estimate_lambda(x)
+    assert rejected["se"] == pytest.approx(approx["se"])
+
+
+def test_small_data_is_not_subsampled():
+    x = data(n=200, p=50)
+    result = estimate_lambda_subsample(x, random_state=0)
+    assert result["exact"] and result["se"] is None and result["estimates"] is None
+    assert result["lambda_cor"] == estimate_lambda(x)
+    with pytest.raises(ValueError, match="two subsamples"):
+        estimate_lambda_subsample(x, n_rows=100, n_subsamples=1)
+
+
+def test_lambda_approx_in_sda_and_estimator():
+    x = data(n=900, p=200)
+    y = np.arange(900) % 3
+    options = dict(n_rows=300, n_cols=100, n_subsamples=6, tol=1, random_state=1)
+    model = sda(x.copy(), y, lambda_approx=options)
+    approx = model["lambda_approx"]
+    assert model["regularisation"]["lambda_cor"] == approx["lambda_cor"]["lambda_cor"]
+    assert model["regularisation"]["lambda_var"] == approx["lambda_var"]["lambda_var"]
+    assert approx["lambda_cor"]["se"] > 0 and not approx["lambda_cor"]["exact"]
+    exact = sda(x.copy(), y)
+    assert model["regularisation"]["lambda_cor"] == pytest.approx(exact["regularisation"]["lambda_cor"], rel=0.05)
+    est = ShrinkageDiscriminantAnalysis(lambda_approx=options).fit(x, y)
+    assert est.sdamodel_["regularisation"]["lambda_cor"] == model["regularisation"]["lambda_cor"]
@@ -0,0 +1,35 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from shrinkage_da import ShrinkageDiscriminantAnalysis
+from shrinkage_da.corpcor.fast_svd import fast_svd
+
+
+def test_lean_model_is_small():
+    rng = np.random.RandomState(0)
+    X = rng.randn(200, 5000)
+    y = np.arange(200) % 3
+    est = ShrinkageDiscriminantAnalysis(store_training_data=False).fit(X, y)
+    assert "stats" not in est.sdamodel_
+    assert not hasattr(est, "X_")
+    # beta, scalings and centroid: a few p-vectors per class, not n x p
+    assert len(pickle.dumps(est)) < X.nbytes / 20
+
+
+def test_lean_mode_rejects_incremental():
+    rng = np.random.RandomState(0)
+    X, y = rng.randn(30, 40), np.arange(30) % 3
+    with pytest.raises(ValueError, match="store_training_data=False"):
+        ShrinkageDiscriminantAnalysis(store_training_data=False, incremental=True).fit(X, y)
+
+
+@pytest.mark.parametrize("route", ["gram_svd", "gram_eigh", "qr", "direct"])
+@pytest.mark.parametrize("shape", [(50, 400), (400, 50), (60, 60)])
+def test_float32_rank_uses_float32_eps(shape, route):
+    rng = np.random.RandomState(0)
+    m = np.matmul(rng.randn(shape[0], 5), rng.randn(5, shape[1])).astype(np.float32)
+    d, u, v = fast_svd(m, route=route)
+    assert d.dtype == np.float32
+    assert len(d) == 5
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from shrinkage_da import ShrinkageDiscriminantAnalysis
+from shrinkage_da.sda import sda
+from shrinkage_da.sda_path import sda_path
+from shrinkage_da.predict_sda import predict_sda
+
+
+def data(n, p, seed=0):
+    rng = np.random.RandomState(seed)
+    y = np.arange(n) % 3
+    X = np.matmul(rng.randn(n, p), rng.randn(p, p) / np.sqrt(p))
+    X[:, :5] += y[:, None]
+    return X, y
+
+
+@pytest.mark.parametrize("n", [40, 200]) # fewer and more samples than features
+@pytest.mark.parametrize("weighted", [False, True])
+@pytest.mark.parametrize("lambda_cor", [None, 0.4])
+def test_path_models_equal_sda_on_top_columns(n, weighted, lambda_cor):
+    X, y = data(n, 60)
+    w = np.random.RandomState(1).randint(1, 4, n) if weighted else None
+    path = sda_path(X, y, [1, 3, 10, 60, 25], lambda_cor=lambda_cor, w=w)
+    assert path["ks"] == [1, 3, 10, 25, 60]
+    for k, model in zip(path["ks"], path["models"]):
+        idx = model["idx"]
+        np.testing.assert_array_equal(np.sort(path["idx"][:k]), idx)
+        reference = sda(X[:, idx], y, lambda_cor=lambda_cor, w=w)
+        for key in ("lambda_cor", "lambda_var"):
+            np.testing.assert_allclose(model["regularisation"][key], reference["regularisation"][key],
+                                       rtol=1e-10, atol=1e-12)
+        np.testing.assert_allclose(model["beta"], reference["beta"], rtol=1e-9, atol=1e-12)
+        np.testing.assert_allclose(model["alpha"], reference["alpha"], rtol=1e-9, atol=1e-12)
+        np.testing.assert_allclose(predict_sda(model, X)["posterior"],
+                                   predict_sda(reference, X[:, idx])["posterior"], atol=1e-10)
+
+
+def test_path_validation_error():
+    X, y = data(150, 30)
+    Xtest, ytest = data(90, 30, seed=3)
+    path = sda_path(X, y, [2, 5, 30], Xtest=Xtest, Ltest=ytest)
+    expected = [np.mean(predict_sda(model, Xtest)["predicted_class"] != ytest) for model in path["models"]]
+    np.testing.assert_array_equal(path["error"], expected)
+    assert np.all((path["error"] >= 0) & (path["error"] < 0.5))
+
+
+def test_fit_path_takes_data_frames():
+    pd = pytest.importorskip("pandas")
+    X, y = data(80, 12)
+    names = ["f%d" % j for j in range(12)]
+    frame = pd.DataFrame(X, columns=names)
+    est = ShrinkageDiscriminantAnalysis()
+    # validation columns in another order are taken by name
+    est.fit_path(frame, y, [3, 12], X_test=frame[names[::-1]], y_test=y)
+    reference = ShrinkageDiscriminantAnalysis().fit_path(X, y, [3, 12], X_test=X, y_test=y)
+    np.testing.assert_array_equal(est.path_["error"], reference.path_["error"])
+    model = est.path_["models"][0]
+    np.testing.assert_allclose(predict_sda(model, X)["posterior"],
+                               predict_sda(reference.path_["models"][0], X)["posterior"])
+    np.testing.assert_array_equal(model["feature_names"], names)
+
+
+def test_fit_path_rejects_non_finite_input():
+    X, y = data(50, 8)
+    X[3, 2] = np.nan
+    with pytest.raises(ValueError, match="NaN"):
+        ShrinkageDiscriminantAnalysis().fit_path(X, y, [2])
+    with pytest.raises(ValueError, match="NaN"):
+        ShrinkageDiscriminantAnalysis(store_training_data=False).fit_path(X, y, [2])
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from shrinkage_da import ShrinkageDiscriminantAnalysis
+from shrinkage_da import sda_plan
+from shrinkage_da.sda_plan import plan_fit, plan_route
+from shrinkage_da.corpcor import svd_autotune
+
+# measured / predicted must lie within these factors
+MEMORY_TOLERANCE = 1.25
+TIME_TOLERANCE = 3.0
+SHAPES = [(100, 1000, 3), (400, 400, 3), (1000, 200, 4)]
+
+
+def data(n, p, n_classes, seed=0):
+    rng = np.random.RandomState(seed)
+    y = np.arange(n) % n_classes
+    return np.matmul(rng.randn(n, 5), rng.randn(5, p)) + rng.randn(n, p) + y[:, None], y
+
+
+def stage_time(stats, name):
+    """Wall time of the outermost records of a stage"""
+    total, stack = 0.0, []
+    for record in stats:
+        if record["stage"] == name and name not in stack[:record["depth"]]:
+            total += record["wall_time"]
+        stack = stack[:record["depth"]] + [record["stage"]]
+    return total
+
+
+def within(measured, predicted, tolerance):
+    return predicted / tolerance <= measured <= predicted * tolerance
+
+
+@pytest.mark.parametrize("route", sda_plan.ROUTES)
+@pytest.mark.parametrize("in_place", [False, True])
+@pytest.mark.parametrize("shape", SHAPES)
+def test_planned_peak_memory(shape, route, in_place):
+    plan = plan_route(*shape, route=route, in_place=in_place)
+    X, y = data(*shape)
+    est = ShrinkageDiscriminantAnalysis(instrument=True, **plan["options"]).fit(X, y)
+    peak = [r for r in est.fit_stats_ if r["stage"] == "sda"][0]["peak_bytes"]
+    assert within(peak, plan["peak_memory"], MEMORY_TOLERANCE), (peak, plan["peak_memory"])
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+def test_planned_stage_times(shape):
+    plan = plan_route(*shape, route="full")
+    runs = []
+    for _ in range(3): # best of three against timing noise
+        X, y = data(*shape)
+        runs.append(ShrinkageDiscriminantAnalysis(instrument="time").fit(X, y).fit_stats_)
+    for stage in plan["stages"]:
+        measured = min(stage_time(stats, stage["stage"]) for stats in runs)
+        if measured == 0: # not a separate stage of the fit
+            continue
+        assert within(measured, stage["time"], TIME_TOLERANCE), (stage, measured)
+    total = min(stage_time(stats, "sda") for stats in runs)
+    assert within(total, plan["time"], TIME_TOLERANCE), (total, plan["time"])
+
+
+def test_fit_raises_if_no_route_fits_memory_budget():
+    X, y = data(100, 1000, 3)
+    cheapest = min(r["peak_memory"] for r in plan_fit(100, 1000, 3)["routes"])
+    with pytest.raises(ValueError, match="No way of fitting"):
+        ShrinkageDiscriminantAnalysis(memory_budget=cheapest // 2).fit(X, y)
+
+
+def test_fit_takes_the_route_within_memory_budget():
+    X, y = data(400, 400, 3)
+    routes = dict((r["route"], r) for r in plan_fit(400, 400, 3)["routes"])
+    budget = routes["diagonal"]["peak_memory"]
+    assert budget < routes["approx"]["peak_memory"]
+    est = ShrinkageDiscriminantAnalysis(memory_budget=budget).fit(X, y)
+    assert est.fit_plan_["chosen"] == "diagonal"
+    assert est.sdamodel_["was_diagonal"]
+
+
+def test_planner_uses_autotuned_svd_cost_model(tmp_path):
+    coefs = {"gram_svd/values": (1.0, 0.0, 0.0), "gram_svd/v": (2.0, 0.0, 0.0),
+             "direct/values": (3.0, 0.0, 0.0), "direct/v": (4.0, 0.0, 0.0)}
+    path = str(tmp_path / "model.json")
+    svd_autotune.SvdCostModel(coefs).save(path)
+    try:
+        model = svd_autotune.enable_autotune(path)
+        assert sda_plan.pvt_fast_svd._cost_model is model
+        assert sda_plan.pvt_svd_time(50, 500, False, sda_plan.machine_rates()) == 1.0
+        assert sda_plan.pvt_svd_time(50, 500, True, sda_plan.machine_rates()) == 2.0
+    finally:
+        svd_autotune.disable_autotune()
+    assert sda_plan.pvt_fast_svd._cost_model is None
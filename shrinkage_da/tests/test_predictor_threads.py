@@ -0,0 +1,62 @@
+import threading
+
+import numpy as np
+import pytest
+
+from shrinkage_da import ShrinkageDiscriminantAnalysis, BaggedShrinkageDiscriminantAnalysis, SdaPredictor
+
+
+@pytest.fixture(params=["float64", "int8", "bagged"])
+def predictor(request, tmp_path):
+    rng = np.random.RandomState(0)
+    y = np.arange(60) % 4
+    X = rng.randn(60, 25) + y[:, None]
+    if request.param == "bagged":
+        est = BaggedShrinkageDiscriminantAnalysis(n_estimators=3, n_jobs=1, random_state=0).fit(X, y)
+        est.save(str(tmp_path / "model"))
+    else:
+        est = ShrinkageDiscriminantAnalysis().fit(X, y)
+        est.save(str(tmp_path / "model"), beta_dtype=None if request.param == "float64" else request.param)
+    predictor = SdaPredictor.load(str(tmp_path / "model"))
+    predictor.block_bytes = 8 * 25 * 7 # blocks of 7 rows, so that the scratch buffers are reused
+    return predictor
+
+
+def test_threads_share_one_predictor(predictor):
+    rng = np.random.RandomState(1)
+    inputs = [rng.randn(int(rng.randint(1, 40)), 25) for _ in range(32)]
+    expected = [(predictor.predict_proba(X), predictor.predict(X), predictor.decision_function(X),
+                 predictor.predict_topk(X, 2)) for X in inputs]
+    n_threads = 8
+    barrier = threading.Barrier(n_threads)
+    errors = []
+
+    def work(offset):
+        try:
+            barrier.wait()
+            for repeat in range(5):
+                for i in range(offset, len(inputs), n_threads // 2):
+                    proba = predictor.predict_proba(inputs[i])
+                    labels = predictor.predict(inputs[i])
+                    scores = predictor.decision_function(inputs[i])
+                    top = predictor.predict_topk(inputs[i], 2)
+                    ref = expected[i]
+                    if not (np.array_equal(proba, ref[0]) and np.array_equal(labels, ref[1])
+                            and np.array_equal(scores, ref[2]) and np.array_equal(top[0], ref[3][0])
+                            and np.array_equal(top[1], ref[3][1])):
+                        errors.append((offset, repeat, i))
+        except Exception as e: # reported by the main thread
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(t % (n_threads // 2),)) for t in range(n_threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+
+
+def test_model_arrays_are_read_only(predictor):
+    for name in ("alpha", "beta"):
+        with pytest.raises(ValueError):
+            getattr(predictor, name)[...] = 0
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+from shrinkage_da import ShrinkageDiscriminantAnalysis
+from shrinkage_da.sda import sda
+from shrinkage_da.catscore import catscore
+from shrinkage_da.sda_ranking import sda_ranking
+from shrinkage_da.predict_sda import predict_sda
+from shrinkage_da.prefilter import find_redundant_features
+
+
+@pytest.fixture
+def data():
+    """20 informative columns and, interleaved, 2 constant columns and 3
+    copies of columns (column 3 twice, column 7 once)"""
+    rng = np.random.RandomState(0)
+    y = np.repeat([0, 1, 2], 10)
+    base = rng.randn(30, 20) + y[:, None] * np.linspace(0, 1, 20)
+    columns = list(range(20))
+    X = np.column_stack([base[:, :5], np.full(30, 2.5), base[:, 3], base[:, 5:12],
+                         base[:, 7], np.zeros(30), base[:, 12:], base[:, 3]])
+    source = columns[:5] + [-1, 3] + columns[5:12] + [7, -1] + columns[12:] + [3]
+    Xtest = rng.randn(6, 20)
+    Xtest_full = Xtest[:, [max(s, 0) for s in source]]
+    Xtest_full[:, np.asarray(source) < 0] = X[0, np.asarray(source) < 0]
+    return X, y, base, np.asarray(source), Xtest, Xtest_full
+
+
+def test_find_redundant_features(data):
+    X, y, base, source, _, _ = data
+    X = X.copy()
+    X[0, [3, 6, 24]] = [0.0, -0.0, 0.0] # copies differing in the sign of a zero
+    redundant = find_redundant_features(X)
+    assert redundant["n_constant"] == 2 and redundant["n_duplicate"] == 3
+    keep = redundant["keep"]
+    np.testing.assert_array_equal(source[keep], np.arange(20))
+    rep = redundant["representative"]
+    np.testing.assert_array_equal(rep < 0, source < 0)
+    np.testing.assert_array_equal(keep[rep[source >= 0]], keep[source[source >= 0]])
+    assert redundant["copies"][3] == 3 and redundant["copies"][7] == 2
+    np.testing.assert_allclose(redundant["means"][source < 0], [2.5, 0])
+
+
+def test_var_tol_drops_near_constant_columns(data):
+    X = data[0].copy()
+    X[:, 0] = 1 + 1e-9 * np.arange(30)
+    assert find_redundant_features(X)["n_constant"] == 2
+    assert find_redundant_features(X, var_tol=1e-6)["n_constant"] == 3
+
+
+@pytest.mark.parametrize("diagonal", [False, True])
+def test_model_maps_back_to_all_columns(data, diagonal):
+    X, y, base, source, Xtest, Xtest_full = data
+    full = sda(X, y, diagonal=diagonal, prefilter=True)
+    reduced = sda(base, y, diagonal=diagonal)
+    assert full["beta"].shape == (3, X.shape[1])
+    assert full["prefilter"]["n_constant"] == 2 and full["prefilter"]["n_duplicate"] == 3
+    kept = source >= 0
+    copies = np.bincount(source[kept], minlength=20)
+    np.testing.assert_allclose(full["beta"][:, kept],
+                               reduced["beta"][:, source[kept]] / copies[source[kept]], rtol=1e-10)
+    assert np.all(full["beta"][:, ~kept] == 0)
+    np.testing.assert_allclose(full["alpha"], reduced["alpha"], rtol=1e-10)
+    np.testing.assert_allclose(predict_sda(full, Xtest_full)["posterior"],
+                               predict_sda(reduced, Xtest)["posterior"], rtol=1e-10)
+
+
+def test_cat_scores_and_ranking_map_back(data):
+    X, y, base, source, _, _ = data
+    kept = source >= 0
+    cat = catscore(X, y, prefilter=True)
+    reduced = catscore(base, y)
+    np.testing.assert_allclose(cat["cat"][kept], reduced["cat"][source[kept]], rtol=1e-10)
+    assert np.all(cat["cat"][~kept] == 0)
+    ranking = sda_ranking(X, y, prefilter=True)
+    assert sorted(ranking["idx"]) == list(range(X.shape[1]))
+    np.testing.assert_allclose(ranking["cat"], cat["cat"][ranking["idx"]], rtol=1e-10)
+    assert set(ranking["idx"][-2:]) == set(np.flatnonzero(~kept)) # zero scores rank last
+    reduced_ranking = sda_ranking(base, y)
+    best = ranking["idx"][0]
+    assert source[best] == reduced_ranking["idx"][0]
+    np.testing.assert_allclose(ranking["score"][0], reduced_ranking["score"][0], rtol=1e-10)
+    assert ranking["prefilter"]["n_duplicate"] == 3
+
+
+def test_estimator_predicts_on_all_columns(data):
+    X, y, base, source, Xtest, Xtest_full = data
+    est = ShrinkageDiscriminantAnalysis(prefilter=True).fit(X, y)
+    reduced = ShrinkageDiscriminantAnalysis().fit(base, y)
+    np.testing.assert_allclose(est.predict_proba(Xtest_full), reduced.predict_proba(Xtest), rtol=1e-10)
+    assert est.sdamodel_["prefilter"]["n_constant"] == 2
+
+
+def test_add_class_refuses_prefiltered_models(data):
+    X, y = data[0], data[1]
+    est = ShrinkageDiscriminantAnalysis(prefilter=True, incremental=True).fit(X, y)
+    with pytest.raises(ValueError, match="prefilter"):
+        est.add_class(X[:5] + 3, 3)
+    # nothing to drop: an ordinary model, classes can be added
+    base = data[2]
+    est = ShrinkageDiscriminantAnalysis(prefilter=True, incremental=True).fit(base, y)
+    assert "prefilter" not in est.sdamodel_
+    est.add_class(base[:5] + 3, 3)
+    assert list(est.classes_) == [0, 1, 2, 3]
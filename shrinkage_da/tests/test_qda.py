@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+from scipy.stats import multivariate_normal
+
+from shrinkage_da import ShrinkageDiscriminantAnalysis
+from shrinkage_da.sda_qda import sda_qda
+from shrinkage_da.predict_sda import predict_sda
+
+
+@pytest.fixture
+def data():
+    rng = np.random.RandomState(0)
+    y = np.repeat([1, 2, 3], [12, 15, 10])
+    X = rng.randn(len(y), 8) * (1 + y[:, None]) + y[:, None]
+    X[:, 1] += X[:, 0] * y # correlations differ between the classes
+    return X, y, rng.randn(6, 8) * 3 + 2
+
+
+def dense_posterior(model, X, y, Xtest):
+    """Posteriors with the covariance matrices of the classes formed explicitly"""
+    qda = model["qda"]
+    logp = np.empty((len(Xtest), len(model["groups"]) - 1))
+    for k, label in enumerate(model["groups"][:-1]):
+        R = np.corrcoef(X[y == label], rowvar=False)
+        lam = qda["lambda_cor"][k]
+        R = lam * np.eye(X.shape[1]) + (1 - lam) * R
+        S = R * np.outer(qda["scale"][:, k], qda["scale"][:, k])
+        logp[:, k] = np.log(model["freqs"][k]) + multivariate_normal(qda["means"][:, k], S).logpdf(Xtest)
+    p = np.exp(logp - logp.max(axis=1, keepdims=True))
+    return p / p.sum(axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("lambda_cor", [None, 0.3])
+def test_posterior_matches_dense_gaussian(data, lambda_cor):
+    X, y, Xtest = data
+    model = sda_qda(X, y, lambda_cor=lambda_cor)
+    np.testing.assert_allclose(predict_sda(model, Xtest)["posterior"],
+                               dense_posterior(model, X, y, Xtest), atol=1e-10)
+
+
+def test_posterior_matches_dense_gaussian_p_larger_than_n(data):
+    rng = np.random.RandomState(1)
+    y = np.repeat([0, 1], 6)
+    X = rng.randn(12, 20) + y[:, None]
+    model = sda_qda(X, y, lambda_cor=0.4)
+    Xtest = rng.randn(5, 20)
+    np.testing.assert_allclose(predict_sda(model, Xtest)["posterior"],
+                               dense_posterior(model, X, y, Xtest), atol=1e-10)
+
+
+def test_per_class_lambda_cor(data):
+    X, y, Xtest = data
+    lambdas = [0.2, 0.5, 0.8]
+    model = sda_qda(X, y, lambda_cor=lambdas)
+    np.testing.assert_allclose(model["qda"]["lambda_cor"], lambdas)
+    np.testing.assert_allclose(predict_sda(model, Xtest)["posterior"],
+                               dense_posterior(model, X, y, Xtest), atol=1e-10)
+    with pytest.raises(ValueError, match="one value per class"):
+        sda_qda(X, y, lambda_cor=[0.2, 0.5])
+
+
+def test_diagonal(data):
+    X, y, Xtest = data
+    model = sda_qda(X, y, diagonal=True)
+    assert model["was_diagonal"]
+    assert all(V.shape[1] == 0 for V in model["qda"]["factors"])
+    np.testing.assert_allclose(predict_sda(model, Xtest)["posterior"],
+                               dense_posterior(dict(model, qda=dict(model["qda"], lambda_cor=np.ones(3))),
+                                               X, y, Xtest), atol=1e-10)
+
+
+def test_class_with_one_sample(data):
+    X, y, _ = data
+    y = y.copy()
+    y[0] = 4
+    for lambda_var in [None, 0.5]:
+        with pytest.raises(ValueError, match="at least two samples"):
+            sda_qda(X, y, lambda_var=lambda_var)
+    w = np.ones(len(y))
+    w[y == 3] = 0
+    w[np.flatnonzero(y == 3)[0]] = 1 # ten rows, total weight one
+    with pytest.raises(ValueError, match="at least two samples"):
+        sda_qda(X, data[1], w=w)
+
+
+def test_lambda_cor_zero_singular():
+    rng = np.random.RandomState(2)
+    y = np.repeat([0, 1], 5)
+    X = rng.randn(10, 20) # p > n_k: the class correlation matrices are singular
+    with pytest.raises(ValueError, match="singular"):
+        sda_qda(X, y, lambda_cor=0)
+
+
+def test_estimator_uses_qda(data):
+    X, y, Xtest = data
+    est = ShrinkageDiscriminantAnalysis(class_covariance=True).fit(X, y)
+    assert "qda" in est.sdamodel_
+    order = [list(est.sdamodel_["groups"]).index(c) for c in est.classes_]
+    np.testing.assert_allclose(est.predict_proba(Xtest),
+                               dense_posterior(est.sdamodel_, X, y, Xtest)[:, order], atol=1e-10)
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from shrinkage_da.sda import sda
+from shrinkage_da.sda_io import load_sda, save_sda
+from shrinkage_da.sda_quantize import quantize_sda, quantization_report
+
+
+@pytest.fixture
+def model():
+    rng = np.random.RandomState(0)
+    y = np.arange(60) % 3
+    X = rng.randn(60, 50) + y[:, None]
+    return sda(X, y), X
+
+
+@pytest.mark.parametrize("first", ["float16", "int8"])
+@pytest.mark.parametrize("second", ["float16", "int8"])
+def test_quantized_model_is_not_quantized_again(model, first, second):
+    quantized = quantize_sda(model[0], first)
+    with pytest.raises(ValueError, match="already quantized"):
+        quantize_sda(quantized, second)
+
+
+def test_loaded_float16_model_is_not_quantized_again(model, tmp_path):
+    save_sda(model[0], str(tmp_path / "m16"), beta_dtype="float16")
+    loaded = load_sda(str(tmp_path / "m16"))
+    assert loaded["beta"].dtype == np.float16
+    with pytest.raises(ValueError, match="already quantized"):
+        save_sda(loaded, str(tmp_path / "m8"), beta_dtype="int8")
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_quantized_posteriors_close(model, dtype):
+    report = quantization_report(model[0], model[1], dtype)
+    assert report["argmax_agreement"] == 1.0
+    assert report["max_abs_posterior_diff"] < 0.05
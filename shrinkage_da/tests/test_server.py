@@ -0,0 +1,164 @@
+import asyncio
+import json
+import threading
+import time
+
+import numpy as np
+
+from shrinkage_da import ShrinkageDiscriminantAnalysis, SdaPredictor
+from shrinkage_da.sda_server import BatchingPredictor, serve_sda
+
+P = 5
+
+
+class SlowModel(object):
+    """A model whose batches take delay seconds, signalling when one starts"""
+    def __init__(self, model, delay):
+        self.model = model
+        self.delay = delay
+        self.classes_ = model.classes_
+        self.started = threading.Event()
+
+    def predict_proba(self, X):
+        self.started.set()
+        time.sleep(self.delay)
+        return self.model.predict_proba(X)
+
+
+def save_models(root):
+    rng = np.random.RandomState(0)
+    X = rng.randn(40, P)
+    y = np.arange(40) % 2
+    ShrinkageDiscriminantAnalysis().fit(X + y[:, None], y).save(str(root / "v1"))
+    ShrinkageDiscriminantAnalysis().fit(X - y[:, None], y + 5).save(str(root / "v2"))
+    return SdaPredictor.load(str(root / "v1")), SdaPredictor.load(str(root / "v2"))
+
+
+async def http(port, method, target, payload=None, raw=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = raw if raw is not None else (b"" if payload is None else json.dumps(payload).encode())
+    head = "%s %s HTTP/1.1\r\nHost: localhost\r\nContent-Length: %d\r\nConnection: close\r\n\r\n"
+    writer.write((head % (method, target, len(body))).encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode().partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    result = json.loads(await reader.readexactly(length))
+    writer.close()
+    return status, result
+
+
+def check_posterior(result, predictors, x):
+    """The result was computed by the model whose classes it reports"""
+    model = dict((tuple(m.classes_.tolist()), m) for m in predictors)[tuple(result["classes"])]
+    np.testing.assert_allclose(result["posterior"], model.predict_proba(np.atleast_2d(x)), rtol=1e-10)
+
+
+def test_server_batches_swaps_and_reports(tmp_path):
+    v1, v2 = save_models(tmp_path)
+    X = np.random.RandomState(1).randn(30, P)
+
+    async def main():
+        slow = SlowModel(v1, delay=0.2)
+        async with BatchingPredictor(slow, max_batch_size=64, max_latency=0.05) as batcher:
+            server = await serve_sda(batcher, port=0, model_dir=str(tmp_path))
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                # concurrent single-row requests are coalesced into batches
+                replies = await asyncio.gather(*[http(port, "POST", "/predict", dict(X=X[i].tolist()))
+                                                 for i in range(20)])
+                for i, (status, result) in enumerate(replies):
+                    assert status == 200
+                    assert result["classes"] == [0, 1]
+                    check_posterior(result, (v1,), X[i])
+                assert batcher.stats()["n_batches"] < 20
+
+                # hot swap while a batch is running and more requests are queued
+                slow.started.clear()
+                running = [asyncio.ensure_future(http(port, "POST", "/predict", dict(X=X[i].tolist())))
+                           for i in range(20, 25)]
+                await asyncio.get_event_loop().run_in_executor(None, slow.started.wait)
+                queued = [asyncio.ensure_future(http(port, "POST", "/predict", dict(X=X[i].tolist())))
+                          for i in range(25, 30)]
+                status, swapped = await http(port, "POST", "/model", dict(path="v2"))
+                assert status == 200 and swapped["classes"] == [5, 6]
+                replies = await asyncio.gather(*(running + queued))
+                for i, (status, result) in enumerate(replies):
+                    assert status == 200 # no request is dropped
+                    check_posterior(result, (v1, v2), X[20 + i])
+                # the batch running during the swap finishes with the old model
+                assert any(result["classes"] == [0, 1] for _, result in replies[:5])
+                status, result = await http(port, "POST", "/predict", dict(X=X[:2].tolist()))
+                assert status == 200 and result["classes"] == [5, 6]
+                check_posterior(result, (v2,), X[:2])
+
+                # bad input is answered with 400 and does not stop the server
+                assert (await http(port, "POST", "/predict", raw=b"{not json"))[0] == 400
+                assert (await http(port, "POST", "/predict", dict(Y=[1.0] * P)))[0] == 400
+                assert (await http(port, "POST", "/predict", dict(X=[[1.0, 2.0], [3.0]])))[0] == 400
+                status, result = await http(port, "POST", "/predict", dict(X=[1.0] * (P + 1)))
+                assert status == 400 and "error" in result
+                assert (await http(port, "POST", "/model", dict(path="missing")))[0] == 400
+                assert (await http(port, "POST", "/model", dict(path="../" + tmp_path.name + "/v1")))[0] == 200
+                assert (await http(port, "POST", "/model", dict(path="..")))[0] == 403
+                assert (await http(port, "POST", "/model", dict(path=str(tmp_path / "v1"))))[0] == 200
+                assert (await http(port, "POST", "/model", dict(path="/etc")))[0] == 403
+                assert (await http(port, "GET", "/nothing"))[0] == 404
+
+                status, stats = await http(port, "GET", "/stats")
+        assert status == 200
+        assert stats["n_requests"] == 20 + 10 + 1 + 1 # the request with the wrong width reached the model
+        assert stats["n_swaps"] == 3
+        assert sum(count for _, count in stats["latency_histogram"]) == stats["n_requests"]
+        assert sum(count for _, count in stats["batch_size_histogram"]) == stats["n_batches"]
+        assert 0 < stats["latency_p50"] <= stats["latency_p99"]
+
+    asyncio.run(main())
+
+
+def test_server_refuses_model_loading_without_model_dir(tmp_path):
+    v1, _ = save_models(tmp_path)
+
+    async def main():
+        async with BatchingPredictor(v1) as batcher:
+            server = await serve_sda(batcher, port=0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                status, result = await http(port, "POST", "/model", dict(path=str(tmp_path / "v2")))
+                assert status == 403
+                status, result = await http(port, "POST", "/predict", dict(X=[0.0] * P))
+                assert status == 200 and result["classes"] == [0, 1]
+        assert batcher.stats()["n_swaps"] == 0
+
+    asyncio.run(main())
+
+
+def test_server_refuses_large_bodies(tmp_path):
+    v1, _ = save_models(tmp_path)
+
+    async def main():
+        async with BatchingPredictor(v1) as batcher:
+            server = await serve_sda(batcher, port=0, max_body_bytes=1000)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                status, result = await http(port, "POST", "/predict", dict(X=[[0.0] * P] * 5))
+                assert status == 200
+                status, result = await http(port, "POST", "/predict", dict(X=[[0.0] * P] * 100))
+                assert status == 413 and "1000 bytes" in result["error"]
+                # a huge Content-Length is refused without waiting for the body
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.write(b"POST /predict HTTP/1.1\r\nContent-Length: 1000000000\r\n\r\n")
+                await writer.drain()
+                assert (await asyncio.wait_for(reader.readline(), 5)).split()[1] == b"413"
+                writer.close()
+                status, result = await http(port, "POST", "/predict", raw=b"{}")
+                assert status == 400
+        assert batcher.stats()["n_requests"] == 1
+
+    asyncio.run(main())
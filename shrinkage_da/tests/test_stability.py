@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from shrinkage_da import ShrinkageDiscriminantAnalysis
+from shrinkage_da.stability_rank import stability_rank
+
+
+@pytest.fixture
+def data():
+    rng = np.random.RandomState(0)
+    y = np.repeat(["a", "b", "c"], 12)
+    X = rng.randn(36, 30)
+    X[:, :4] += 1.5 * (y == "b")[:, None] - 1.5 * (y == "c")[:, None]
+    return X, y
+
+
+@pytest.mark.parametrize("replace", [False, True])
+def test_pool_and_serial_counts_are_identical(data, replace):
+    X, y = data
+    serial = stability_rank(X, y, top_k=5, n_draws=12, replace=replace, n_jobs=1, random_state=3)
+    pooled = stability_rank(X, y, top_k=5, n_draws=12, replace=replace, n_jobs=2, random_state=3)
+    np.testing.assert_array_equal(serial["counts"], pooled["counts"])
+    np.testing.assert_array_equal(serial["idx"], pooled["idx"])
+    assert serial["counts"].sum() == 12 * 5
+    assert set(serial["idx"][:4]) == {0, 1, 2, 3}
+    np.testing.assert_allclose(serial["freq"], serial["counts"][serial["idx"]] / 12)
+    assert np.all(np.diff(serial["freq"]) <= 0)
+
+
+def test_top_k_is_checked(data):
+    X, y = data
+    for top_k in (0, 31):
+        with pytest.raises(ValueError, match="top_k"):
+            stability_rank(X, y, top_k=top_k, n_jobs=1)
+
+
+def test_estimator_validates_like_fit(data):
+    X, y = data
+    est = ShrinkageDiscriminantAnalysis(store_training_data=False)
+    est.stability_rank(X, y, top_k=5, n_draws=6, n_jobs=1, random_state=0)
+    ref = stability_rank(X, y, top_k=5, n_draws=6, n_jobs=1, random_state=0)
+    np.testing.assert_array_equal(est.stability_["counts"], ref["counts"])
+    assert list(est.classes_) == ["a", "b", "c"]
+    assert not hasattr(est, "X_")
+    X_nan = X.copy()
+    X_nan[0, 0] = np.nan
+    with pytest.raises(ValueError, match="NaN"):
+        est.stability_rank(X_nan, y, top_k=5, n_jobs=1)
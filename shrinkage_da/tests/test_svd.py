@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from shrinkage_da.corpcor import fast_svd as fast_svd_module
+from shrinkage_da.corpcor import svd_autotune
+from shrinkage_da.corpcor.fast_svd import fast_svd
+
+ROUTES = ["gram_svd", "gram_eigh", "qr", "direct"]
+MODES = [(False, False), (True, False), (False, True), (True, True)]
+
+
+def low_rank(shape, rank, small=None, seed=0):
+    rng = np.random.RandomState(seed)
+    u = np.linalg.qr(rng.randn(shape[0], rank))[0]
+    v = np.linalg.qr(rng.randn(shape[1], rank))[0]
+    d = np.linspace(10, 1, rank)
+    if small is not None:
+        d[-1] = small
+    return np.matmul(u * d, v.T)
+
+
+@pytest.mark.parametrize("shape", [(30, 200), (200, 30), (60, 60), (60, 100)])
+@pytest.mark.parametrize("small", [None, 1e-3, 1e-9])
+def test_routes_agree_on_singular_values_and_rank(shape, small):
+    m = low_rank(shape, 12, small)
+    ref = None
+    for route in ROUTES:
+        for compute_u, compute_v in MODES:
+            d, u, v = fast_svd(m, compute_u=compute_u, compute_v=compute_v, route=route)
+            if ref is None:
+                ref = d
+            # the same rank on every route: 12, or 11 when the smallest singular
+            # value is below the resolution of the Gram matrix routes
+            assert len(d) == (11 if small == 1e-9 else 12), (route, compute_u, compute_v)
+            np.testing.assert_allclose(d, ref, rtol=1e-7)
+            assert (u is None) == (not compute_u) and (v is None) == (not compute_v)
+            if compute_u and compute_v:
+                np.testing.assert_allclose(np.matmul(u * d, v.T), m, atol=1e-6)
+
+
+def test_explicit_tolerance_applies_to_singular_values():
+    m = low_rank((40, 90), 10)
+    for route in ROUTES:
+        assert len(fast_svd(m, tol=1.5, route=route)[0]) == 9 # d = 10, 9, ..., 1
+
+
+def test_calibrate_fits_every_vector_mode():
+    model = svd_autotune.calibrate(shapes=[(8, 16)], repeats=1)
+    assert set(model.coefs) == set(route + "/" + mode for route in fast_svd_module.SVD_ROUTES
+                                   for mode in svd_autotune.VECTOR_MODES)
+    for compute_u, compute_v in MODES:
+        assert set(model.predict(20, 50, compute_u, compute_v)) == set(fast_svd_module.SVD_ROUTES)
+
+
+def test_cost_model_choice_depends_on_vectors():
+    coefs = dict()
+    for route in fast_svd_module.SVD_ROUTES:
+        for mode in svd_autotune.VECTOR_MODES:
+            coefs[route + "/" + mode] = (2.0, 0.0, 0.0)
+    coefs["qr/u"] = (1.0, 0.0, 0.0)
+    coefs["gram_eigh/v"] = (1.0, 0.0, 0.0)
+    model = svd_autotune.SvdCostModel(coefs)
+    assert model.choose(20, 50, True, False) == "qr"
+    assert model.choose(20, 50, False, True) == "gram_eigh"
+    try:
+        fast_svd_module.set_cost_model(model)
+        d_qr = fast_svd(low_rank((20, 50), 5), compute_v=False)[0]
+        d_eigh = fast_svd(low_rank((20, 50), 5), compute_u=False)[0]
+        np.testing.assert_allclose(d_qr, d_eigh)
+    finally:
+        fast_svd_module.set_cost_model(None)
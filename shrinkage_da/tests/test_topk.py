@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from shrinkage_da import (ShrinkageDiscriminantAnalysis, BaggedShrinkageDiscriminantAnalysis,
+                          SdaPredictor)
+from shrinkage_da.predict_sda import predict_sda, predict_topk_sda
+
+
+@pytest.fixture
+def data():
+    rng = np.random.RandomState(0)
+    y = np.repeat(np.arange(7), 8)
+    centres = 2 * rng.randn(7, 15)
+    X = centres[y] + rng.randn(len(y), 15)
+    return X, y, centres[rng.randint(7, size=300)] + 2 * rng.randn(300, 15)
+
+
+def full_topk(proba, classes, k):
+    order = np.argsort(-proba, axis=1, kind="stable")[:, :k]
+    return classes[order], np.take_along_axis(proba, order, axis=1)
+
+
+def check_topk(top, proba, classes, k):
+    top_classes, top_posterior = top
+    ref_classes, ref_posterior = full_topk(proba, classes, k)
+    assert top_classes.shape == top_posterior.shape == (len(proba), min(k, len(classes)))
+    np.testing.assert_array_equal(top_classes, ref_classes)
+    np.testing.assert_allclose(top_posterior, ref_posterior, rtol=1e-10, atol=1e-14)
+
+
+@pytest.mark.parametrize("k", [1, 3, 7])
+def test_model_dict(data, k):
+    X, y, Xtest = data
+    est = ShrinkageDiscriminantAnalysis().fit(X, y)
+    top = predict_topk_sda(est.sdamodel_, Xtest, k)
+    groups = np.asarray(est.sdamodel_["groups"][:-1])
+    check_topk((top["classes"], top["posterior"]), predict_sda(est.sdamodel_, Xtest)["posterior"],
+               groups, k)
+    np.testing.assert_array_equal(groups[top["index"]], top["classes"])
+
+
+@pytest.mark.parametrize("k", [1, 3])
+@pytest.mark.parametrize("options", [dict(), dict(diagonal=True), dict(class_covariance=True)])
+def test_estimator(data, k, options):
+    X, y, Xtest = data
+    est = ShrinkageDiscriminantAnalysis(**options).fit(X, y)
+    check_topk(est.predict_topk(Xtest, k), est.predict_proba(Xtest), est.classes_, k)
+    assert np.array_equal(est.predict_topk(Xtest, 1)[0][:, 0], est.predict(Xtest))
+
+
+def test_k_larger_than_the_number_of_classes_returns_all_classes(data):
+    X, y, Xtest = data
+    est = ShrinkageDiscriminantAnalysis().fit(X, y)
+    classes, posterior = est.predict_topk(Xtest, 20)
+    assert classes.shape == posterior.shape == (len(Xtest), 7)
+    np.testing.assert_allclose(posterior.sum(axis=1), 1)
+    check_topk((classes, posterior), est.predict_proba(Xtest), est.classes_, 7)
+    with pytest.raises(ValueError, match="positive"):
+        est.predict_topk(Xtest, 0)
+
+
+def test_bagged(data):
+    X, y, Xtest = data
+    bag = BaggedShrinkageDiscriminantAnalysis(n_estimators=4, n_jobs=1, random_state=0).fit(X, y)
+    check_topk(bag.predict_topk(Xtest, 3), bag.predict_proba(Xtest), bag.classes_, 3)
+    check_topk(bag.predict_topk(Xtest, 10), bag.predict_proba(Xtest), bag.classes_, 10)
+
+
+@pytest.mark.parametrize("bagged", [False, True])
+def test_predictor_in_blocks(data, tmp_path, bagged):
+    X, y, Xtest = data
+    if bagged:
+        est = BaggedShrinkageDiscriminantAnalysis(n_estimators=3, n_jobs=1, random_state=0).fit(X, y)
+    else:
+        est = ShrinkageDiscriminantAnalysis().fit(X, y)
+    est.save(str(tmp_path / "model"))
+    predictor = SdaPredictor.load(str(tmp_path / "model"))
+    predictor.block_bytes = 8 * 15 * 16 # blocks of 16 rows
+    proba = est.predict_proba(Xtest)
+    np.testing.assert_allclose(predictor.predict_proba(Xtest), proba, rtol=1e-10)
+    for k in (2, 7, 9):
+        check_topk(predictor.predict_topk(Xtest, k), proba, est.classes_, k)
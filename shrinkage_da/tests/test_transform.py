@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from shrinkage_da import ShrinkageDiscriminantAnalysis
+
+
+@pytest.fixture
+def data():
+    rng = np.random.RandomState(0)
+    y = np.repeat([0, 1, 2, 3], [10, 12, 8, 15])
+    X = rng.randn(len(y), 30) + y[:, None] * rng.randn(30)
+    return X, y, 2 * rng.randn(7, 30)
+
+
+def nearest_centroid_posterior(est, X, y, Xtest):
+    """Posteriors from the squared distances to the projected centroids and the log priors"""
+    groups = list(est.sdamodel_["groups"][:-1])
+    z = est.transform(Xtest)
+    centroids = est.transform(np.array([X[y == g].mean(axis=0) for g in groups]))
+    scores = np.log(est.sdamodel_["freqs"]) - np.sum((z[:, None, :] - centroids) ** 2, axis=2) / 2
+    proba = np.exp(scores - scores.max(axis=1, keepdims=True))
+    proba /= proba.sum(axis=1, keepdims=True)
+    return proba[:, [groups.index(c) for c in est.classes_]]
+
+
+@pytest.mark.parametrize("options", [dict(), dict(diagonal=True), dict(lambda_cor=0.2)])
+def test_nearest_centroid_in_transformed_space_reproduces_predict(data, options):
+    X, y, Xtest = data
+    est = ShrinkageDiscriminantAnalysis(**options).fit(X, y)
+    assert est.transform(Xtest).shape == (7, 3)
+    proba = nearest_centroid_posterior(est, X, y, Xtest)
+    np.testing.assert_allclose(proba, est.predict_proba(Xtest), atol=1e-12)
+    np.testing.assert_array_equal(est.classes_[np.argmax(proba, axis=1)], est.predict(Xtest))
+
+
+def test_fewer_components_keep_the_leading_directions(data):
+    X, y, Xtest = data
+    full = ShrinkageDiscriminantAnalysis().fit(X, y).transform(Xtest)
+    two = ShrinkageDiscriminantAnalysis(n_components=2).fit(X, y).transform(Xtest)
+    np.testing.assert_allclose(two, full[:, :2], rtol=1e-10)
+
+
+def test_fit_transform_with_sample_weight(data):
+    X, y, Xtest = data
+    w = np.arange(len(y)) % 3
+    Z = ShrinkageDiscriminantAnalysis().fit_transform(X, y, sample_weight=w)
+    assert Z.shape == (len(y), 3)
+    est = ShrinkageDiscriminantAnalysis().fit(X, y, sample_weight=w)
+    np.testing.assert_allclose(Z, est.transform(X), rtol=1e-12)
+    repeated = ShrinkageDiscriminantAnalysis().fit(np.repeat(X, w, axis=0), np.repeat(y, w))
+    np.testing.assert_allclose(est.transform(Xtest), repeated.transform(Xtest), rtol=1e-8, atol=1e-10)
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from shrinkage_da import ShrinkageDiscriminantAnalysis
+from shrinkage_da.sda import sda
+from shrinkage_da.sda_qda import sda_qda
+from shrinkage_da.catscore import catscore
+
+
+@pytest.fixture
+def weighted_data():
+    rng = np.random.RandomState(0)
+    n, p = 40, 60
+    y = np.repeat([0, 1, 2], 14)[:n]
+    X = np.matmul(rng.randn(n, 3), rng.randn(3, p)) + 0.5 * rng.randn(n, p) + y[:, None]
+    w = rng.randint(1, 4, n)
+    return X, y, w
+
+
+def assert_same_model(a, b):
+    for key in ("lambda_cor", "lambda_var", "lambda_freqs"):
+        np.testing.assert_allclose(a["regularisation"][key], b["regularisation"][key], rtol=1e-10)
+    np.testing.assert_allclose(a["alpha"], b["alpha"], rtol=1e-10, atol=1e-10)
+    np.testing.assert_allclose(a["beta"], b["beta"], rtol=1e-10, atol=1e-10)
+
+
+@pytest.mark.parametrize("diagonal", [False, True])
+def test_sda_weights_equal_repeated_rows(weighted_data, diagonal):
+    X, y, w = weighted_data
+    weighted = sda(X, y, diagonal=diagonal, w=w)
+    repeated = sda(np.repeat(X, w, 0), np.repeat(y, w), diagonal=diagonal)
+    assert weighted["regularisation"]["lambda_cor"] < 1 or diagonal
+    assert_same_model(weighted, repeated)
+
+
+def test_estimator_sample_weight_and_compress_duplicates(weighted_data):
+    X, y, w = weighted_data
+    repeated = ShrinkageDiscriminantAnalysis().fit(np.repeat(X, w, 0), np.repeat(y, w)).sdamodel_
+    weighted = ShrinkageDiscriminantAnalysis().fit(X, y, sample_weight=w).sdamodel_
+    compressed = ShrinkageDiscriminantAnalysis(compress_duplicates=True).fit(
+        np.repeat(X, w, 0), np.repeat(y, w)).sdamodel_
+    assert_same_model(weighted, repeated)
+    assert_same_model(compressed, repeated)
+
+
+def test_catscore_weights_equal_repeated_rows(weighted_data):
+    X, y, w = weighted_data
+    weighted = catscore(X, y, w=w)
+    repeated = catscore(np.repeat(X, w, 0), np.repeat(y, w))
+    np.testing.assert_allclose(weighted["regularisation"]["lambda_cor"],
+                               repeated["regularisation"]["lambda_cor"], rtol=1e-10)
+    np.testing.assert_allclose(weighted["cat"], repeated["cat"], rtol=1e-10, atol=1e-10)
+
+
+def test_sda_qda_weights_equal_repeated_rows(weighted_data):
+    X, y, w = weighted_data
+    weighted = sda_qda(X, y, w=w)
+    repeated = sda_qda(np.repeat(X, w, 0), np.repeat(y, w))
+    np.testing.assert_allclose(weighted["qda"]["lambda_cor"], repeated["qda"]["lambda_cor"], rtol=1e-10)
+    np.testing.assert_allclose(weighted["alpha"], repeated["alpha"], rtol=1e-10)
@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+
+from shrinkage_da import ShrinkageDiscriminantAnalysis, WindowedShrinkageDiscriminantAnalysis
+
+
+def stream(n, p, seed=0):
+    rng = np.random.RandomState(seed)
+    y = rng.randint(0, 3, n)
+    # correlated features with a drifting scale
+    X = np.matmul(rng.randn(n, p), rng.randn(p, p) / np.sqrt(p)) + y[:, None]
+    X *= np.linspace(1, 2, n)[:, None]
+    return X, y
+
+
+def batch(X, y, **kwargs):
+    return ShrinkageDiscriminantAnalysis(**kwargs).fit(X, y)
+
+
+def assert_same_model(window, X, y, **kwargs):
+    reference = batch(X, y, **kwargs)
+    np.testing.assert_array_equal(window.classes_, reference.classes_)
+    # sda() orders the rows of beta by its own group order
+    order = [list(reference.sdamodel_["groups"]).index(label) for label in window.classes_]
+    for key in ("lambda_cor", "lambda_var", "lambda_freqs"):
+        np.testing.assert_allclose(window.sdamodel_["regularisation"][key],
+                                   reference.sdamodel_["regularisation"][key], rtol=1e-8)
+    np.testing.assert_allclose(window.sdamodel_["beta"], reference.sdamodel_["beta"][order], rtol=1e-7, atol=1e-9)
+    np.testing.assert_allclose(window.sdamodel_["alpha"], reference.sdamodel_["alpha"][order], rtol=1e-7, atol=1e-9)
+    np.testing.assert_allclose(window.predict_proba(X), reference.predict_proba(X)[:, order], atol=1e-9)
+
+
+@pytest.mark.parametrize("p", [5, 40])
+@pytest.mark.parametrize("kwargs", [{}, {"lambda_cor": 0.3}, {"diagonal": True}])
+def test_window_matches_batch_fit_of_window(p, kwargs):
+    X, y = stream(400, p)
+    N = 60
+    window = WindowedShrinkageDiscriminantAnalysis(window_size=N, **kwargs).fit(X[:N], y[:N])
+    assert_same_model(window, X[:N], y[:N], **kwargs)
+    end = N
+    for m in (1, 7, 30, 60, 3, 45):
+        window.partial_fit(X[end:end + m], y[end:end + m])
+        end += m
+        assert window.n_window_ == N
+        assert_same_model(window, X[end - N:end], y[end - N:end], **kwargs)
+
+
+def test_remove_matches_batch_fit_of_remaining_rows():
+    X, y = stream(100, 20)
+    window = WindowedShrinkageDiscriminantAnalysis(window_size=100).fit(X, y)
+    window.remove(35)
+    assert window.n_window_ == 65
+    assert_same_model(window, X[35:], y[35:])
+
+
+def test_evicted_class_leaves_classes():
+    rng = np.random.RandomState(1)
+    X = rng.randn(90, 10)
+    y = np.array(["c"] * 30 + ["a"] * 30 + ["b"] * 30)
+    X += (y == "b")[:, None]
+    window = WindowedShrinkageDiscriminantAnalysis(window_size=60).fit(X[:60], y[:60])
+    np.testing.assert_array_equal(window.classes_, ["a", "c"])
+    window.partial_fit(X[60:], y[60:])
+    np.testing.assert_array_equal(window.classes_, ["a", "b"])
+    assert window.predict_proba(X).shape == (90, 2)
+    assert set(window.predict(X)) <= {"a", "b"}
+    assert_same_model(window, X[30:], y[30:])
+    # the first evicted class comes back and evicts the next one
+    window.partial_fit(X[:30], y[:30])
+    np.testing.assert_array_equal(window.classes_, ["b", "c"])
+    assert_same_model(window, np.concatenate((X[60:], X[:30])), np.concatenate((y[60:], y[:30])))
+
+
+def test_rescale_tol_bounds_the_error():
+    X, y = stream(300, 30)
+    window = WindowedShrinkageDiscriminantAnalysis(window_size=100, rescale_tol=0.05, lambda_cor=0.2)
+    window.fit(X[:100], y[:100])
+    for end in range(110, 301, 10):
+        window.partial_fit(X[end - 10:end], y[end - 10:end])
+    exact = batch(X[200:], y[200:], lambda_cor=0.2)
+    order = [list(exact.sdamodel_["groups"]).index(label) for label in window.classes_]
+    np.testing.assert_allclose(window.predict_proba(X), exact.predict_proba(X)[:, order], atol=0.05)
+
+
+def test_window_needs_two_classes():
+    X, y = stream(50, 5)
+    window = WindowedShrinkageDiscriminantAnalysis(window_size=20).fit(X[:20], y[:20])
+    with pytest.raises(ValueError, match="two classes"):
+        window.partial_fit(X[:20], np.zeros(20))
+
+
+@pytest.mark.parametrize("p", [20, 120])
+def test_updated_factor_and_row_norms_are_exact_without_rescaling(p):
+    from shrinkage_da._windowclass import pvt_row_norms4
+    X, y = stream(500, p, seed=2)
+    N = 70
+    window = WindowedShrinkageDiscriminantAnalysis(window_size=N, rescale_tol=np.inf).fit(X[:N], y[:N])
+    end = N
+    for m in (1, 5, 17, 70, 2, 40, 33, 9):
+        window.partial_fit(X[end:end + m], y[end:end + m])
+        end += m
+    slots = (window.start_ + np.arange(N)) % N
+    z, codes = window.buffer_[slots], window.codes_[slots]
+    classes = np.unique(codes)
+    centred = np.concatenate([z[codes == k] - np.mean(z[codes == k], axis=0) for k in classes])
+    centred /= window.ref_scale_
+    basis, rotation, e = window.factor_
+    v = np.matmul(basis, rotation)
+    scatter = np.matmul(centred.T, centred)
+    np.testing.assert_allclose(np.matmul(v * e, v.T), scatter, atol=1e-10 * np.max(np.abs(scatter)))
+    assert len(e) == min(N - len(classes), p)
+    row4 = sum(pvt_row_norms4(window.norm_sums_[k], window.norm_vectors_[k], window.sums_[k, 0, 0],
+                              window.sums_[k, 1, :] / window.ref_scale_) for k in classes)
+    np.testing.assert_allclose(row4, np.sum(np.sum(centred**2, axis=1)**2), rtol=1e-10)
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Shrinkage discriminant analysis (projection onto the discriminant directions)
+
+@author Miika Ahdesmaki
+"""
+from __future__ import print_function, division
+import numpy as np
+from .corpcor.shrink_misc import pvt_row_blocks
+
+def transform_sda(sda_object, Xtest, n_components = None, verbose = False):
+    """Project samples onto the (at most K-1) discriminant directions
+    
+    Parameters
+    ----------
+    sda_object : dict
+        dictionary from sda containing model parameters
+    Xtest : numpy array
+        samples-in-rows matrix. Number of columns must match the number of 
+        variables used in training of the provided sda_object, unless the
+        sda_object holds the indices "idx" of the columns it was trained on
+    n_components : int
+        Number of leading directions to project onto (None: all).
+    verbose : bool
+        Verbose mode (False).
+    
+    Returns
+    -------
+    array
+        n x n_components array of coordinates in the whitened discriminant
+        space, computed in row blocks
+    """
+    scalings = sda_object.get("scalings")
+    if scalings is None:
+        raise ValueError("sda_object does not contain the discriminant directions (scalings)")
+    if n_components is not None:
+        scalings = scalings[:, :n_components]
+    xbar = sda_object["xbar"]
+    n, p = Xtest.shape
+    idx = sda_object.get("idx")
+    select = idx is not None and p != scalings.shape[0]
+    if select:
+        p = len(idx)
+    if p != scalings.shape[0]:
+        raise ValueError("Different number of predictors in sda object (" + str(scalings.shape[0]) + ") and in Xtest (" + str(p) + ")")
+    if verbose:
+        print("Projecting onto", scalings.shape[1], "discriminant directions")
+    Z = np.empty((n, scalings.shape[1]), dtype = np.result_type(Xtest.dtype, scalings.dtype))
+    for b in pvt_row_blocks(n, p):
+        xb = Xtest[b, :]
+        if select:
+            xb = xb[:, idx]
+        Z[b, :] = np.matmul(xb - xbar, scalings)
+    return Z